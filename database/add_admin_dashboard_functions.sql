@@ -0,0 +1,78 @@
+-- ADDING ADMIN DASHBOARD AGGREGATION FUNCTIONS
+-- Lets /admin-dashboard fetch grouped counts via RPC instead of downloading whole tables
+
+-- Per-user assessment counts, high-risk counts and latest assessment time
+CREATE OR REPLACE FUNCTION admin_user_prediction_stats()
+RETURNS TABLE (
+  user_email VARCHAR,
+  assessment_count BIGINT,
+  high_risk_count BIGINT,
+  last_assessment TIMESTAMP WITH TIME ZONE
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    p.user_email,
+    COUNT(*) AS assessment_count,
+    COUNT(*) FILTER (WHERE LOWER(p.predicted_risk) LIKE 'high%') AS high_risk_count,
+    MAX(p.created_at) AS last_assessment
+  FROM predictions p
+  WHERE p.user_email IS NOT NULL
+  GROUP BY p.user_email;
+$$;
+
+-- System-wide assessment totals by risk level
+CREATE OR REPLACE FUNCTION admin_prediction_totals()
+RETURNS TABLE (
+  total_assessments BIGINT,
+  high_risk_cases BIGINT,
+  low_risk_cases BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    COUNT(*) AS total_assessments,
+    COUNT(*) FILTER (WHERE LOWER(predicted_risk) LIKE 'high%') AS high_risk_cases,
+    COUNT(*) FILTER (WHERE LOWER(predicted_risk) LIKE 'low%') AS low_risk_cases
+  FROM predictions;
+$$;
+
+-- Number of distinct chatbot conversations
+CREATE OR REPLACE FUNCTION admin_chat_session_count()
+RETURNS BIGINT
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT COUNT(DISTINCT conversation_id)
+  FROM chat_history
+  WHERE conversation_id IS NOT NULL AND conversation_id <> '';
+$$;
+
+-- Assessments per calendar month (UTC) for the last N months, including the current one
+CREATE OR REPLACE FUNCTION admin_monthly_prediction_counts(months INTEGER DEFAULT 6)
+RETURNS TABLE (
+  month_start DATE,
+  assessment_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    DATE_TRUNC('month', created_at AT TIME ZONE 'UTC')::DATE AS month_start,
+    COUNT(*) AS assessment_count
+  FROM predictions
+  WHERE created_at >= (DATE_TRUNC('month', NOW() AT TIME ZONE 'UTC') - MAKE_INTERVAL(months => months - 1)) AT TIME ZONE 'UTC'
+  GROUP BY 1;
+$$;
+
+-- Only the API (service role) needs to call these
+REVOKE EXECUTE ON FUNCTION admin_user_prediction_stats() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION admin_prediction_totals() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION admin_chat_session_count() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION admin_monthly_prediction_counts(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION admin_user_prediction_stats() TO service_role;
+GRANT EXECUTE ON FUNCTION admin_prediction_totals() TO service_role;
+GRANT EXECUTE ON FUNCTION admin_chat_session_count() TO service_role;
+GRANT EXECUTE ON FUNCTION admin_monthly_prediction_counts(INTEGER) TO service_role;
@@ -0,0 +1,7 @@
+-- ALLOW DEFERRED EXPLANATION_LEVEL ON PREDICTIONS TABLE
+-- /predict?explain=deferred stores the prediction with explanation_level 'deferred' and no
+-- feature_importance; a background job then updates the row with the full SHAP values and
+-- sets explanation_level to 'full'. Rows still 'deferred' are explained again when fetched
+-- from GET /predict/{id}/explanation.
+
+COMMENT ON COLUMN predictions.explanation_level IS 'How feature_importance was computed: none, fast (top-k path attributions), full (SHAP) or deferred (SHAP pending)';
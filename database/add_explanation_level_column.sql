@@ -0,0 +1,9 @@
+-- ADD EXPLANATION_LEVEL COLUMN TO PREDICTIONS TABLE
+-- /predict?explain= records how each stored explanation was computed:
+--   none: no feature_importance; fast: top contributions from the forest's decision paths;
+--   full: exact SHAP values for every feature (the behaviour of earlier rows)
+
+ALTER TABLE predictions
+ADD COLUMN IF NOT EXISTS explanation_level VARCHAR(10) DEFAULT 'full';
+
+COMMENT ON COLUMN predictions.explanation_level IS 'How feature_importance was computed: none, fast (top-k path attributions) or full (SHAP)';
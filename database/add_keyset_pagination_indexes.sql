@@ -0,0 +1,18 @@
+-- ADDING KEYSET PAGINATION INDEXES
+-- List endpoints page with (created_at, id) cursors ordered created_at DESC, id DESC.
+-- These composite indexes cover the per-user filter and the id tiebreaker in one scan.
+
+CREATE INDEX IF NOT EXISTS idx_predictions_user_email_keyset
+  ON predictions(user_email, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_id_keyset
+  ON chat_history(user_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_consultation_requests_pregnant_woman_keyset
+  ON consultation_requests(pregnant_woman_email, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_consultation_requests_provider_keyset
+  ON consultation_requests(healthcare_provider_email, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at_keyset
+  ON users(created_at DESC, id DESC);
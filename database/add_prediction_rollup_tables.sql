@@ -0,0 +1,108 @@
+-- ADDING PREDICTION ROLLUP TABLES
+-- Daily and monthly assessment counts per risk level, maintained by trigger on predictions.
+-- Dashboards read a few dozen rollup rows instead of scanning the predictions table.
+
+-- CREATING ROLLUP TABLES
+CREATE TABLE IF NOT EXISTS prediction_daily_rollups (
+  day DATE NOT NULL,
+  predicted_risk VARCHAR(50) NOT NULL,
+  assessment_count BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (day, predicted_risk)
+);
+
+CREATE TABLE IF NOT EXISTS prediction_monthly_rollups (
+  month DATE NOT NULL,  -- first day of the calendar month (UTC)
+  predicted_risk VARCHAR(50) NOT NULL,
+  assessment_count BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (month, predicted_risk)
+);
+
+CREATE INDEX IF NOT EXISTS idx_prediction_daily_rollups_day ON prediction_daily_rollups(day DESC);
+CREATE INDEX IF NOT EXISTS idx_prediction_monthly_rollups_month ON prediction_monthly_rollups(month DESC);
+
+-- APPLYING A +1 / -1 DELTA FOR ONE PREDICTION
+CREATE OR REPLACE FUNCTION apply_prediction_rollup_delta(
+  p_created_at TIMESTAMP WITH TIME ZONE,
+  p_predicted_risk VARCHAR,
+  p_delta INTEGER
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_day DATE := (COALESCE(p_created_at, NOW()) AT TIME ZONE 'UTC')::DATE;
+  v_risk VARCHAR := COALESCE(p_predicted_risk, 'Unknown');
+BEGIN
+  INSERT INTO prediction_daily_rollups (day, predicted_risk, assessment_count)
+  VALUES (v_day, v_risk, p_delta)
+  ON CONFLICT (day, predicted_risk)
+  DO UPDATE SET assessment_count = prediction_daily_rollups.assessment_count + EXCLUDED.assessment_count,
+                updated_at = NOW();
+
+  INSERT INTO prediction_monthly_rollups (month, predicted_risk, assessment_count)
+  VALUES (DATE_TRUNC('month', v_day)::DATE, v_risk, p_delta)
+  ON CONFLICT (month, predicted_risk)
+  DO UPDATE SET assessment_count = prediction_monthly_rollups.assessment_count + EXCLUDED.assessment_count,
+                updated_at = NOW();
+END;
+$$;
+
+-- MAINTAINING ROLLUPS ON INSERT / UPDATE / DELETE
+CREATE OR REPLACE FUNCTION maintain_prediction_rollups()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM apply_prediction_rollup_delta(OLD.created_at, OLD.predicted_risk, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM apply_prediction_rollup_delta(NEW.created_at, NEW.predicted_risk, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_prediction_rollups ON predictions;
+CREATE TRIGGER trg_prediction_rollups
+  AFTER INSERT OR DELETE OR UPDATE OF created_at, predicted_risk ON predictions
+  FOR EACH ROW EXECUTE FUNCTION maintain_prediction_rollups();
+
+-- BACKFILLING FROM HISTORY (safe to re-run; rebuilds both tables atomically)
+CREATE OR REPLACE FUNCTION backfill_prediction_rollups()
+RETURNS TABLE (daily_rows BIGINT, monthly_rows BIGINT)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  LOCK TABLE predictions IN SHARE MODE;
+
+  DELETE FROM prediction_daily_rollups;
+  DELETE FROM prediction_monthly_rollups;
+
+  INSERT INTO prediction_daily_rollups (day, predicted_risk, assessment_count)
+  -- Same day bucketing as apply_prediction_rollup_delta, so a NULL created_at can't violate the primary key
+  SELECT (COALESCE(created_at, NOW()) AT TIME ZONE 'UTC')::DATE, COALESCE(predicted_risk, 'Unknown'), COUNT(*)
+  FROM predictions
+  GROUP BY 1, 2;
+
+  INSERT INTO prediction_monthly_rollups (month, predicted_risk, assessment_count)
+  SELECT DATE_TRUNC('month', day)::DATE, predicted_risk, SUM(assessment_count)
+  FROM prediction_daily_rollups
+  GROUP BY 1, 2;
+
+  RETURN QUERY
+  SELECT (SELECT COUNT(*) FROM prediction_daily_rollups), (SELECT COUNT(*) FROM prediction_monthly_rollups);
+END;
+$$;
+
+-- ENABLING ROW LEVEL SECURITY (service role only)
+ALTER TABLE prediction_daily_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE prediction_monthly_rollups ENABLE ROW LEVEL SECURITY;
+
+REVOKE EXECUTE ON FUNCTION backfill_prediction_rollups() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION backfill_prediction_rollups() TO service_role;
+
+-- Initial population from existing predictions
+SELECT * FROM backfill_prediction_rollups();
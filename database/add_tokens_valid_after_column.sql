@@ -0,0 +1,8 @@
+-- ADD TOKENS_VALID_AFTER COLUMN TO USERS TABLE
+-- Bearer tokens issued (iat, whole seconds) before this time no longer carry authority.
+-- The API sets it when an admin changes a user's role or blocks them, and checks it on
+-- every token-authenticated request, so a revocation holds across restarts and workers.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS tokens_valid_after TIMESTAMP WITH TIME ZONE;
+
+COMMENT ON COLUMN users.tokens_valid_after IS 'Bearer tokens issued before this time are rejected (set on role change or block)';
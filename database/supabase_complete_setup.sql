@@ -45,6 +45,7 @@ CREATE TABLE predictions (
   heart_rate FLOAT,
   feature_importance JSONB,
   explanation TEXT,
+  explanation_level VARCHAR(10) DEFAULT 'full',
   role VARCHAR(50),
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
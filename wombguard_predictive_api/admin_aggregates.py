@@ -0,0 +1,145 @@
+"""
+WombGuard Admin Aggregates
+Grouped statistics for the admin dashboard, computed in Postgres when possible
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime
+
+from pg_backend import get_pg_backend
+from repository import CHAT_CONVERSATION_KEY, PREDICTION_STATS_ROW, fetch_all_pages
+from time_utils import parse_utc_naive
+
+logger = logging.getLogger(__name__)
+
+
+def recent_month_starts(today: datetime, months: int = 6) -> list:
+    """First day of the current and previous calendar months, newest first."""
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(months):
+        starts.append(datetime(year, month, 1).date())
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return starts
+
+
+def monthly_trends(month_counts: dict, today: datetime, months: int = 6) -> dict:
+    """Map {month_start: count} onto the dashboard's {"Oct": n, "Sep": n, ...} shape, newest first."""
+    return {
+        start.strftime("%b"): month_counts.get(start, 0)
+        for start in recent_month_starts(today, months)
+    }
+
+
+def group_predictions(rows: list) -> dict:
+    """
+    Single pass over (user_email, predicted_risk, created_at) rows.
+    Returns totals, per-user stats and calendar-month counts.
+    """
+    per_user = {}
+    month_counts = Counter()
+    high_total = 0
+    low_total = 0
+
+    for row in rows:
+        risk = (row.get("predicted_risk") or "").lower()
+        is_high = risk.startswith("high")
+        if is_high:
+            high_total += 1
+        elif risk.startswith("low"):
+            low_total += 1
+
+        created_raw = row.get("created_at")
+        created_at = parse_utc_naive(created_raw)
+        if created_at:
+            month_counts[created_at.date().replace(day=1)] += 1
+
+        email = row.get("user_email")
+        if email:
+            entry = per_user.get(email)
+            if entry is None:
+                entry = per_user[email] = {"assessment_count": 0, "high_risk_count": 0, "last_assessment": None}
+            entry["assessment_count"] += 1
+            if is_high:
+                entry["high_risk_count"] += 1
+            if created_raw and (entry["last_assessment"] is None or created_raw > entry["last_assessment"]):
+                entry["last_assessment"] = created_raw
+
+    return {
+        "total_assessments": len(rows),
+        "high_risk_cases": high_total,
+        "low_risk_cases": low_total,
+        "per_user": per_user,
+        "month_counts": month_counts,
+    }
+
+
+def _aggregates_via_rpc(client, months: int, month_counts: dict = None) -> dict:
+    totals = client.rpc("admin_prediction_totals").execute().data or [{}]
+    # One row per user: page it like a table read, or PostgREST's max-rows cap truncates it silently
+    per_user_rows = fetch_all_pages(
+        lambda: client.rpc("admin_user_prediction_stats", {}).order("user_email"))
+    if month_counts is None:
+        month_rows = client.rpc("admin_monthly_prediction_counts", {"months": months}).execute().data or []
+        month_counts = {
+            datetime.fromisoformat(row["month_start"]).date(): row["assessment_count"]
+            for row in month_rows
+        }
+    chat_sessions = client.rpc("admin_chat_session_count").execute().data
+
+    return {
+        "total_assessments": totals[0].get("total_assessments", 0),
+        "high_risk_cases": totals[0].get("high_risk_cases", 0),
+        "low_risk_cases": totals[0].get("low_risk_cases", 0),
+        "per_user": {
+            row["user_email"]: {
+                "assessment_count": row["assessment_count"],
+                "high_risk_count": row["high_risk_count"],
+                "last_assessment": row["last_assessment"],
+            }
+            for row in per_user_rows
+        },
+        "month_counts": month_counts,
+        "chat_sessions": int(chat_sessions or 0),
+    }
+
+
+def _aggregates_in_python(client, month_counts: dict = None) -> dict:
+    rows = fetch_all_pages(lambda: PREDICTION_STATS_ROW.query(client).order("id"))
+    aggregates = group_predictions(rows)
+    if month_counts is not None:
+        aggregates["month_counts"] = month_counts
+
+    conversations = fetch_all_pages(lambda: CHAT_CONVERSATION_KEY.query(client).order("id"))
+    aggregates["chat_sessions"] = len({c.get("conversation_id") for c in conversations if c.get("conversation_id")})
+    return aggregates
+
+
+def fetch_admin_aggregates(client, months: int = 6, month_counts: dict = None) -> dict:
+    """
+    Totals, per-user stats, month counts and chat session count for the admin dashboard.
+
+    Uses the SQL functions from database/add_admin_dashboard_functions.sql so
+    only grouped rows cross the network; falls back to a single-pass Python
+    group-by over just the needed columns when the functions are not installed.
+    month_counts, when already read from the monthly rollup table, is used as is.
+    With DATA_BACKEND=postgres the same grouping runs over the pooled connection.
+    """
+    backend = get_pg_backend()
+    if backend is not None:
+        try:
+            aggregates = backend.admin_aggregates(months, since=recent_month_starts(datetime.utcnow(), months)[-1])
+            if month_counts is not None:
+                aggregates["month_counts"] = month_counts
+            return aggregates
+        except Exception as e:
+            logger.warning(f" Postgres backend failed for admin aggregates, using Supabase: {e}")
+
+    try:
+        return _aggregates_via_rpc(client, months, month_counts)
+    except Exception as e:
+        logger.warning(f" Admin aggregate functions unavailable, grouping in Python: {e}")
+        return _aggregates_in_python(client, month_counts)
@@ -0,0 +1,312 @@
+"""
+WombGuard Batch Scoring
+Offline re-scoring of CSV or Parquet cohorts on a process pool, written to Parquet
+
+Usage:
+    python batch_score.py dataset/wombguard_dataset.csv --output scores/wombguard_dataset
+    python batch_score.py dataset/local_pregnancy_dataset.csv --output scores/local --workers 0
+    python batch_score.py partner_export.parquet --output scores/partner --workers 8 --resume
+
+The output directory holds one Parquet part per input chunk, in input order
+(read it back with pandas.read_parquet(directory)), and a _progress.json
+manifest so an interrupted run can continue from the last completed chunk.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from dataset_ingest import SchemaMapping, read_chunks
+from risk_scoring import COMPILED_MAX_ROWS, EXPLAIN_LEVELS, HIGH_RISK_THRESHOLD, RiskScorer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wombguard_pregnancy_model.pkl")
+MANIFEST_NAME = "_progress.json"
+
+# Scorer of the current process; pool workers build their own in _init_worker
+_scorer = None
+
+
+def load_scorer(model_path: str, compiled: bool = True) -> RiskScorer:
+    package = joblib.load(model_path)
+    return RiskScorer(package["model"], package["scaler"], package["feature_names"], compiled=compiled)
+
+
+def _init_worker(model_path: str, compiled: bool = True):
+    global _scorer
+    _scorer = load_scorer(model_path, compiled)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def score_chunk(index: int, first_row: int, frame: pd.DataFrame, top_features: int, explain: str = "full") -> tuple:
+    """
+    (index, scored frame) for one input chunk. Columns are mapped and
+    converted to model units by dataset_ingest. Rows with a missing or
+    non-numeric feature are kept with empty predictions so row numbers
+    still line up with the input. The top_feature/top_shap columns come from
+    SHAP values (explain="full"), path attributions ("fast") or stay empty;
+    there are at most as many of them as the model has features.
+    """
+    top_features = min(top_features, len(_scorer.feature_names))
+    mapping = SchemaMapping(list(frame.columns), features=tuple(_scorer.feature_names))
+    chunk = mapping.transform(frame, index, first_row)
+    features = pd.DataFrame(chunk.features, columns=_scorer.feature_names)
+    complete = chunk.valid
+    rows = len(features)
+
+    result = pd.DataFrame({"row": np.arange(first_row, first_row + rows, dtype=np.int64)})
+    for feature in _scorer.feature_names:
+        result[feature] = features[feature].to_numpy()
+
+    probability = np.full(rows, np.nan)
+    top_names = np.full((rows, top_features), None, dtype=object)
+    top_values = np.full((rows, top_features), np.nan)
+    if complete.any():
+        probabilities, shap_values = _scorer.predict(features[complete], explain=explain)
+        probability[complete] = probabilities
+        if shap_values is not None:
+            order = np.argsort(-np.abs(shap_values), axis=1, kind="stable")[:, :top_features]
+            top_names[complete] = np.asarray(_scorer.feature_names, dtype=object)[order]
+            top_values[complete] = np.take_along_axis(shap_values, order, axis=1)
+
+    result["predicted_risk"] = np.where(
+        complete, np.where(probability >= HIGH_RISK_THRESHOLD, "High Risk", "Low Risk"), None)
+    result["probability"] = probability
+    result["confidence_score"] = np.round(np.maximum(probability, 1 - probability), 4)
+    for rank in range(top_features):
+        result[f"top_feature_{rank + 1}"] = top_names[:, rank]
+        result[f"top_shap_{rank + 1}"] = top_values[:, rank]
+    return index, result
+
+
+class BatchScoringJob:
+    """
+    Scores an input file chunk by chunk on `workers` processes (0 = inline).
+
+    At most 2 x workers chunks are in flight, and results are written in
+    input order as soon as the oldest outstanding chunk finishes, so memory
+    stays bounded whatever the size of the input. Every written part is
+    recorded in the manifest before the next one, which is what --resume
+    continues from.
+    """
+
+    def __init__(
+            self,
+            input_path: str,
+            output_dir: str,
+            model_path: str = DEFAULT_MODEL_PATH,
+            chunk_rows: int = 50000,
+            workers: int = 2,
+            top_features: int = 3,
+            compiled: bool = True,
+            explain: str = "full"):
+        self.input_path = os.path.abspath(input_path)
+        self.output_dir = output_dir
+        self.model_path = model_path
+        self.chunk_rows = max(1, chunk_rows)
+        self.workers = max(0, workers)
+        self.top_features = max(1, top_features)
+        self.compiled = compiled
+        self.explain = explain
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._metrics = {"chunks": 0, "rows": 0, "scored": 0, "skipped_chunks": 0, "skipped_rows": 0}
+
+    def _job_key(self) -> dict:
+        """What a resumed run must share with the run that wrote the manifest."""
+        return {
+            "input": self.input_path,
+            "input_size": os.path.getsize(self.input_path),
+            "model_sha256": file_sha256(self.model_path),
+            "chunk_rows": self.chunk_rows,
+            "top_features": self.top_features,
+            "explain": self.explain,
+        }
+
+    def _part_path(self, index: int) -> str:
+        return os.path.join(self.output_dir, f"part-{index:06d}.parquet")
+
+    def _write_manifest(self, manifest: dict):
+        temporary = self.manifest_path + ".tmp"
+        with open(temporary, "w") as handle:
+            json.dump(manifest, handle, indent=2)
+        os.replace(temporary, self.manifest_path)
+
+    def _prepare(self, resume: bool, overwrite: bool) -> dict:
+        """Load or start the manifest and drop part files it does not vouch for."""
+        key = self._job_key()
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as handle:
+                previous = json.load(handle)
+            if resume:
+                mismatched = [name for name, value in key.items() if previous.get(name) != value]
+                if mismatched:
+                    raise ValueError(f"Cannot resume: {', '.join(mismatched)} changed since the last run")
+                manifest = previous
+            elif not overwrite:
+                raise ValueError(f"{self.output_dir} already holds a scoring run; pass --resume or --overwrite")
+
+        if manifest is None:
+            manifest = {**key, "chunks_done": 0, "rows_done": 0, "scored": 0, "completed": False}
+
+        for part in glob.glob(os.path.join(self.output_dir, "part-*.parquet*")):
+            name = os.path.basename(part)
+            if not name.endswith(".parquet") or int(name[5:11]) >= manifest["chunks_done"]:
+                os.remove(part)
+        self._write_manifest(manifest)
+        return manifest
+
+    def _write(self, manifest: dict, index: int, result: pd.DataFrame):
+        temporary = self._part_path(index) + ".tmp"
+        result.to_parquet(temporary, index=False)
+        os.replace(temporary, self._part_path(index))
+
+        scored = int(result["predicted_risk"].notna().sum())
+        manifest["chunks_done"] = index + 1
+        manifest["rows_done"] += len(result)
+        manifest["scored"] += scored
+        self._write_manifest(manifest)
+        self._metrics["chunks"] += 1
+        self._metrics["rows"] += len(result)
+        self._metrics["scored"] += scored
+
+    def _log_progress(self, manifest: dict, started: float):
+        elapsed = time.perf_counter() - started
+        rate = self._metrics["rows"] / elapsed if elapsed else 0.0
+        logger.info(f"Chunk {manifest['chunks_done']}: {manifest['rows_done']} rows done, {rate:,.0f} rows/s")
+
+    def run(self, resume: bool = False, overwrite: bool = False) -> dict:
+        manifest = self._prepare(resume, overwrite)
+        if manifest["completed"]:
+            logger.info(f"{self.output_dir} is already complete ({manifest['rows_done']} rows)")
+            return self.stats(0.0)
+        if manifest["chunks_done"]:
+            logger.info(f"Resuming after chunk {manifest['chunks_done']} ({manifest['rows_done']} rows done)")
+
+        pool = None
+        if self.workers:
+            # spawn, not fork: each worker loads the model package itself, once
+            pool = multiprocessing.get_context("spawn").Pool(
+                processes=self.workers,
+                initializer=_init_worker,
+                initargs=(self.model_path, self.compiled),
+            )
+        elif _scorer is None or (_scorer.forest is not None) != self.compiled:
+            _init_worker(self.model_path, self.compiled)
+
+        started = time.perf_counter()
+        window = max(1, self.workers * 2)
+        pending = deque()
+        try:
+            for index, first_row, frame in read_chunks(self.input_path, self.chunk_rows):
+                if index < manifest["chunks_done"]:
+                    self._metrics["skipped_chunks"] += 1
+                    self._metrics["skipped_rows"] += len(frame)
+                    continue
+                if pool is None:
+                    self._write(manifest, *score_chunk(index, first_row, frame, self.top_features, self.explain))
+                    self._log_progress(manifest, started)
+                    continue
+
+                pending.append(pool.apply_async(
+                    score_chunk, (index, first_row, frame, self.top_features, self.explain)))
+                while pending and (len(pending) >= window or pending[0].ready()):
+                    self._write(manifest, *pending.popleft().get())
+                    self._log_progress(manifest, started)
+
+            while pending:
+                self._write(manifest, *pending.popleft().get())
+                self._log_progress(manifest, started)
+        except BaseException:
+            # Interrupted or failed: stop the workers mid-chunk; the manifest
+            # already covers every part written so far
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            raise
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+        manifest["completed"] = True
+        self._write_manifest(manifest)
+        return self.stats(time.perf_counter() - started)
+
+    def stats(self, elapsed: float) -> dict:
+        return {
+            "output": self.output_dir,
+            "workers": self.workers,
+            "chunk_rows": self.chunk_rows,
+            "compiled": self.compiled,
+            "explain": self.explain,
+            **self._metrics,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": round(self._metrics["rows"] / elapsed, 1) if elapsed else None,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WombGuard offline batch scoring")
+    parser.add_argument("input", help="CSV or Parquet file with the /predict feature columns")
+    parser.add_argument("--output", required=True, help="Directory for the Parquet parts and progress manifest")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Model package to score with")
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (0 = inline)")
+    parser.add_argument("--top-features", type=int, default=3, help="SHAP features kept per row (at most the model's feature count)")
+    parser.add_argument("--explain", choices=EXPLAIN_LEVELS, default="full",
+                        help="full: exact SHAP values; fast: decision-path attributions; none: no top features")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run in --output")
+    parser.add_argument("--overwrite", action="store_true", help="Discard a previous run in --output")
+    parser.add_argument("--no-compiled", dest="compiled", action="store_false",
+                        help="Always score with scikit-learn; by default chunks of up to "
+                             f"{COMPILED_MAX_ROWS} rows use the compiled forest (same results)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    job = BatchScoringJob(
+        args.input,
+        args.output,
+        model_path=args.model,
+        chunk_rows=args.chunk_rows,
+        workers=args.workers,
+        top_features=args.top_features,
+        compiled=args.compiled,
+        explain=args.explain,
+    )
+    try:
+        stats = job.run(resume=args.resume, overwrite=args.overwrite)
+    except (ValueError, OSError) as e:
+        logger.error(f"Batch scoring failed: {e}")
+        return 1
+    except KeyboardInterrupt:
+        logger.warning(f"Interrupted; rerun with --resume to continue from {job.manifest_path}")
+        return 130
+    logger.info(
+        f"Batch scoring complete: {stats['rows']} rows ({stats['scored']} scored) in {stats['seconds']}s, "
+        f"{stats['rows_per_second'] or 0:,.0f} rows/s -> {stats['output']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark the healthcare dashboard analytics on synthetic prediction rows.
+
+Compares the single-pass grouped engine (dashboard_analytics) against the
+previous per-patient list-comprehension implementation and checks that both
+produce the same payload.
+
+Usage:
+    python benchmarks/bench_dashboard_analytics.py --rows 100000 --patients 5000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dashboard_analytics import build_healthcare_dashboard  # noqa: E402
+from time_utils import parse_datetime  # noqa: E402
+
+
+def synthetic_predictions(rows: int, patients: int, now: datetime, seed: int = 42) -> list:
+    """Prediction rows shaped like Supabase output, newest first."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        created = now - timedelta(seconds=rng.randint(0, 60 * 24 * 3600))
+        probability = rng.random()
+        patient = rng.randrange(patients)
+        records.append({
+            "id": f"pred-{i}",
+            "user_id": f"user-{patient}",
+            "user_email": f"patient{patient}@example.com",
+            "predicted_risk": "High Risk" if probability >= 0.5 else "Low Risk",
+            "probability": probability,
+            "created_at": created.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00"),
+        })
+    records.sort(key=lambda r: r["created_at"], reverse=True)
+    return records
+
+
+def resolve_contact(user_id, email):
+    return (f"Patient {user_id}", "+256700000000")
+
+
+def resolve_contacts(keys):
+    return {key: resolve_contact(*key) for key in keys}
+
+
+def legacy_dashboard(predictions_raw: list, now: datetime) -> dict:
+    """Previous implementation: O(patients x predictions) regrouping, 14 timestamp parses per row."""
+    predictions = []
+    for record in predictions_raw:
+        name, phone = resolve_contact(record.get("user_id"), record.get("user_email") or "")
+        predictions.append({**record, "patient_name": name, "phone": phone})
+
+    total_patients = len(set(p.get("user_email") for p in predictions if p.get("user_email")))
+    high = sum(1 for p in predictions if p.get("predicted_risk", "").lower().startswith("high"))
+    low = sum(1 for p in predictions if p.get("predicted_risk", "").lower().startswith("low"))
+
+    weekly_data = {}
+    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    for i in range(7):
+        day_date = now - timedelta(days=6 - i)
+        weekly_data[days[i]] = sum(
+            1 for p in predictions
+            if parse_datetime(p.get("created_at", "")) and
+            parse_datetime(p.get("created_at", "")).date() == day_date.date())
+
+    patient_latest = {}
+    for pred in predictions:
+        email = pred.get("user_email")
+        if email and (email not in patient_latest or pred.get("created_at", "") > patient_latest[email].get("created_at", "")):
+            patient_latest[email] = pred
+
+    high_risk_patients = [p for p in patient_latest.values() if p.get("predicted_risk", "").lower().startswith("high")]
+
+    seven_days_ago = (now - timedelta(days=7)).isoformat()
+    improved = []
+    for email, latest_pred in patient_latest.items():
+        if latest_pred.get("predicted_risk", "").lower().startswith("low"):
+            assessments = sorted([p for p in predictions if p.get("user_email") == email],
+                                 key=lambda x: x.get("created_at", ""), reverse=True)
+            for assessment in assessments:
+                if assessment.get("predicted_risk", "").lower().startswith("high"):
+                    if assessment.get("created_at", "") > seven_days_ago:
+                        prev_prob = assessment.get("probability", 0)
+                        curr_prob = latest_pred.get("probability", 0)
+                        improvement = ((prev_prob - curr_prob) / prev_prob * 100) if prev_prob > 0 else 0
+                        improved.append({"user_email": email, "improvement_percent": round(improvement, 1)})
+                    break
+    improved.sort(key=lambda x: x["improvement_percent"], reverse=True)
+
+    alerts = []
+    for email in patient_latest:
+        assessments = sorted([p for p in predictions if p.get("user_email") == email],
+                             key=lambda x: x.get("created_at", ""), reverse=True)
+        if len(assessments) >= 2 and assessments[0]["probability"] > assessments[1]["probability"]:
+            prev_prob = assessments[1]["probability"]
+            worsening = ((assessments[0]["probability"] - prev_prob) / prev_prob * 100) if prev_prob > 0 else 0
+            alerts.append({"user_email": email, "worsening_percent": round(worsening, 1)})
+    alerts.sort(key=lambda x: x["worsening_percent"], reverse=True)
+
+    return {
+        "statistics": {"total_patients": total_patients, "total_assessments": len(predictions),
+                       "high_risk_alerts": high, "low_risk_count": low},
+        "weekly_activity": weekly_data,
+        "high_risk_patients": [p["id"] for p in high_risk_patients[:10]],
+        "recently_improved_patients": [(p["user_email"], p["improvement_percent"]) for p in improved[:10]],
+        "at_risk_alerts": [(p["user_email"], p["worsening_percent"]) for p in alerts[:10]],
+    }
+
+
+def comparable(data: dict) -> dict:
+    stats = data["statistics"]
+    return {
+        "statistics": {k: stats[k] for k in ("total_patients", "total_assessments", "high_risk_alerts", "low_risk_count")},
+        "weekly_activity": data["weekly_activity"],
+        "high_risk_patients": [p["id"] for p in data["high_risk_patients"]],
+        "recently_improved_patients": [(p["user_email"], p["improvement_percent"]) for p in data["recently_improved_patients"]],
+        "at_risk_alerts": [(p["user_email"], p["worsening_percent"]) for p in data["at_risk_alerts"]],
+    }
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--legacy-rows", type=int, default=5000,
+                        help="Row count for the legacy comparison (it is quadratic)")
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+
+    # Equivalence check on a size the legacy implementation can handle
+    small = synthetic_predictions(args.legacy_rows, max(args.legacy_rows // 20, 1), now)
+    legacy, legacy_seconds = timed(legacy_dashboard, small, now)
+    grouped, grouped_small_seconds = timed(build_healthcare_dashboard, small, resolve_contacts, now)
+    assert comparable(grouped) == legacy, "grouped analytics diverged from the legacy implementation"
+    print(f"{args.legacy_rows:>7} rows  legacy: {legacy_seconds * 1000:9.1f} ms   "
+          f"grouped: {grouped_small_seconds * 1000:8.1f} ms   (outputs match)")
+
+    rows = synthetic_predictions(args.rows, args.patients, now)
+    _, grouped_seconds = timed(build_healthcare_dashboard, rows, resolve_contacts, now)
+    print(f"{args.rows:>7} rows  grouped: {grouped_seconds * 1000:8.1f} ms   "
+          f"({args.rows / grouped_seconds:,.0f} rows/s, {args.patients} patients)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /predict explanation levels (explain=none, fast, full).
+
+Times RiskScorer.score, which is what /predict and /predict/upload run, at
+each level for single rows, upload-sized chunks and larger batches, and
+reports how often the fast level's top-k features are the same set as the
+top-k of the exact SHAP values on the bundled datasets.
+
+Usage:
+    python benchmarks/bench_explain_levels.py
+    python benchmarks/bench_explain_levels.py --top-k 2 --repeat 500
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dataset_ingest import iter_harmonized  # noqa: E402
+from risk_scoring import EXPLAIN_LEVELS, TOP_FEATURES, RiskScorer  # noqa: E402
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATASETS = [
+    os.path.join(BASE_DIR, "dataset", "wombguard_dataset.csv"),
+    os.path.join(BASE_DIR, "dataset", "local_pregnancy_dataset.csv"),
+]
+
+
+def model_ready_rows(path: str, feature_names: list) -> pd.DataFrame:
+    chunks = [chunk.features[chunk.valid] for chunk in iter_harmonized(path)]
+    return pd.DataFrame(np.vstack(chunks), columns=feature_names)
+
+
+def top_sets(values: np.ndarray, k: int) -> np.ndarray:
+    return np.sort(np.argsort(-np.abs(values), axis=1, kind="stable")[:, :k], axis=1)
+
+
+def latencies(fn, repeat: int) -> list:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join(BASE_DIR, "wombguard_pregnancy_model.pkl"))
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per batch size")
+    parser.add_argument("--top-k", type=int, default=TOP_FEATURES)
+    args = parser.parse_args()
+
+    package = joblib.load(args.model)
+    scorer = RiskScorer(package["model"], package["scaler"], package["feature_names"], compiled=True)
+
+    frames = []
+    for path in DATASETS:
+        features = model_ready_rows(path, scorer.feature_names)
+        full_probabilities, full = scorer.predict(features, explain="full")
+        fast_probabilities, fast = scorer.predict(features, explain="fast")
+        assert np.array_equal(full_probabilities, fast_probabilities), "explanation level changed the probabilities"
+        agreement = (top_sets(full, args.top_k) == top_sets(fast, args.top_k)).all(axis=1).mean()
+        leader = (np.argmax(np.abs(full), axis=1) == np.argmax(np.abs(fast), axis=1)).mean()
+        print(f"{os.path.basename(path):<30} {len(features):>6} rows   fast top-{args.top_k} set matches full "
+              f"{agreement:.1%}, top feature {leader:.1%}")
+        frames.append(features)
+    rows = pd.concat(frames, ignore_index=True)
+
+    print(f"\n{'rows':>7}  " + "  ".join(f"{level + ' p50':>11}  {'p95':>8}" for level in EXPLAIN_LEVELS))
+    for size in (1, 8, 256, 2048):
+        features = rows.sample(n=size, replace=size > len(rows), random_state=size).reset_index(drop=True)
+        repeat = max(3, args.repeat * 8 // max(size, 8))
+        cells = []
+        for level in EXPLAIN_LEVELS:
+            samples = latencies(lambda: scorer.score(features, explain=level, top_k=args.top_k), repeat)
+            cells.append(f"{percentile(samples, 0.5):>8.3f} ms  {percentile(samples, 0.95):>5.3f} ms")
+        print(f"{size:>7}  " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pooled Postgres backend against per-request row shipping.
+
+Seeds synthetic users, predictions and chat_history rows into a scratch
+database on a local Postgres, then times the admin dashboard aggregates two
+ways and checks that both produce the same result:
+
+  shipped: a new connection per request, every prediction row sent to Python
+           and grouped there (what the PostgREST fallback path does)
+  pooled:  PostgresBackend over a bounded pool, grouped in SQL
+
+With --postgrest-url and --postgrest-key the shipped path is also timed
+against a real Supabase project over HTTPS (read-only, its own tables).
+
+Usage:
+    python benchmarks/bench_pg_backend.py --dsn postgresql://postgres@localhost/postgres --rows 100000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from admin_aggregates import group_predictions, recent_month_starts  # noqa: E402
+from pg_backend import PostgresBackend, _json_value  # noqa: E402
+from repository import CHAT_CONVERSATION_KEY, PREDICTION_STATS_ROW, fetch_all_pages  # noqa: E402
+
+SCRATCH_DATABASE = "wombguard_bench"
+
+SCHEMA = """
+CREATE TABLE users (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  email TEXT UNIQUE NOT NULL,
+  name TEXT,
+  role TEXT,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE predictions (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_email TEXT,
+  predicted_risk TEXT,
+  probability DOUBLE PRECISION,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE chat_history (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID,
+  conversation_id TEXT,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX idx_predictions_created_at ON predictions(created_at);
+CREATE INDEX idx_predictions_user_email ON predictions(user_email);
+"""
+
+
+def scratch_dsn(dsn: str) -> str:
+    return psycopg2.extensions.make_dsn(dsn, dbname=SCRATCH_DATABASE)
+
+
+def seed(dsn: str, rows: int, patients: int, chats: int, now: datetime, seed_value: int = 42):
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {SCRATCH_DATABASE}")
+        cursor.execute(f"CREATE DATABASE {SCRATCH_DATABASE}")
+    admin.close()
+
+    rng = random.Random(seed_value)
+    conn = psycopg2.connect(scratch_dsn(dsn))
+    with conn, conn.cursor() as cursor:
+        cursor.execute(SCHEMA)
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO users (email, name, role) VALUES %s",
+            [(f"patient{i}@example.com", f"Patient {i}", "pregnant_woman") for i in range(patients)],
+            page_size=1000,
+        )
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO predictions (user_email, predicted_risk, probability, created_at) VALUES %s",
+            [
+                (
+                    f"patient{rng.randrange(patients)}@example.com",
+                    "High Risk" if probability >= 0.5 else "Low Risk",
+                    probability,
+                    now - timedelta(seconds=rng.randint(0, 240 * 24 * 3600)),
+                )
+                for probability in (rng.random() for _ in range(rows))
+            ],
+            page_size=1000,
+        )
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO chat_history (conversation_id, created_at) VALUES %s",
+            [(f"conv-{rng.randrange(max(chats // 4, 1))}", now) for _ in range(chats)],
+            page_size=1000,
+        )
+        cursor.execute("ANALYZE")
+    conn.close()
+
+
+def shipped_aggregates(dsn: str) -> dict:
+    """Connect, pull every needed row, group in Python."""
+    conn = psycopg2.connect(dsn, options="-c timezone=UTC")
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute(f"SELECT {PREDICTION_STATS_ROW.columns} FROM predictions")
+            rows = [{k: _json_value(v) for k, v in row.items()} for row in cursor.fetchall()]
+            cursor.execute(f"SELECT {CHAT_CONVERSATION_KEY.columns} FROM chat_history")
+            conversations = cursor.fetchall()
+    finally:
+        conn.close()
+    aggregates = group_predictions(rows)
+    aggregates["chat_sessions"] = len({c["conversation_id"] for c in conversations if c["conversation_id"]})
+    return aggregates
+
+
+def postgrest_aggregates(url: str, key: str) -> dict:
+    from supabase import create_client
+    client = create_client(url, key)
+    aggregates = group_predictions(fetch_all_pages(lambda: PREDICTION_STATS_ROW.query(client).order("id")))
+    conversations = fetch_all_pages(lambda: CHAT_CONVERSATION_KEY.query(client).order("id"))
+    aggregates["chat_sessions"] = len({c.get("conversation_id") for c in conversations if c.get("conversation_id")})
+    return aggregates
+
+
+def comparable(aggregates: dict, since) -> dict:
+    return {
+        "totals": (aggregates["total_assessments"], aggregates["high_risk_cases"], aggregates["low_risk_cases"]),
+        "per_user": aggregates["per_user"],
+        "month_counts": {k: v for k, v in aggregates["month_counts"].items() if k >= since},
+        "chat_sessions": aggregates["chat_sessions"],
+    }
+
+
+def measure(fn, iterations: int, concurrency: int) -> list:
+    def one(_):
+        started = time.perf_counter()
+        fn()
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(iterations)))
+
+
+def report(label: str, latencies: list):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label:<10} p50: {statistics.median(ordered):8.1f} ms   p95: {p95:8.1f} ms   ({len(ordered)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True, help="Local Postgres to create the scratch database on")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--postgrest-url", help="Optional Supabase URL to time the HTTPS path")
+    parser.add_argument("--postgrest-key", help="Service key for --postgrest-url")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    months = 6
+    since = recent_month_starts(now, months)[-1]
+
+    started = time.perf_counter()
+    seed(args.dsn, args.rows, args.patients, args.chats, now)
+    print(f"Seeded {args.rows} predictions for {args.patients} patients in {time.perf_counter() - started:.1f}s")
+
+    dsn = scratch_dsn(args.dsn)
+    backend = PostgresBackend(dsn, min_connections=1, max_connections=args.pool_size)
+    try:
+        pooled = backend.admin_aggregates(months, since)
+        shipped = shipped_aggregates(dsn)
+        assert comparable(pooled, since) == comparable(shipped, since), "pooled SQL aggregates diverged from Python"
+        print("pooled SQL and Python aggregates match")
+
+        report("shipped", measure(lambda: shipped_aggregates(dsn), args.iterations, args.concurrency))
+        report("pooled", measure(lambda: backend.admin_aggregates(months, since), args.iterations, args.concurrency))
+        stats = backend.stats()
+        print(f"pool: {stats['max_connections']} connections, {stats['acquire_waits']} waits, "
+              f"{stats['acquire_timeouts']} timeouts, {stats['rows']} rows returned")
+
+        if args.postgrest_url and args.postgrest_key:
+            report("postgrest", measure(
+                lambda: postgrest_aggregates(args.postgrest_url, args.postgrest_key),
+                max(args.iterations // 4, 1), 1))
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
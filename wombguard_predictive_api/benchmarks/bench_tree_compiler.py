@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compiled forest (tree_compiler) against scikit-learn predict_proba.
+
+Checks that both give bitwise identical probabilities on every model-ready
+row of the bundled datasets, then times scaling plus predict_proba through
+RiskScorer for single-row /predict calls, upload-sized chunks and batch
+scoring sizes.
+
+Usage:
+    python benchmarks/bench_tree_compiler.py
+    python benchmarks/bench_tree_compiler.py --model candidate.pkl --repeat 500 --batch-rows 200000
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dataset_ingest import iter_harmonized  # noqa: E402
+from risk_scoring import RiskScorer  # noqa: E402
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATASETS = [
+    os.path.join(BASE_DIR, "dataset", "wombguard_dataset.csv"),
+    os.path.join(BASE_DIR, "dataset", "local_pregnancy_dataset.csv"),
+]
+
+
+def model_ready_rows(path: str, feature_names: list) -> pd.DataFrame:
+    chunks = [chunk.features[chunk.valid] for chunk in iter_harmonized(path)]
+    return pd.DataFrame(np.vstack(chunks), columns=feature_names)
+
+
+def latencies(fn, features: pd.DataFrame, repeat: int) -> list:
+    fn(features)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(features)
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join(BASE_DIR, "wombguard_pregnancy_model.pkl"))
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per batch size")
+    parser.add_argument("--batch-rows", type=int, default=50000, help="Largest batch size timed")
+    args = parser.parse_args()
+
+    package = joblib.load(args.model)
+    scorer = RiskScorer(package["model"], package["scaler"], package["feature_names"], compiled=True)
+    if scorer.forest is None:
+        sys.exit(f"{type(package['model']).__name__} could not be compiled")
+    print(f"Compiled forest: {scorer.forest.describe()}")
+
+    frames = []
+    for path in DATASETS:
+        features = model_ready_rows(path, scorer.feature_names)
+        expected = scorer.probabilities(features, compiled=False)
+        actual = scorer.probabilities(features, compiled=True)
+        assert np.array_equal(expected, actual), f"compiled forest diverged from scikit-learn on {path}"
+        print(f"{os.path.basename(path):<30} {len(features):>6} rows   (probabilities match exactly)")
+        frames.append(features)
+    rows = pd.concat(frames, ignore_index=True)
+
+    print(f"\n{'rows':>7}  {'sklearn p50':>12}  {'p95':>8}  {'compiled p50':>13}  {'p95':>8}  {'speedup':>8}")
+    for size in (1, 8, 256, 1024, 4096, args.batch_rows):
+        features = rows.sample(n=size, replace=size > len(rows), random_state=size).reset_index(drop=True)
+        repeat = max(3, args.repeat * 256 // max(size, 256))
+        baseline = latencies(lambda f: scorer.probabilities(f, compiled=False), features, repeat)
+        compiled = latencies(lambda f: scorer.probabilities(f, compiled=True), features, repeat)
+        print(f"{size:>7}  {percentile(baseline, 0.5):>9.3f} ms  {percentile(baseline, 0.95):>5.3f} ms  "
+              f"{percentile(compiled, 0.5):>10.3f} ms  {percentile(compiled, 0.95):>5.3f} ms  "
+              f"{percentile(baseline, 0.5) / percentile(compiled, 0.5):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark batched TreeSHAP (tree_shap) against shap.TreeExplainer.
+
+Checks that both give the same SHAP values, to within --tolerance, on every
+model-ready row of the bundled datasets, and that TreeShap's values add up
+to the compiled forest's probabilities. Then times both explainers for
+single-row /predict calls, upload-sized chunks and batch scoring sizes.
+
+Usage:
+    python benchmarks/bench_tree_shap.py
+    python benchmarks/bench_tree_shap.py --model candidate.pkl --repeat 50
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dataset_ingest import iter_harmonized  # noqa: E402
+from risk_scoring import HIGH_RISK_CLASS  # noqa: E402
+from tree_compiler import CompiledForest  # noqa: E402
+from tree_shap import TreeShap  # noqa: E402
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATASETS = [
+    os.path.join(BASE_DIR, "dataset", "wombguard_dataset.csv"),
+    os.path.join(BASE_DIR, "dataset", "local_pregnancy_dataset.csv"),
+]
+
+
+def model_ready_rows(path: str, feature_names: list) -> pd.DataFrame:
+    chunks = [chunk.features[chunk.valid] for chunk in iter_harmonized(path)]
+    return pd.DataFrame(np.vstack(chunks), columns=feature_names)
+
+
+def shap_class_values(explainer, scaled: np.ndarray) -> np.ndarray:
+    values = explainer.shap_values(scaled)
+    if isinstance(values, list):
+        return np.asarray(values[HIGH_RISK_CLASS])
+    values = np.asarray(values)
+    return values[:, :, HIGH_RISK_CLASS] if values.ndim == 3 else values
+
+
+def latencies(fn, scaled: np.ndarray, repeat: int) -> list:
+    fn(scaled)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(scaled)
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join(BASE_DIR, "wombguard_pregnancy_model.pkl"))
+    parser.add_argument("--repeat", type=int, default=100, help="Timed calls per batch size")
+    parser.add_argument("--batch-rows", type=int, default=4096, help="Largest batch size timed")
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    package = joblib.load(args.model)
+    model, scaler = package["model"], package["scaler"]
+    forest = CompiledForest(model)
+
+    started = time.perf_counter()
+    fast = TreeShap(forest, class_index=HIGH_RISK_CLASS)
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    import shap
+    import_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    reference = shap.TreeExplainer(model)
+    reference_seconds = time.perf_counter() - started
+    print(f"TreeShap tables: {fast.describe()} built in {build_seconds * 1000:.0f} ms")
+    print(f"shap: import {import_seconds * 1000:.0f} ms, TreeExplainer built in {reference_seconds * 1000:.0f} ms")
+
+    frames = []
+    for path in DATASETS:
+        scaled = scaler.transform(model_ready_rows(path, package["feature_names"]))
+        error = np.abs(fast.shap_values(scaled) - shap_class_values(reference, scaled)).max()
+        assert error <= args.tolerance, f"TreeShap differs from shap by {error:.3g} on {path}"
+        additivity = np.abs(
+            fast.shap_values(scaled).sum(axis=1) + fast.expected_value
+            - forest.predict_proba(scaled)[:, HIGH_RISK_CLASS]).max()
+        assert additivity <= args.tolerance, f"TreeShap values miss the probabilities by {additivity:.3g}"
+        print(f"{os.path.basename(path):<30} {len(scaled):>6} rows   "
+              f"max |TreeShap - shap| {error:.2g}, max additivity error {additivity:.2g}")
+        frames.append(scaled)
+    rows = np.vstack(frames)
+
+    print(f"\n{'rows':>7}  {'shap p50':>10}  {'p95':>8}  {'TreeShap p50':>13}  {'p95':>8}  {'speedup':>8}")
+    rng = np.random.default_rng(0)
+    for size in (1, 8, 256, 1024, args.batch_rows):
+        scaled = rows[rng.integers(0, len(rows), size)]
+        repeat = max(3, args.repeat * 8 // max(size, 8))
+        baseline = latencies(lambda x: shap_class_values(reference, x), scaled, repeat)
+        compiled = latencies(fast.shap_values, scaled, repeat)
+        print(f"{size:>7}  {percentile(baseline, 0.5):>7.3f} ms  {percentile(baseline, 0.95):>5.3f} ms  "
+              f"{percentile(compiled, 0.5):>10.3f} ms  {percentile(compiled, 0.95):>5.3f} ms  "
+              f"{percentile(baseline, 0.5) / percentile(compiled, 0.5):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+WombGuard Contact Resolver
+Per-request batched lookup of patient names and phone numbers
+"""
+
+import logging
+import threading
+
+from identity_cache import get_identity_cache, normalize_email
+from pg_backend import get_pg_backend
+from repository import USER_IDENTITY, quote_filter_value
+
+logger = logging.getLogger(__name__)
+
+# Keys per users query; keeps the or=(id.in.(...),email.in.(...)) filter well under URL limits
+BATCH_SIZE = 100
+
+UNKNOWN_CONTACT = ("Unknown", "N/A")
+
+_MISSING = object()
+
+# Totals across all requests, reported by /metrics
+_totals_lock = threading.Lock()
+_totals = {"requests": 0, "keys": 0, "memo_hits": 0, "cache_hits": 0, "fetched": 0, "queries": 0}
+
+
+def _contact(record) -> tuple:
+    if not record:
+        return UNKNOWN_CONTACT
+    phone = (record.get("phone") or "").strip()
+    return record.get("name") or "Unknown", phone or "N/A"
+
+
+class ContactResolver:
+    """
+    Dataloader-style resolver for (user_id, email) -> (name, phone).
+
+    load_many() answers every key it can from its per-request memo and the
+    shared identity cache, then fetches all remaining ids and emails together
+    in one users query per BATCH_SIZE keys. Results, including users that do
+    not exist, are memoized for the rest of the request, so the caller never
+    pays more than one round trip per batch regardless of how many rows need
+    contact details.
+    """
+
+    def __init__(self, client=None, identity_cache=None, endpoint: str = "unknown"):
+        self._client = client
+        self._identity_cache = identity_cache
+        self.endpoint = endpoint
+        self._by_email = {}
+        self._by_id = {}
+        self.stats = {"keys": 0, "memo_hits": 0, "cache_hits": 0, "fetched": 0, "queries": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase_client import supabase
+            self._client = supabase
+        return self._client
+
+    @property
+    def identity_cache(self):
+        if self._identity_cache is None:
+            self._identity_cache = get_identity_cache()
+        return self._identity_cache
+
+    def _remember(self, record: dict):
+        email = normalize_email(record.get("email"))
+        if email:
+            self._by_email[email] = record
+        if record.get("id"):
+            self._by_id[str(record["id"])] = record
+
+    def _memo_lookup(self, user_id, email):
+        record = self._by_email.get(email, _MISSING) if email else _MISSING
+        if record is _MISSING and user_id:
+            record = self._by_id.get(str(user_id), _MISSING)
+        return record
+
+    def _query(self, ids: list, emails: list) -> list:
+        backend = get_pg_backend()
+        if backend is not None:
+            try:
+                return backend.users_by_ids_or_emails(USER_IDENTITY, ids, emails)
+            except Exception as e:
+                logger.warning(f" Postgres backend failed for contact lookup, using Supabase: {e}")
+        filters = []
+        if ids:
+            filters.append(f"id.in.({','.join(quote_filter_value(i) for i in ids)})")
+        if emails:
+            filters.append(f"email.in.({','.join(quote_filter_value(e) for e in emails)})")
+        return USER_IDENTITY.query(self.client).or_(",".join(filters)).execute().data or []
+
+    def _fetch(self, ids: list, emails: list):
+        try:
+            records = self._query(ids, emails)
+            self.stats["queries"] += 1
+        except Exception as e:
+            logger.warning(f" Could not resolve contact details for {len(ids) + len(emails)} users: {e}")
+            return
+        self.identity_cache.prime(records)
+        for record in records:
+            self._remember(record)
+        self.stats["fetched"] += len(records)
+
+    def load_many(self, keys) -> dict:
+        """Resolve (user_id, email) keys to (name, phone), fetching everything not yet known in one batch."""
+        keys = list(dict.fromkeys(keys))
+        pending = []
+        for user_id, email in keys:
+            email = normalize_email(email)
+            if self._memo_lookup(user_id, email) is not _MISSING:
+                self.stats["memo_hits"] += 1
+                continue
+            record = self.identity_cache.peek(user_id=user_id, email=email, endpoint=self.endpoint)
+            if record is not None:
+                self.stats["cache_hits"] += 1
+                self._remember(record)
+                continue
+            pending.append((user_id, email))
+
+        for start in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[start:start + BATCH_SIZE]
+            ids = sorted({str(user_id) for user_id, _ in chunk if user_id})
+            emails = sorted({email for _, email in chunk if email})
+            self._fetch(ids, emails)
+            # Remember misses so they are not fetched again during this request
+            for user_id, email in chunk:
+                if self._memo_lookup(user_id, email) is _MISSING:
+                    if email:
+                        self._by_email[email] = None
+                    if user_id:
+                        self._by_id[str(user_id)] = None
+
+        self.stats["keys"] += len(keys)
+        results = {}
+        for key in keys:
+            user_id, email = key
+            record = self._memo_lookup(user_id, normalize_email(email))
+            results[key] = _contact(None if record is _MISSING else record)
+        return results
+
+    def __call__(self, keys) -> dict:
+        return self.load_many(keys)
+
+    def resolve(self, user_id, email) -> tuple:
+        """Single-key convenience wrapper around load_many()."""
+        return self.load_many([(user_id, email)])[(user_id, email)]
+
+    @property
+    def keys_per_query(self) -> float:
+        """Keys resolved per users query sent (None when every key came from the memo or cache)."""
+        return _keys_per_query(self.stats)
+
+    def finish(self):
+        """Add this request's counters to the process-wide totals."""
+        with _totals_lock:
+            _totals["requests"] += 1
+            for name, value in self.stats.items():
+                _totals[name] += value
+
+
+def _keys_per_query(counts: dict) -> float:
+    return round(counts["keys"] / counts["queries"], 2) if counts["queries"] else None
+
+
+def contact_resolver_stats() -> dict:
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["keys_per_query"] = _keys_per_query(totals)
+    return totals
@@ -0,0 +1,295 @@
+"""
+WombGuard Dashboard Analytics
+Single-pass grouped analytics over prediction rows for the healthcare worker dashboard
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+from time_utils import parse_utc_naive
+
+WEEKDAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+class PredictionColumns:
+    """
+    Compact columnar view of prediction rows.
+    Every timestamp and risk label is parsed exactly once; analytics then work on parallel lists.
+    """
+
+    __slots__ = ("rows", "emails", "created_raw", "created_at", "probability", "is_high", "is_low")
+
+    def __init__(self, rows: list = None):
+        self.rows = []
+        self.emails = []
+        self.created_raw = []
+        self.created_at = []
+        self.probability = []
+        self.is_high = []
+        self.is_low = []
+        for row in rows or []:
+            self.append(row)
+
+    def append(self, row: dict) -> int:
+        """Add one row (parsing it once) and return its index."""
+        self.rows.append(row)
+        risk = (row.get("predicted_risk") or "").lower()
+        created_raw = row.get("created_at") or ""
+        self.emails.append(row.get("user_email") or "")
+        self.created_raw.append(created_raw)
+        self.created_at.append(parse_utc_naive(created_raw))
+        self.probability.append(row.get("probability", 0) or 0)
+        self.is_high.append(risk.startswith("high"))
+        self.is_low.append(risk.startswith("low"))
+        return len(self.emails) - 1
+
+    def __len__(self):
+        return len(self.emails)
+
+
+class PatientSummary:
+    """
+    Per-patient aggregates needed by the dashboard.
+
+    Ordering follows the existing dashboard semantics: assessments rank by
+    created_at (newest first) and ties keep their original row order.
+    """
+
+    __slots__ = ("email", "count", "high_count", "latest", "previous", "latest_high")
+
+    def __init__(self, email: str):
+        self.email = email
+        self.count = 0
+        self.high_count = 0
+        self.latest = None       # (created_raw, row)
+        self.previous = None     # (created_raw, row)
+        self.latest_high = None  # (created_raw, row)
+
+    def add(self, created_raw: str, row: dict, is_high: bool):
+        self.count += 1
+        if is_high:
+            self.high_count += 1
+        entry = (created_raw, row)
+        if self.latest is None or created_raw > self.latest[0]:
+            self.previous = self.latest
+            self.latest = entry
+        elif self.previous is None or created_raw > self.previous[0]:
+            self.previous = entry
+        if is_high and (self.latest_high is None or created_raw > self.latest_high[0]):
+            self.latest_high = entry
+
+
+def group_by_patient(columns: PredictionColumns) -> dict:
+    """Group rows by patient email in a single pass. Dict order is first appearance in the rows."""
+    patients = {}
+    for i, email in enumerate(columns.emails):
+        if not email:
+            continue
+        summary = patients.get(email)
+        if summary is None:
+            summary = patients[email] = PatientSummary(email)
+        summary.add(columns.created_raw[i], columns.rows[i], columns.is_high[i])
+    return patients
+
+
+def weekly_activity(day_counts: Counter, today: datetime) -> dict:
+    """Assessment counts for the last 7 days, labelled in the dashboard's Mon..Sun slot order."""
+    weekly_data = {}
+    for i in range(7):
+        day_date = (today - timedelta(days=6 - i)).date()
+        weekly_data[WEEKDAY_LABELS[i]] = day_counts.get(day_date, 0)
+    return weekly_data
+
+
+def count_by_day(columns: PredictionColumns) -> Counter:
+    return Counter(dt.date() for dt in columns.created_at if dt)
+
+
+def _is_high(row: dict) -> bool:
+    return (row.get("predicted_risk") or "").lower().startswith("high")
+
+
+def _is_low(row: dict) -> bool:
+    return (row.get("predicted_risk") or "").lower().startswith("low")
+
+
+def _with_contact_slots(row: dict) -> dict:
+    return {**row, "patient_name": None, "phone": None}
+
+
+def high_risk_patients(patients, limit: int = None) -> list:
+    """Patients whose most recent assessment is high risk, as (entry, contact_key) pairs."""
+    results = []
+    for summary in patients:
+        if limit is not None and len(results) >= limit:
+            break
+        latest = summary.latest[1]
+        if _is_high(latest):
+            results.append((_with_contact_slots(latest), (latest.get("user_id"), summary.email)))
+    return results
+
+
+def recently_improved_patients(patients, now: datetime) -> list:
+    """
+    Patients now low risk whose most recent high-risk assessment was within the last 7 days,
+    as (entry, contact_key) pairs sorted by improvement.
+    """
+    seven_days_ago = (now - timedelta(days=7)).isoformat()
+    results = []
+    for summary in patients:
+        email = summary.email
+        latest_pred = summary.latest[1]
+        if not _is_low(latest_pred) or summary.latest_high is None:
+            continue
+        created_at, assessment = summary.latest_high
+        if created_at <= seven_days_ago:
+            continue
+
+        prev_prob = assessment.get("probability", 0)
+        curr_prob = latest_pred.get("probability", 0)
+        improvement = ((prev_prob - curr_prob) / prev_prob * 100) if prev_prob > 0 else 0
+
+        latest_dt = parse_utc_naive(latest_pred.get("created_at", ""))
+        high_dt = parse_utc_naive(created_at)
+
+        results.append(({
+            "user_email": email,
+            "patient_name": None,
+            "phone": None,
+            "previous_risk": assessment.get("predicted_risk"),
+            "previous_probability": prev_prob,
+            "current_risk": latest_pred.get("predicted_risk"),
+            "current_probability": curr_prob,
+            "improvement_percent": round(improvement, 1),
+            "high_risk_date": created_at,
+            "latest_date": latest_pred.get("created_at"),
+            "days_improved": (latest_dt - high_dt).days if latest_dt and high_dt else 0
+        }, (latest_pred.get("user_id"), email)))
+
+    results.sort(key=lambda pair: pair[0].get("improvement_percent", 0), reverse=True)
+    return results
+
+
+def at_risk_alerts(patients) -> list:
+    """
+    Patients whose latest probability rose compared with their previous assessment,
+    as (entry, contact_key) pairs sorted by how much it rose.
+    """
+    results = []
+    for summary in patients:
+        email = summary.email
+        if summary.previous is None:
+            continue
+        latest = summary.latest[1]
+        previous = summary.previous[1]
+        latest_prob = latest.get("probability", 0)
+        prev_prob = previous.get("probability", 0)
+        if latest_prob <= prev_prob:
+            continue
+
+        worsening_percent = ((latest_prob - prev_prob) / prev_prob * 100) if prev_prob > 0 else 0
+        # Flag if worsening significantly (>10% increase)
+        trend = "worsening" if worsening_percent > 10 else "increasing"
+
+        results.append(({
+            "user_email": email,
+            "patient_name": None,
+            "phone": None,
+            "current_risk": latest.get("predicted_risk"),
+            "current_probability": latest_prob,
+            "previous_probability": prev_prob,
+            "trend": trend,
+            "worsening_percent": round(worsening_percent, 1),
+            "latest_date": latest.get("created_at"),
+            "previous_date": previous.get("created_at")
+        }, (latest.get("user_id"), email)))
+
+    results.sort(key=lambda pair: pair[0].get("worsening_percent", 0), reverse=True)
+    return results
+
+
+def attach_contacts(pairs: list, resolve_contacts) -> list:
+    """
+    Fill patient_name/phone on every (entry, contact_key) pair with a single
+    resolve_contacts(keys) -> {key: (name, phone)} call, and return the entries.
+    """
+    contacts = resolve_contacts(list(dict.fromkeys(key for _, key in pairs))) if pairs else {}
+    entries = []
+    for entry, key in pairs:
+        entry["patient_name"], entry["phone"] = contacts.get(key, ("Unknown", "N/A"))
+        entries.append(entry)
+    return entries
+
+
+def assemble_healthcare_dashboard(
+        patients,
+        patient_count: int,
+        total_assessments: int,
+        high_risk_count: int,
+        low_risk_count: int,
+        day_counts: Counter,
+        recent_rows: list,
+        resolve_contacts,
+        now: datetime) -> dict:
+    """
+    Build the /healthcare-dashboard payload from pre-aggregated state.
+    patients must iterate PatientSummary objects, most recently assessed first.
+    Contacts are looked up once, in one batch, for just the rows in the response.
+    """
+    patients = list(patients)
+    improved = recently_improved_patients(patients, now)
+    alerts = at_risk_alerts(patients)
+    high_risk = high_risk_patients(patients, limit=10)
+    recent = [
+        (_with_contact_slots(record), (record.get("user_id"), record.get("user_email") or ""))
+        for record in recent_rows[:50]
+    ]
+    attach_contacts(high_risk + improved[:10] + alerts[:10] + recent, resolve_contacts)
+
+    return {
+        "statistics": {
+            "total_patients": patient_count,
+            "total_assessments": total_assessments,
+            "high_risk_alerts": high_risk_count,
+            "low_risk_count": low_risk_count,
+            "consultation_requests": 0,
+            "recently_improved_count": len(improved),
+            "at_risk_alerts_count": len(alerts)
+        },
+        "weekly_activity": weekly_activity(day_counts, now),
+        "risk_distribution": {
+            "high_risk": high_risk_count,
+            "low_risk": low_risk_count
+        },
+        # Top 10 high-risk patients (CURRENT HIGH RISK)
+        "high_risk_patients": [entry for entry, _ in high_risk],
+        # Recently improved patients (FOLLOW-UP)
+        "recently_improved_patients": [entry for entry, _ in improved[:10]],
+        # At-risk alerts (WORSENING TRENDS)
+        "at_risk_alerts": [entry for entry, _ in alerts[:10]],
+        # All recent assessments
+        "all_assessments": [entry for entry, _ in recent]
+    }
+
+
+def build_healthcare_dashboard(predictions: list, resolve_contacts, now: datetime = None) -> dict:
+    """
+    Compute the /healthcare-dashboard payload from prediction rows (newest first).
+
+    resolve_contacts([(user_id, email), ...]) -> {key: (name, phone)} is called
+    once, only with the keys of rows that appear in the response.
+    """
+    now = now or datetime.utcnow()
+    columns = PredictionColumns(predictions)
+    patients = group_by_patient(columns)
+    return assemble_healthcare_dashboard(
+        patients.values(),
+        patient_count=len(patients),
+        total_assessments=len(columns),
+        high_risk_count=sum(columns.is_high),
+        low_risk_count=sum(columns.is_low),
+        day_counts=count_by_day(columns),
+        recent_rows=predictions,
+        resolve_contacts=resolve_contacts,
+        now=now,
+    )
@@ -0,0 +1,314 @@
+"""
+WombGuard Dashboard State
+In-process aggregate store for dashboard reads, updated incrementally as predictions are written
+"""
+
+import os
+import bisect
+import logging
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from dashboard_analytics import PatientSummary, assemble_healthcare_dashboard
+from pg_backend import get_pg_backend
+from repository import PREDICTION_DASHBOARD_ROW, fetch_all_pages
+from time_utils import parse_utc_naive
+
+logger = logging.getLogger(__name__)
+
+RECENT_ASSESSMENTS = 50
+RECENT_PER_PATIENT = 5
+
+
+class _Aggregates:
+    """One consistent generation of dashboard aggregates."""
+
+    def __init__(self):
+        # email -> PatientSummary, least recently assessed first
+        self.patients = OrderedDict()
+        self.recent_by_patient = {}
+        self.day_counts = Counter()
+        self.total = 0
+        self.high = 0
+        self.low = 0
+        # Newest-last list of (created_at, seq, row) for the global recent feed
+        self.recent = []
+        self.ids = set()
+        self.seq = 0
+
+    def apply(self, row: dict):
+        row_id = row.get("id")
+        if row_id is not None:
+            if row_id in self.ids:
+                return
+            self.ids.add(row_id)
+
+        self.seq += 1
+        created_raw = row.get("created_at") or ""
+        risk = (row.get("predicted_risk") or "").lower()
+        is_high = risk.startswith("high")
+
+        self.total += 1
+        if is_high:
+            self.high += 1
+        elif risk.startswith("low"):
+            self.low += 1
+
+        created_at = parse_utc_naive(created_raw)
+        if created_at:
+            self.day_counts[created_at.date()] += 1
+
+        email = row.get("user_email") or ""
+        if email:
+            summary = self.patients.get(email)
+            if summary is None:
+                summary = self.patients[email] = PatientSummary(email)
+            summary.add(created_raw, row, is_high)
+            if summary.latest[1] is row:
+                self.patients.move_to_end(email)
+
+            recent = self.recent_by_patient.get(email)
+            if recent is None:
+                recent = self.recent_by_patient[email] = []
+            bisect.insort(recent, (created_raw, self.seq, row))
+            del recent[:-RECENT_PER_PATIENT]
+
+        bisect.insort(self.recent, (created_raw, self.seq, row))
+        del self.recent[:-RECENT_ASSESSMENTS]
+
+
+class DashboardAggregateStore:
+    """
+    Dashboard aggregates held in memory.
+
+    Seeded once from the predictions table and then updated by
+    record_prediction() on every write, so dashboard reads cost O(patients)
+    at most instead of a full-table fetch. A background reconciliation job
+    periodically rebuilds the aggregates from the database to correct drift,
+    e.g. from rows written by other worker processes or deleted by admins.
+    """
+
+    def __init__(self, reconcile_interval_seconds: float = 300.0, client=None, spool=None):
+        self.reconcile_interval_seconds = reconcile_interval_seconds
+        self._client = client
+        self._spool = spool
+        self._state = None
+        self._generation = 0
+        self._lock = threading.RLock()
+        # Serializes rebuilds so only one owns _pending_since_rebuild at a time
+        self._rebuild_lock = threading.Lock()
+        self._pending_since_rebuild = None
+        self._stopping = threading.Event()
+        self._worker = None
+        self._metrics = {
+            "recorded": 0,
+            "reconciliations": 0,
+            "last_reconciled_at": None,
+            "last_drift": None,
+            "last_error": None,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase_client import supabase
+            self._client = supabase
+        return self._client
+
+    @property
+    def spool(self):
+        if self._spool is None:
+            from prediction_spool import get_prediction_spool
+            self._spool = get_prediction_spool()
+        return self._spool
+
+    def _fetch_all_predictions(self) -> list:
+        backend = get_pg_backend()
+        if backend is not None:
+            try:
+                return backend.fetch_projection(PREDICTION_DASHBOARD_ROW, order_by=("created_at", "id"))
+            except Exception as e:
+                logger.warning(f" Postgres backend failed for dashboard seed, using Supabase: {e}")
+        return fetch_all_pages(
+            lambda: PREDICTION_DASHBOARD_ROW.query(self.client)
+            .order("created_at", desc=False)
+            .order("id", desc=False)
+        )
+
+    def _rebuild(self) -> tuple:
+        """
+        Build a fresh generation from the database plus the rows the prediction
+        spool has not delivered yet, replaying rows recorded while it was loading.
+        Returns (previous, installed); installed is None when invalidate() ran
+        during the fetch, since the fetch may predate the delete. Caller holds
+        the rebuild lock.
+        """
+        with self._lock:
+            self._pending_since_rebuild = []
+            generation = self._generation
+        try:
+            # Read before the fetch: a row delivered in between is in both and applied once (by id)
+            spooled = self.spool.pending_rows()
+            rows = self._fetch_all_predictions()
+            state = _Aggregates()
+            for row in rows:
+                state.apply(row)
+            for row in spooled:
+                state.apply(PREDICTION_DASHBOARD_ROW.pick(row))
+        except Exception:
+            with self._lock:
+                self._pending_since_rebuild = None
+            raise
+
+        with self._lock:
+            # Rows recorded during the fetch may be in neither the spool snapshot nor the fetch
+            for row in self._pending_since_rebuild:
+                state.apply(row)
+            self._pending_since_rebuild = None
+            previous = self._state
+            if self._generation != generation:
+                return previous, None
+            self._state = state
+        return previous, state
+
+    def ensure_seeded(self) -> _Aggregates:
+        """The current aggregates, seeding them from the database first if there are none."""
+        state = self._state
+        if state is not None:
+            return state
+        with self._rebuild_lock:
+            while True:
+                state = self._state
+                if state is not None:
+                    return state
+                _, state = self._rebuild()
+                if state is not None:
+                    logger.info(f"Dashboard store seeded with {state.total} predictions")
+                    return state
+
+    def invalidate(self):
+        """Drop all aggregates; the next read reseeds from the database (used after bulk deletes)."""
+        with self._lock:
+            self._generation += 1
+            self._state = None
+
+    def record_prediction(self, row: dict):
+        """Apply a newly written prediction to the aggregates."""
+        # Hold the same columns a seeded row has, without the feature_importance blob
+        row = PREDICTION_DASHBOARD_ROW.pick(row)
+        with self._lock:
+            self._metrics["recorded"] += 1
+            if self._pending_since_rebuild is not None:
+                self._pending_since_rebuild.append(row)
+            if self._state is not None:
+                self._state.apply(row)
+
+    def reconcile(self):
+        """Rebuild from the database and report how far the incremental state had drifted."""
+        with self._rebuild_lock:
+            previous, current = self._rebuild()
+        if current is None:
+            logger.info("Dashboard store reconciliation discarded, aggregates were invalidated during the fetch")
+            return
+        with self._lock:
+            drift = None
+            if previous is not None:
+                drift = {
+                    "total": current.total - previous.total,
+                    "high_risk": current.high - previous.high,
+                    "low_risk": current.low - previous.low,
+                    "patients": len(current.patients) - len(previous.patients),
+                }
+            self._metrics["reconciliations"] += 1
+            self._metrics["last_reconciled_at"] = datetime.utcnow().isoformat()
+            self._metrics["last_drift"] = drift
+        if drift and any(drift.values()):
+            logger.info(f"Dashboard store reconciled, corrected drift: {drift}")
+
+    def healthcare_dashboard(self, resolve_contacts, now: datetime = None, day_counts: Counter = None) -> dict:
+        """
+        The /healthcare-dashboard payload served from memory.
+        day_counts overrides the in-process daily buckets (e.g. with database rollups).
+        """
+        state = self.ensure_seeded()
+        # Snapshot under the lock; contact resolution may hit the network so it runs outside it
+        with self._lock:
+            patients = list(reversed(state.patients.values()))
+            totals = (state.total, state.high, state.low)
+            if day_counts is None:
+                day_counts = Counter(state.day_counts)
+            recent_rows = [row for _, _, row in reversed(state.recent)]
+
+        return assemble_healthcare_dashboard(
+            patients,
+            patient_count=len(patients),
+            total_assessments=totals[0],
+            high_risk_count=totals[1],
+            low_risk_count=totals[2],
+            day_counts=day_counts,
+            recent_rows=recent_rows,
+            resolve_contacts=resolve_contacts,
+            now=now or datetime.utcnow(),
+        )
+
+    def patient_stats(self, email: str) -> dict:
+        """Assessment counts and the five most recent assessments for one patient."""
+        state = self.ensure_seeded()
+        with self._lock:
+            summary = state.patients.get(email)
+            recent = state.recent_by_patient.get(email, [])
+            return {
+                "completed_assessments": summary.count if summary else 0,
+                "high_risk_alerts": summary.high_count if summary else 0,
+                "last_assessment": summary.latest[1].get("created_at") if summary else None,
+                "recent_assessments": [row for _, _, row in reversed(recent)],
+            }
+
+    def start(self):
+        """Seed in the background and reconcile on an interval."""
+        if self._worker and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="dashboard-reconcile", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        try:
+            self.ensure_seeded()
+        except Exception as e:
+            self._metrics["last_error"] = str(e)
+            logger.warning(f"Dashboard store seeding failed, will retry on first read: {e}")
+        while not self._stopping.wait(self.reconcile_interval_seconds):
+            try:
+                self.reconcile()
+            except Exception as e:
+                self._metrics["last_error"] = str(e)
+                logger.warning(f"Dashboard store reconciliation failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self._state
+            return {
+                "seeded": state is not None,
+                "predictions": state.total if state else 0,
+                "patients": len(state.patients) if state else 0,
+                **self._metrics,
+            }
+
+
+# Global dashboard store instance
+_dashboard_store = None
+
+
+def get_dashboard_store() -> DashboardAggregateStore:
+    """Get or create the dashboard aggregate store"""
+    global _dashboard_store
+    if _dashboard_store is None:
+        _dashboard_store = DashboardAggregateStore(
+            reconcile_interval_seconds=float(os.getenv("DASHBOARD_RECONCILE_SECONDS", 300)),
+        )
+    return _dashboard_store
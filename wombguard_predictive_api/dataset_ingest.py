@@ -0,0 +1,297 @@
+"""
+WombGuard Dataset Ingestion
+Declarative column mappings and unit conversions that turn partner datasets into model-ready arrays
+
+Run as a script to check how a file maps onto the model features, or to export it harmonized:
+    python dataset_ingest.py describe dataset/local_pregnancy_dataset.csv
+    python dataset_ingest.py export dataset/local_pregnancy_dataset.csv --output harmonized.parquet
+"""
+
+import sys
+import logging
+import argparse
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from risk_scoring import FEATURE_COLUMNS, header_key
+
+logger = logging.getLogger(__name__)
+
+MODEL_FEATURES = tuple(FEATURE_COLUMNS)
+TARGET_NAME = "Risk_Level"
+
+# Readings below this are taken to be Celsius when a temperature column does not state its unit
+FAHRENHEIT_CUTOFF = 50.0
+
+# Blood glucose: 1 mmol/L is 18 mg/dL
+MG_DL_PER_MMOL_L = 18.0
+
+
+def _same(values):
+    return values
+
+
+def _celsius_to_fahrenheit(values):
+    return values * 9 / 5 + 32
+
+
+def _fahrenheit_any(values):
+    return np.where(values < FAHRENHEIT_CUTOFF, _celsius_to_fahrenheit(values), values)
+
+
+def _mg_dl_to_mmol_l(values):
+    return values / MG_DL_PER_MMOL_L
+
+
+def _bmi(weight_kg, height_m):
+    return weight_kg / height_m ** 2
+
+
+def _bmi_from_cm(weight_kg, height_cm):
+    return weight_kg / (height_cm / 100) ** 2
+
+
+@dataclass(frozen=True)
+class Source:
+    """Input columns (normalized header keys) and how they become one feature in model units."""
+    columns: tuple
+    convert: Callable = _same
+    unit: str = ""
+
+
+# Model feature: accepted sources in order of preference. Model units are those of the
+# training data: years, mmHg, mmol/L, °F, kg/m² and bpm.
+FEATURE_SOURCES = {
+    "Age": (
+        Source(("age",), unit="years"),
+        Source(("age_years",), unit="years"),
+    ),
+    "Systolic_BP": (
+        Source(("systolic_bp",), unit="mmHg"),
+        Source(("systolic",), unit="mmHg"),
+        Source(("sbp",), unit="mmHg"),
+    ),
+    "Diastolic": (
+        Source(("diastolic",), unit="mmHg"),
+        Source(("diastolic_bp",), unit="mmHg"),
+        Source(("dbp",), unit="mmHg"),
+    ),
+    "BS": (
+        Source(("bs",), unit="mmol/L"),
+        Source(("blood_sugar",), unit="mmol/L"),
+        Source(("bs_mmol_l",), unit="mmol/L"),
+        Source(("bs_mg_dl",), _mg_dl_to_mmol_l, "mg/dL -> mmol/L"),
+    ),
+    "Body_Temp": (
+        Source(("body_temp_f",), unit="°F"),
+        Source(("body_temp_c",), _celsius_to_fahrenheit, "°C -> °F"),
+        Source(("body_temp",), _fahrenheit_any, "°F, or °C below 50 -> °F"),
+        Source(("body_temperature",), _fahrenheit_any, "°F, or °C below 50 -> °F"),
+        Source(("temperature",), _fahrenheit_any, "°F, or °C below 50 -> °F"),
+    ),
+    "BMI": (
+        Source(("bmi",), unit="kg/m²"),
+        Source(("weight_kg", "height_m"), _bmi, "weight_kg / height_m²"),
+        Source(("weight_kg", "height_cm"), _bmi_from_cm, "weight_kg / (height_cm / 100)²"),
+    ),
+    "Heart_Rate": (
+        Source(("heart_rate",), unit="bpm"),
+        Source(("hr",), unit="bpm"),
+        Source(("pulse",), unit="bpm"),
+    ),
+}
+
+TARGET_COLUMNS = ("risk_level", "risk")
+
+RISK_LABELS = {"high": 1, "high_risk": 1, "1": 1, "low": 0, "low_risk": 0, "0": 0}
+
+# features: float64 (rows, features) in model order; target: int8, -1 where unlabelled;
+# valid: rows whose features are all finite
+HarmonizedChunk = namedtuple("HarmonizedChunk", "index first_row features target valid")
+
+
+class SchemaMapping:
+    """
+    Resolves, once per file, which of its columns feed each model feature,
+    then converts chunks of that file into model-ready arrays.
+    Raises ValueError when a feature has no usable source.
+    """
+
+    def __init__(self, header: list, feature_sources: dict = None, features: tuple = MODEL_FEATURES):
+        feature_sources = feature_sources or FEATURE_SOURCES
+        self.features = tuple(features)
+        columns = {}
+        for name in header:
+            columns.setdefault(header_key(name), name)
+
+        self.plan = {}
+        missing = []
+        for feature in self.features:
+            for source in feature_sources[feature]:
+                if all(key in columns for key in source.columns):
+                    self.plan[feature] = (source, [columns[key] for key in source.columns])
+                    break
+            else:
+                missing.append(
+                    f"{feature} (one of: {', '.join('+'.join(s.columns) for s in feature_sources[feature])})")
+        if missing:
+            raise ValueError(f"No source column for {'; '.join(missing)}")
+
+        self.target_column = next((columns[key] for key in TARGET_COLUMNS if key in columns), None)
+
+    def describe(self) -> dict:
+        """{feature: "source columns (unit or conversion)"}, plus the label column if any."""
+        described = {
+            feature: f"{' + '.join(names)} ({source.unit})" if source.unit else " + ".join(names)
+            for feature, (source, names) in self.plan.items()
+        }
+        described[TARGET_NAME] = self.target_column
+        return described
+
+    def transform(self, frame: pd.DataFrame, index: int = 0, first_row: int = 0) -> HarmonizedChunk:
+        features = np.empty((len(frame), len(self.features)), dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for position, feature in enumerate(self.features):
+                source, names = self.plan[feature]
+                values = [pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=np.float64) for name in names]
+                features[:, position] = source.convert(*values)
+
+        if self.target_column is None:
+            target = np.full(len(frame), -1, dtype=np.int8)
+        else:
+            labels = frame[self.target_column].map(
+                lambda value: -1 if pd.isna(value) else RISK_LABELS.get(
+                    header_key(int(value) if isinstance(value, (int, float)) else value), -1))
+            target = labels.to_numpy(dtype=np.int8)
+
+        valid = np.isfinite(features).all(axis=1)
+        return HarmonizedChunk(index, first_row, features, target, valid)
+
+
+def read_chunks(path: str, chunk_rows: int):
+    """Yield (chunk index, first row number, frame) for a CSV or Parquet file without loading it whole."""
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        frames = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows))
+    else:
+        frames = pd.read_csv(path, chunksize=chunk_rows)
+
+    first_row = 0
+    for index, frame in enumerate(frames):
+        yield index, first_row, frame
+        first_row += len(frame)
+
+
+def iter_harmonized(path: str, chunk_rows: int = 50000, mapping: SchemaMapping = None):
+    """
+    Single streaming pass over a partner file: yields one HarmonizedChunk per
+    `chunk_rows` input rows. The mapping is resolved from the first chunk's
+    header unless given.
+    """
+    for index, first_row, frame in read_chunks(path, chunk_rows):
+        if mapping is None:
+            mapping = SchemaMapping(list(frame.columns))
+            logger.info(f"Ingesting {path}: {mapping.describe()}")
+        yield mapping.transform(frame, index, first_row)
+
+
+class FeatureSummary:
+    """Running count, mean, min and max per feature over valid rows, plus label counts."""
+
+    def __init__(self, features: tuple = MODEL_FEATURES):
+        self.features = tuple(features)
+        self.rows = 0
+        self.valid = 0
+        self.labels = {"high": 0, "low": 0, "unlabelled": 0}
+        self._sum = np.zeros(len(features))
+        self._min = np.full(len(features), np.inf)
+        self._max = np.full(len(features), -np.inf)
+
+    def update(self, chunk: HarmonizedChunk):
+        self.rows += len(chunk.valid)
+        rows = chunk.features[chunk.valid]
+        self.valid += len(rows)
+        if len(rows):
+            self._sum += rows.sum(axis=0)
+            self._min = np.minimum(self._min, rows.min(axis=0))
+            self._max = np.maximum(self._max, rows.max(axis=0))
+        self.labels["high"] += int((chunk.target == 1).sum())
+        self.labels["low"] += int((chunk.target == 0).sum())
+        self.labels["unlabelled"] += int((chunk.target == -1).sum())
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.rows,
+            "valid_rows": self.valid,
+            "labels": dict(self.labels),
+            "features": {
+                feature: {
+                    "mean": round(float(self._sum[i] / self.valid), 3) if self.valid else None,
+                    "min": float(self._min[i]) if self.valid else None,
+                    "max": float(self._max[i]) if self.valid else None,
+                }
+                for i, feature in enumerate(self.features)
+            },
+        }
+
+
+def export(path: str, output: str, chunk_rows: int = 50000) -> dict:
+    """Write the valid rows of `path` as model-unit features plus the encoded label to a Parquet file."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    summary = FeatureSummary()
+    writer = None
+    try:
+        for chunk in iter_harmonized(path, chunk_rows):
+            summary.update(chunk)
+            table = pa.table({
+                "row": np.arange(chunk.first_row, chunk.first_row + len(chunk.valid))[chunk.valid],
+                **{feature: chunk.features[chunk.valid, i] for i, feature in enumerate(MODEL_FEATURES)},
+                f"{TARGET_NAME}_Encoded": chunk.target[chunk.valid],
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return summary.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WombGuard dataset ingestion")
+    parser.add_argument("command", choices=["describe", "export"],
+                        help="describe: show the column mapping and feature ranges; export: write harmonized Parquet")
+    parser.add_argument("input", help="CSV or Parquet dataset")
+    parser.add_argument("--output", help="Parquet file to write (export)")
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        if args.command == "export":
+            if not args.output:
+                parser.error("export needs --output")
+            stats = export(args.input, args.output, args.chunk_rows)
+        else:
+            summary = FeatureSummary()
+            for chunk in iter_harmonized(args.input, args.chunk_rows):
+                summary.update(chunk)
+            stats = summary.stats()
+    except (ValueError, OSError) as e:
+        logger.error(f"Ingestion of {args.input} failed: {e}")
+        return 1
+
+    logger.info(f"{args.input}: {stats['rows']} rows, {stats['valid_rows']} model-ready, labels {stats['labels']}")
+    for feature, values in stats["features"].items():
+        logger.info(f"  {feature:<12} mean {values['mean']}  min {values['min']}  max {values['max']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
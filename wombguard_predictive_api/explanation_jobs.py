@@ -0,0 +1,284 @@
+"""
+WombGuard Explanation Jobs
+Deferred SHAP explanations for /predict, computed in background batches
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from model_registry import ModelVersion
+
+logger = logging.getLogger(__name__)
+
+# Recent submit-to-ready latencies kept for percentile metrics
+LATENCY_WINDOW = 1000
+
+# How often an idle worker drops finished jobs past their TTL
+PURGE_INTERVAL_SECONDS = 30
+
+
+@dataclass
+class ExplanationJob:
+    """One deferred explanation: the scored row and the model version that scored it."""
+    prediction_id: str
+    user_email: str
+    features: dict
+    version: ModelVersion
+    submitted_at: float = field(default_factory=time.monotonic)
+    finished_at: float = None
+    future: Future = field(default_factory=Future)
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "pending"
+        return "failed" if self.future.exception() is not None else "ready"
+
+    def describe(self) -> dict:
+        status = self.status
+        response = {"id": self.prediction_id, "status": status, "model_version": self.version.version}
+        if status == "ready":
+            result = self.future.result()
+            response.update({
+                "level": "full",
+                "feature_importance": result["contributions"],
+                "summary": result["summary"],
+            })
+        elif status == "failed":
+            response["detail"] = str(self.future.exception())
+        return response
+
+
+class ExplanationJobs:
+    """
+    Computes the full SHAP explanation of /predict?explain=deferred rows off
+    the request path.
+
+    submit() queues a scored row together with the model version that scored
+    it, so an explanation always matches the probability already returned,
+    even across a model swap. A worker thread takes up to batch_size queued
+    rows at a time, explains each version's rows with one batched
+    RiskScorer.score call, resolves the jobs for long-polling readers and
+    journals the explanation onto the stored prediction through the
+    prediction spool. Finished jobs are kept for result_ttl_seconds (at most
+    max_jobs); after that the stored prediction row answers.
+    """
+
+    def __init__(
+            self,
+            batch_size: int = 64,
+            max_pending: int = 5000,
+            result_ttl_seconds: float = 900.0,
+            max_jobs: int = 10000,
+            spool=None):
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(1, max_pending)
+        self.result_ttl_seconds = max(0.0, result_ttl_seconds)
+        self.max_jobs = max(self.max_pending, max_jobs)
+        self._spool = spool
+
+        self._queue = deque()
+        self._jobs = OrderedDict()
+        self._condition = threading.Condition()
+        self._worker = None
+        self._stopping = False
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+        self._metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": None,
+            "last_error": None,
+        }
+
+    @property
+    def spool(self):
+        if self._spool is None:
+            from prediction_spool import get_prediction_spool
+            self._spool = get_prediction_spool()
+        return self._spool
+
+    def start(self):
+        """Start the background worker (idempotent)."""
+        with self._condition:
+            if self._worker and self._worker.is_alive():
+                return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="explanation-jobs", daemon=True)
+            self._worker.start()
+        logger.info(f"Explanation jobs started (batch={self.batch_size}, max_pending={self.max_pending})")
+
+    def stop(self, timeout: float = 10.0):
+        """Explain what is still queued and stop the worker. Called on application shutdown."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._worker:
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                # Their rows stay explanation_level='deferred' and are explained when next fetched
+                logger.warning(
+                    f"Explanation worker did not finish within {timeout}s; {len(self._queue)} jobs left pending")
+        logger.info("Explanation jobs stopped")
+
+    def has_capacity(self) -> bool:
+        with self._condition:
+            return len(self._queue) < self.max_pending
+
+    def submit(self, prediction_id: str, user_email: str, features: dict, version: ModelVersion) -> ExplanationJob:
+        """Queue the explanation of one scored row. A prediction already pending or ready keeps its job."""
+        with self._condition:
+            job = self._jobs.get(prediction_id)
+            if job is not None and job.status != "failed":
+                return job
+            job = ExplanationJob(prediction_id, user_email, features, version)
+            self._jobs.pop(prediction_id, None)
+            self._jobs[prediction_id] = job
+            self._queue.append(job)
+            self._metrics["submitted"] += 1
+            self._condition.notify()
+        return job
+
+    def get(self, prediction_id: str) -> ExplanationJob:
+        """The retained job for a prediction, or None."""
+        with self._condition:
+            return self._jobs.get(prediction_id)
+
+    async def wait(self, job: ExplanationJob, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for `job` without blocking the event loop. True once it is done."""
+        if not job.future.done() and timeout > 0:
+            # asyncio.wait leaves the job's future alone on timeout, so other readers keep waiting on it
+            await asyncio.wait([asyncio.wrap_future(job.future)], timeout=timeout)
+        return job.future.done()
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth, retained jobs and submit-to-ready latency."""
+        with self._condition:
+            latencies = sorted(self._latencies)
+            queue_depth, retained = len(self._queue), len(self._jobs)
+            metrics = dict(self._metrics)
+
+        def percentile(values, q):
+            return round(values[min(len(values) - 1, int(len(values) * q))], 2) if values else None
+
+        return {
+            "queue_depth": queue_depth,
+            "jobs_retained": retained,
+            "batch_size": self.batch_size,
+            "max_pending": self.max_pending,
+            "p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+            **metrics,
+        }
+
+    def _purge(self):
+        """
+        Drop the oldest finished jobs past their TTL or beyond max_jobs, skipping
+        ones still pending. Caller holds the lock.
+        """
+        cutoff = time.monotonic() - self.result_ttl_seconds
+        excess = len(self._jobs) - self.max_jobs
+        expired = []
+        for prediction_id, job in self._jobs.items():
+            if not job.future.done():
+                continue
+            if job.finished_at > cutoff and excess <= 0:
+                break
+            expired.append(prediction_id)
+            excess -= 1
+        for prediction_id in expired:
+            del self._jobs[prediction_id]
+
+    def _take_batch(self) -> list:
+        """Wait for queued jobs or shutdown, then pop up to batch_size jobs ([] once stopped and drained)."""
+        with self._condition:
+            while not self._queue and not self._stopping:
+                self._condition.wait(PURGE_INTERVAL_SECONDS)
+                self._purge()
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _finish(self, job: ExplanationJob, result: dict = None, error: Exception = None):
+        job.finished_at = time.monotonic()
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _explain(self, batch: list):
+        started = time.perf_counter()
+        by_version = {}
+        for job in batch:
+            by_version.setdefault(id(job.version), []).append(job)
+
+        for jobs in by_version.values():
+            version = jobs[0].version
+            try:
+                results = version.scorer.score(pd.DataFrame([job.features for job in jobs]), explain="full")
+            except Exception as e:
+                logger.error(f" Could not explain {len(jobs)} deferred predictions with {version.version}: {e}")
+                with self._condition:
+                    self._metrics["failed"] += len(jobs)
+                    self._metrics["last_error"] = str(e)
+                for job in jobs:
+                    self._finish(job, error=e)
+                continue
+
+            for job, result in zip(jobs, results):
+                try:
+                    self.spool.amend(job.prediction_id, {
+                        "feature_importance": {k: float(v) for k, v in result["contributions"].items()},
+                        "explanation": result["summary"],
+                        "explanation_level": "full",
+                    })
+                except Exception as e:
+                    logger.error(f" Could not spool explanation for prediction {job.prediction_id}: {e}")
+                self._finish(job, result=result)
+            with self._condition:
+                self._metrics["completed"] += len(jobs)
+                self._latencies.extend((job.finished_at - job.submitted_at) * 1000 for job in jobs)
+
+        with self._condition:
+            self._metrics["batches"] += 1
+            self._metrics["last_batch_size"] = len(batch)
+            self._metrics["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self._purge()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                self._explain(batch)
+            except Exception as e:
+                logger.error(f"Explanation worker error: {e}")
+                for job in batch:
+                    if not job.future.done():
+                        self._finish(job, error=e)
+
+
+# Global explanation jobs instance
+_explanation_jobs = None
+
+
+def get_explanation_jobs() -> ExplanationJobs:
+    """Get or create the deferred explanation worker"""
+    global _explanation_jobs
+    if _explanation_jobs is None:
+        _explanation_jobs = ExplanationJobs(
+            batch_size=int(os.getenv("EXPLANATION_BATCH_SIZE", 64)),
+            max_pending=int(os.getenv("EXPLANATION_MAX_PENDING", 5000)),
+            result_ttl_seconds=float(os.getenv("EXPLANATION_RESULT_TTL_SECONDS", 900)),
+        )
+    return _explanation_jobs
@@ -0,0 +1,240 @@
+"""
+WombGuard Identity Cache
+TTL-bounded cache of user identity records shared by every endpoint that resolves a user
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from repository import USER_IDENTITY
+
+logger = logging.getLogger(__name__)
+
+# Columns every identity lookup needs; never includes password or verification tokens
+IDENTITY_COLUMNS = USER_IDENTITY.columns
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 60.0):
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds: float = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+class IdentityCache:
+    """
+    Cache of user identity records keyed by normalized email and by id.
+
+    Misses are loaded from Supabase with IDENTITY_COLUMNS only. Unknown emails
+    and ids are cached for a shorter negative TTL so repeated probes for a
+    missing account do not hammer the database. Writers must call
+    invalidate() after changing a user so the next lookup is fresh.
+    """
+
+    def __init__(
+            self,
+            ttl_seconds: float = 60.0,
+            negative_ttl_seconds: float = 5.0,
+            max_size: int = 10000,
+            client=None,
+            async_client=None):
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._by_email = TTLCache(max_size, ttl_seconds)
+        self._by_id = TTLCache(max_size, ttl_seconds)
+        self._client = client
+        self._async_client = async_client
+        self._lock = threading.Lock()
+        self._endpoint_stats = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase_client import supabase
+            self._client = supabase
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            from supabase_client import get_async_supabase
+            self._async_client = get_async_supabase()
+        return self._async_client
+
+    def _record(self, endpoint: str, hit: bool):
+        with self._lock:
+            entry = self._endpoint_stats.setdefault(endpoint, {"lookups": 0, "hits": 0, "misses": 0})
+            entry["lookups"] += 1
+            entry["hits" if hit else "misses"] += 1
+
+    def _store(self, record: dict):
+        email = normalize_email(record.get("email"))
+        if email:
+            self._by_email.set(email, record)
+        if record.get("id"):
+            self._by_id.set(str(record["id"]), record)
+
+    def prime(self, records: list):
+        """Seed the cache from rows already fetched with IDENTITY_COLUMNS (or a superset)."""
+        for record in records or []:
+            self._store(USER_IDENTITY.pick(record))
+
+    def _cached(self, index: TTLCache, key: str, endpoint: str):
+        cached = index.get(key, _MISSING)
+        self._record(endpoint, hit=cached is not _MISSING)
+        return cached
+
+    def _resolve(self, index: TTLCache, key: str, rows: list):
+        """Store the looked-up record, or remember briefly that the user does not exist."""
+        if rows:
+            record = rows[0]
+            self._store(record)
+            return record
+        index.set(key, None, self.negative_ttl_seconds)
+        return None
+
+    def get_by_email(self, email: str, endpoint: str = "unknown"):
+        """Return the identity record for an email, or None if no such user exists."""
+        key = normalize_email(email)
+        if not key:
+            return None
+        cached = self._cached(self._by_email, key, endpoint)
+        if cached is not _MISSING:
+            return cached
+        response = self.client.table("users").select(IDENTITY_COLUMNS).eq("email", key).limit(1).execute()
+        return self._resolve(self._by_email, key, response.data)
+
+    def get_by_id(self, user_id: str, endpoint: str = "unknown"):
+        """Return the identity record for a user id, or None if no such user exists."""
+        if not user_id:
+            return None
+        key = str(user_id)
+        cached = self._cached(self._by_id, key, endpoint)
+        if cached is not _MISSING:
+            return cached
+        response = self.client.table("users").select(IDENTITY_COLUMNS).eq("id", key).limit(1).execute()
+        return self._resolve(self._by_id, key, response.data)
+
+    async def get_by_email_async(self, email: str, endpoint: str = "unknown"):
+        """get_by_email() for async endpoints; a miss is fetched over the async client."""
+        key = normalize_email(email)
+        if not key:
+            return None
+        cached = self._cached(self._by_email, key, endpoint)
+        if cached is not _MISSING:
+            return cached
+        response = await self.async_client.table("users").select(IDENTITY_COLUMNS).eq("email", key).limit(1).execute()
+        return self._resolve(self._by_email, key, response.data)
+
+    async def get_by_id_async(self, user_id: str, endpoint: str = "unknown"):
+        """get_by_id() for async endpoints; a miss is fetched over the async client."""
+        if not user_id:
+            return None
+        key = str(user_id)
+        cached = self._cached(self._by_id, key, endpoint)
+        if cached is not _MISSING:
+            return cached
+        response = await self.async_client.table("users").select(IDENTITY_COLUMNS).eq("id", key).limit(1).execute()
+        return self._resolve(self._by_id, key, response.data)
+
+    def peek(self, user_id: str = None, email: str = None, endpoint: str = "unknown"):
+        """Cached record for an email or id without touching the database; None if not cached."""
+        key = normalize_email(email)
+        record = self._by_email.get(key) if key else None
+        if record is None and user_id:
+            record = self._by_id.get(str(user_id))
+        if record is not None:
+            self._record(endpoint, hit=True)
+        return record
+
+    def invalidate(self, user_id: str = None, email: str = None):
+        """Drop a user from both indexes. Either key is enough; the other is looked up from the cached record."""
+        emails = {normalize_email(email)} if email else set()
+        ids = {str(user_id)} if user_id else set()
+
+        for key in list(ids):
+            record = self._by_id.get(key)
+            if record and record.get("email"):
+                emails.add(normalize_email(record["email"]))
+        for key in list(emails):
+            record = self._by_email.get(key)
+            if record and record.get("id"):
+                ids.add(str(record["id"]))
+
+        for key in emails:
+            self._by_email.delete(key)
+        for key in ids:
+            self._by_id.delete(key)
+
+    def stats(self) -> dict:
+        """Hit/miss counts per endpoint; every hit is one database round trip saved."""
+        with self._lock:
+            endpoints = {
+                endpoint: {**counts, "round_trips_saved": counts["hits"]}
+                for endpoint, counts in self._endpoint_stats.items()
+            }
+        return {
+            "cached_emails": len(self._by_email),
+            "cached_ids": len(self._by_id),
+            "round_trips_saved": sum(e["hits"] for e in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+# Global identity cache instance
+_identity_cache = None
+
+
+def get_identity_cache() -> IdentityCache:
+    """Get or create the shared identity cache"""
+    global _identity_cache
+    if _identity_cache is None:
+        _identity_cache = IdentityCache(
+            ttl_seconds=float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", 60)),
+            negative_ttl_seconds=float(os.getenv("IDENTITY_CACHE_NEGATIVE_TTL_SECONDS", 5)),
+            max_size=int(os.getenv("IDENTITY_CACHE_MAX_SIZE", 10000)),
+        )
+    return _identity_cache
@@ -0,0 +1,417 @@
+"""
+WombGuard Mail Queue
+Outbound email spooled locally and delivered by a background worker over a reused SMTP session
+
+Run as a script to send a test message, e.g. against a local SMTP sink
+(python -m aiosmtpd -n -l localhost:1025 with SMTP_STARTTLS=false and SMTP_AUTH=false):
+    python mail_queue.py send-test you@example.com
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import smtplib
+import logging
+import argparse
+import threading
+from string import Template
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from write_behind import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_PATH = os.path.join(os.path.dirname(__file__), "spool", "mail.db")
+
+# Only the link changes per message; the rest of the document is built once at import
+VERIFICATION_TEMPLATE = Template("""\
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+        <div style="text-align: center; margin-bottom: 30px;">
+        <h1 style="color: #e91e63; margin: 0;"> WombGuard</h1>
+        <p style="color: #666; margin: 5px 0;">Pregnancy Health Monitoring</p>
+        </div>
+
+        <div style="background-color: #f5f5f5; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+        <h2 style="color: #333; margin-top: 0;">Welcome to WombGuard!</h2>
+        <p>Thank you for registering. Please verify your email address to complete your account setup.</p>
+
+        <div style="text-align: center; margin: 30px 0;">
+        <a href="$verification_link" style="background-color: #e91e63; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">
+        Verify Email
+        </a>
+        </div>
+
+        <p style="color: #666; font-size: 14px;">Or copy and paste this link in your browser:</p>
+        <p style="background-color: white; padding: 10px; border-radius: 4px; word-break: break-all; font-size: 12px; color: #0066cc;">
+        $verification_link
+        </p>
+        </div>
+
+        <div style="border-top: 1px solid #ddd; padding-top: 20px; color: #666; font-size: 12px;">
+        <p>This link will expire in 24 hours.</p>
+        <p>If you didn't create this account, please ignore this email.</p>
+        <p style="margin-top: 20px; color: #999;">© 2025 WombGuard. All rights reserved.</p>
+        </div>
+        </div>
+        </body>
+        </html>
+        """)
+
+TEMPLATES = {
+    "verification": (" WombGuard - Verify Your Email", VERIFICATION_TEMPLATE),
+}
+
+
+def render(template: str, fields: dict) -> tuple:
+    """(subject, html) for a named template."""
+    subject, body = TEMPLATES[template]
+    return subject, body.substitute(fields)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies mean the message will never be accepted as sent; anything else is worth retrying."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    code = getattr(error, "smtp_code", None)
+    return isinstance(code, int) and code >= 500 and not isinstance(error, smtplib.SMTPAuthenticationError)
+
+
+class MailQueue:
+    """
+    SQLite-spooled outbox for transactional email.
+
+    enqueue() records the recipient, template name and per-message fields and
+    returns at once; requests never talk to the mail server. A background
+    worker delivers due messages over one authenticated SMTP session that is
+    kept open between messages and closed after idle_seconds without work.
+    Transient failures (timeouts, disconnects, 4xx replies) are retried with
+    exponential backoff up to max_attempts; permanent 5xx rejections are
+    dropped and logged. path=":memory:" keeps the outbox in memory only.
+
+    Several processes may share one spool file: each batch is claimed in a
+    single write transaction that pushes its rows' next_attempt_at out by
+    lease_seconds, so no other worker picks them up while they are being
+    sent. A worker that dies mid-batch leaves its rows to be retried once the
+    lease runs out.
+    auth=False skips the login, for a local sink that accepts mail without one.
+    """
+
+    def __init__(
+            self,
+            path: str = DEFAULT_SPOOL_PATH,
+            smtp_server: str = "smtp.gmail.com",
+            smtp_port: int = 587,
+            sender_email: str = None,
+            sender_password: str = None,
+            starttls: bool = True,
+            auth: bool = True,
+            batch_size: int = 20,
+            idle_seconds: float = 60.0,
+            max_attempts: int = 8,
+            backoff_base_seconds: float = 5.0,
+            backoff_max_seconds: float = 900.0,
+            timeout_seconds: float = 30.0,
+            lease_seconds: float = 600.0):
+        self.path = path
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.starttls = starttls
+        self.auth = auth
+        self.batch_size = max(1, batch_size)
+        self.idle_seconds = idle_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.timeout_seconds = timeout_seconds
+        # A claimed batch must be sent before another worker may take it over
+        self.lease_seconds = max(lease_seconds, self.batch_size * timeout_seconds)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self._conn = self._open()
+
+        self._metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed_attempts": 0,
+            "dropped": 0,
+            "smtp_connections": 0,
+            "last_sent_at": None,
+            "last_error": None,
+        }
+
+    @property
+    def configured(self) -> bool:
+        """Without a sender address and password (unless auth is off) messages are logged instead of sent."""
+        return bool(self.sender_email) and (bool(self.sender_password) or not self.auth)
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if self.path != ":memory:" and directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=self.timeout_seconds)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT UNIQUE NOT NULL,
+                recipient TEXT NOT NULL,
+                template TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox(next_attempt_at, seq)")
+        return conn
+
+    def enqueue(self, recipient: str, template: str, fields: dict) -> str:
+        """Queue a templated message for delivery and return its id."""
+        if template not in TEMPLATES:
+            raise ValueError(f"Unknown email template '{template}'")
+        message_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (message_id, recipient, template, fields, enqueued_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (message_id, recipient, template, json.dumps(fields), now, now),
+            )
+            self._metrics["enqueued"] += 1
+        self._wakeup.set()
+        return message_id
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    # SMTP SESSION
+
+    def _session(self) -> smtplib.SMTP:
+        """The open SMTP session, reconnecting (STARTTLS + login) only when there is none or it went stale."""
+        if self._smtp is not None and time.monotonic() - self._smtp_last_used > self.idle_seconds / 2:
+            try:
+                self._smtp.noop()
+            except smtplib.SMTPException:
+                self._close_session()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout_seconds)
+            try:
+                if self.starttls:
+                    smtp.starttls()
+                if self.auth:
+                    smtp.login(self.sender_email, self.sender_password)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self._metrics["smtp_connections"] += 1
+        return self._smtp
+
+    def _close_session(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    def _build(self, recipient: str, template: str, fields: dict) -> str:
+        subject, html = render(template, fields)
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = self.sender_email
+        message["To"] = recipient
+        message.attach(MIMEText(html, "html"))
+        return message.as_string()
+
+    # DELIVERY
+
+    def _next_batch(self) -> list:
+        """Claim up to batch_size due messages by leasing them to this worker."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't select the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT seq, recipient, template, fields, attempts FROM outbox "
+                    "WHERE next_attempt_at <= ? ORDER BY seq LIMIT ?",
+                    (now, self.batch_size),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE seq = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _delete(self, seq: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+
+    def _mark_failed(self, seq: int, attempts: int, recipient: str, error: Exception):
+        attempts += 1
+        with self._lock:
+            self._metrics["failed_attempts"] += 1
+            self._metrics["last_error"] = str(error)
+        if _is_permanent(error) or attempts >= self.max_attempts:
+            logger.error(f" Giving up on email to {recipient} after {attempts} attempts: {error}")
+            self._delete(seq)
+            with self._lock:
+                self._metrics["dropped"] += 1
+            return
+        delay = backoff_delay(attempts, self.backoff_base_seconds, self.backoff_max_seconds)
+        logger.warning(f" Email to {recipient} failed, retrying in {delay:.0f}s: {error}")
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE seq = ?",
+                (attempts, time.time() + delay, str(error), seq),
+            )
+
+    def deliver_once(self) -> int:
+        """Send one batch of due messages over the shared session. Returns the number sent."""
+        rows = self._next_batch()
+        sent = 0
+        for seq, recipient, template, fields, attempts in rows:
+            fields = json.loads(fields)
+            if not self.configured:
+                logger.warning(" Email credentials not configured. Logging email to console.")
+                logger.info(f" Email ({template}) would be sent to {recipient}: {fields}")
+                self._delete(seq)
+                continue
+            try:
+                session = self._session()
+                session.sendmail(self.sender_email, recipient, self._build(recipient, template, fields))
+            except Exception as e:
+                if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                    # Connection-level failure: the session can't be trusted for the next message
+                    self._close_session()
+                self._mark_failed(seq, attempts, recipient, e)
+                continue
+            self._smtp_last_used = time.monotonic()
+            self._delete(seq)
+            sent += 1
+            with self._lock:
+                self._metrics["sent"] += 1
+                self._metrics["last_sent_at"] = time.time()
+            logger.info(f" Email ({template}) sent to {recipient}")
+        return sent
+
+    def start(self):
+        """Start the delivery worker. Messages left over from a previous run are sent first."""
+        if self._worker and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        pending = self.pending_count()
+        if pending:
+            logger.info(f"Replaying {pending} queued emails from {self.path}")
+        self._worker = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Send what is due, then stop. Anything undelivered stays spooled for the next start."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._worker:
+            self._worker.join(timeout)
+        remaining = self.pending_count()
+        if remaining:
+            logger.warning(f"{remaining} emails still queued at shutdown; they will be sent on restart")
+
+    def _run(self):
+        while True:
+            try:
+                sent = self.deliver_once()
+            except Exception as e:
+                logger.error(f"Mail queue delivery error: {e}")
+                sent = 0
+
+            if self._stopping.is_set():
+                if not sent:
+                    self._close_session()
+                    return
+                continue
+            if sent < self.batch_size:
+                if self._smtp is not None and time.monotonic() - self._smtp_last_used > self.idle_seconds:
+                    self._close_session()
+                self._wakeup.wait(min(1.0, self.idle_seconds))
+                self._wakeup.clear()
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            pending, oldest, max_attempts = self._conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), MAX(attempts) FROM outbox").fetchone()
+            metrics = dict(self._metrics)
+        return {
+            "path": self.path,
+            "pending": pending,
+            "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "max_attempts_pending": max_attempts or 0,
+            "session_open": self._smtp is not None,
+            **metrics,
+        }
+
+
+# Global mail queue instance
+_mail_queue = None
+
+
+def get_mail_queue() -> MailQueue:
+    """Get or create the mail queue"""
+    global _mail_queue
+    if _mail_queue is None:
+        _mail_queue = MailQueue(
+            path=os.getenv("MAIL_SPOOL_PATH", DEFAULT_SPOOL_PATH),
+            smtp_server=os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+            smtp_port=int(os.getenv("SMTP_PORT", 587)),
+            sender_email=os.getenv("SENDER_EMAIL"),
+            sender_password=os.getenv("SENDER_PASSWORD"),
+            starttls=os.getenv("SMTP_STARTTLS", "true").strip().lower() != "false",
+            auth=os.getenv("SMTP_AUTH", "true").strip().lower() != "false",
+            idle_seconds=float(os.getenv("SMTP_IDLE_SECONDS", 60)),
+            max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", 8)),
+            lease_seconds=float(os.getenv("MAIL_LEASE_SECONDS", 600)),
+        )
+    return _mail_queue
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WombGuard mail queue")
+    parser.add_argument("command", choices=["send-test"], help="send-test: queue and deliver a verification email")
+    parser.add_argument("recipient")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    queue = get_mail_queue()
+    queue.enqueue(args.recipient, "verification", {"verification_link": "http://localhost:3000/verify-email?token=test"})
+    sent = queue.deliver_once()
+    queue._close_session()
+    return 0 if sent or not queue.configured else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
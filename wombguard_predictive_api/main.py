@@ -1,22 +1,58 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-import joblib
+from dataclasses import dataclass, replace
+from typing import Optional
 import pandas as pd
-import shap
-import numpy as np
 from fastapi.middleware.cors import CORSMiddleware
-from supabase_client import supabase
-from passlib.context import CryptContext
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from supabase_client import supabase, get_async_supabase
 from datetime import datetime, timedelta
-from statistics import mean
+from collections import Counter
 import logging
+import time
+import calendar
 import uuid
+import asyncio
+import json
 from chatbot_engine import get_chatbot
+from write_behind import get_chat_history_buffer
+from prediction_spool import get_prediction_spool
+from identity_cache import get_identity_cache, normalize_email, TTLCache
+from dashboard_state import get_dashboard_store
+from contact_resolver import ContactResolver, contact_resolver_stats
+from provider_directory import get_provider_directory
+from password_hasher import PasswordHasherBusy, get_password_hasher
+from mail_queue import get_mail_queue
+from user_import import import_users, parse_upload
+from risk_scoring import FEATURE_COLUMNS, TOP_FEATURES, frame_from_rows, prediction_record, validation_errors
+from model_registry import ModelUnavailable, get_model_registry
+from explanation_jobs import get_explanation_jobs
+from upload_stream import RequestStreamingResponse, iter_csv_chunks
+from pg_backend import get_pg_backend
+from admin_aggregates import fetch_admin_aggregates, monthly_trends
+from repository import (
+    CHAT_HISTORY_ROW,
+    CONSULTATION_ROW,
+    CONSULTATION_STATUS,
+    PREDICTION_DASHBOARD_ROW,
+    PREDICTION_EXPORT_ROW,
+    USER_CONTACT,
+    USER_KEY,
+    USER_LISTING_ROW,
+    USER_LOGIN,
+    USER_PROFILE,
+    USER_ROLE,
+    USER_VERIFICATION,
+    fetch_all_pages,
+)
+from pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, is_paginated, paginate, paginate_async
+from rollups import get_prediction_rollups
+from time_utils import parse_utc_naive
 from jose import JWTError, jwt
 import secrets
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import csv
 import os
 from dotenv import load_dotenv
 
@@ -50,33 +86,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Password hashing configuration using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
+# Password hashing runs bcrypt (maximum 72 bytes, BCRYPT_ROUNDS cost) on a dedicated process pool
 def hash_password(password: str):
-    """Securely hash password using bcrypt (maximum 72 bytes)."""
-    if not password:
-        raise ValueError("Password cannot be empty")
-    safe_bytes = password.encode("utf-8")[:72]
-    safe_password = safe_bytes.decode("utf-8", errors="ignore")
-    return pwd_context.hash(safe_password)
-
-
-def verify_password(plain_password: str, hashed_password: str):
-    """Verify plaintext password against hashed version."""
-    try:
-        safe_bytes = plain_password.encode("utf-8")[:72]
-        safe_password = safe_bytes.decode("utf-8", errors="ignore")
-        return pwd_context.verify(safe_password, hashed_password)
-    except Exception:
-        return False
+    """Securely hash password using bcrypt, for sync endpoints."""
+    return get_password_hasher().hash(password)
 
 
 # JWT token configuration
-SECRET_KEY = "your-secret-key-change-in-production-use-env-variable"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Tokens only carry authority when signed with a configured key; without one they are signed with
+# a per-process random key and get_current_principal ignores them
+TOKEN_AUTH_ENABLED = bool(os.getenv("JWT_SECRET_KEY"))
+SECRET_KEY = os.getenv("JWT_SECRET_KEY") or secrets.token_urlsafe(32)
+if not TOKEN_AUTH_ENABLED:
+    logger.warning(" JWT_SECRET_KEY is not set; bearer tokens will not be accepted as credentials")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -86,7 +110,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -106,123 +130,136 @@ def generate_verification_token():
 
 
 def send_verification_email(email: str, token: str):
-    """Send verification email to user via Gmail SMTP."""
+    """Queue the verification email; the mail worker delivers it over a pooled SMTP session."""
+    verification_link = f"{FRONTEND_BASE_URL}/verify-email?token={token}"
     try:
-        verification_link = f"{FRONTEND_BASE_URL}/verify-email?token={token}"
-
-        # Getting email credentials from environment variables
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", 587))
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-
-        # If credentials not configured, just log to console
-        if not sender_email or not sender_password:
-            logger.warning(
-                " Email credentials not configured. Logging verification link to console.")
-            logger.info(f" Verification email would be sent to {email}")
-            logger.info(f" Verification link: {verification_link}")
-            logger.info(f" Token: {token}")
-            return True
-
-        # Creating email message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = " WombGuard - Verify Your Email"
-        message["From"] = sender_email
-        message["To"] = email
-
-        # Email body (HTML)
-        html = f"""\
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="text-align: center; margin-bottom: 30px;">
-        <h1 style="color: #e91e63; margin: 0;"> WombGuard</h1>
-        <p style="color: #666; margin: 5px 0;">Pregnancy Health Monitoring</p>
-        </div>
-
-        <div style="background-color: #f5f5f5; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-        <h2 style="color: #333; margin-top: 0;">Welcome to WombGuard!</h2>
-        <p>Thank you for registering. Please verify your email address to complete your account setup.</p>
-
-        <div style="text-align: center; margin: 30px 0;">
-        <a href="{verification_link}" style="background-color: #e91e63; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">
-        Verify Email
-        </a>
-        </div>
-
-        <p style="color: #666; font-size: 14px;">Or copy and paste this link in your browser:</p>
-        <p style="background-color: white; padding: 10px; border-radius: 4px; word-break: break-all; font-size: 12px; color: #0066cc;">
-        {verification_link}
-        </p>
-        </div>
-
-        <div style="border-top: 1px solid #ddd; padding-top: 20px; color: #666; font-size: 12px;">
-        <p>This link will expire in 24 hours.</p>
-        <p>If you didn't create this account, please ignore this email.</p>
-        <p style="margin-top: 20px; color: #999;">© 2025 WombGuard. All rights reserved.</p>
-        </div>
-        </div>
-        </body>
-        </html>
-        """
-
-        # Attaching HTML content
-        part = MIMEText(html, "html")
-        message.attach(part)
-
-        # Sending email via Gmail SMTP
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()  
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, email, message.as_string())
-
-        logger.info(f" Verification email sent to {email}")
+        get_mail_queue().enqueue(email, "verification", {"verification_link": verification_link})
+        logger.info(f" Verification email queued for {email}")
         logger.info(f" Verification link: {verification_link}")
         return True
-
-    except smtplib.SMTPAuthenticationError:
-        logger.error(
-            " Email authentication failed. Check SENDER_EMAIL and SENDER_PASSWORD in .env")
-        return False
-    except smtplib.SMTPException as e:
-        logger.error(f" SMTP error: {str(e)}")
-        return False
     except Exception as e:
-        logger.error(f" Error sending verification email: {str(e)}")
+        logger.error(f" Error queueing verification email: {str(e)}")
         return False
 
 
 # AUTHORIZATION HELPER FUNCTIONS
-def parse_datetime(datetime_str: str):
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated caller resolved from a verified bearer token."""
+    user_id: str
+    email: str
+    role: str
+    issued_at: float
+    expires_at: float
+
+    def get(self, key: str, default=None):
+        """Dict-style access so principals and identity records are interchangeable."""
+        if key == "id":
+            return self.user_id
+        return getattr(self, key, default)
+
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# Verified tokens are reused for up to TOKEN_CACHE_TTL_SECONDS (never past their expiry),
+# so repeat requests skip signature checks
+verified_token_cache = TTLCache(
+    max_size=int(os.getenv("TOKEN_CACHE_MAX_SIZE", 10000)),
+    ttl_seconds=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 300)))
+
+
+def token_revocation() -> dict:
+    """users columns that stop honouring every token issued so far; merge into the user's update."""
+    return {"tokens_valid_after": datetime.utcnow().replace(microsecond=0).isoformat() + "+00:00"}
+
+
+def current_principal(principal: Principal, record: Optional[dict]) -> Optional[Principal]:
     """
-    Parse datetime string from Supabase, handling various formats.
-    Supabase sometimes returns timestamps with 5-digit microseconds which Python can't parse.
+    The principal with the role currently stored for the user, or None when the
+    user is gone or blocked, or the token was issued before tokens_valid_after.
     """
-    if not datetime_str:
+    if not record or record.get("is_blocked"):
         return None
-    try:
-        # Remove 'Z' and replace with '+00:00'
-        datetime_str = datetime_str.replace("Z", "+00:00")
-        # Try parsing directly
-        return datetime.fromisoformat(datetime_str)
-    except ValueError:
-        # If it fails, it might be due to microseconds issue
-        # Extract and normalize microseconds
-        import re
-        # Pattern: YYYY-MM-DDTHH:MM:SS.microseconds+TZ
-        match = re.match(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\.(\d+)([\+\-]\d{2}:\d{2})', datetime_str)
-        if match:
-            date_part, microseconds, tz_part = match.groups()
-            # Normalize microseconds to 6 digits
-            microseconds = microseconds.ljust(6, '0')[:6]
-            normalized = f"{date_part}.{microseconds}{tz_part}"
-            return datetime.fromisoformat(normalized)
-        # Fallback: return current time
-        return datetime.utcnow()
-
-
-def require_admin(user: dict):
+    valid_after = parse_utc_naive(record.get("tokens_valid_after"))
+    # iat has whole-second resolution, so a token issued in the revocation's second still counts
+    if valid_after and principal.issued_at < calendar.timegm(valid_after.timetuple()):
+        return None
+    return replace(principal, role=record.get("role") or principal.role)
+
+
+def get_current_principal(
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> Optional[Principal]:
+    """
+    FastAPI dependency resolving the bearer token into a Principal without a database round trip.
+    Returns None when no usable token is sent, so callers can fall back to the user_email lookup.
+    The role and revocation state are checked against the user record by resolve_caller().
+    """
+    if not TOKEN_AUTH_ENABLED or not credentials or credentials.scheme.lower() != "bearer":
+        return None
+
+    token = credentials.credentials
+    now = time.time()
+    principal = verified_token_cache.get(token)
+    if principal is None:
+        payload = verify_token(token)
+        if not payload or not payload.get("user_id") or not payload.get("role"):
+            return None
+        principal = Principal(
+            user_id=str(payload["user_id"]),
+            email=normalize_email(payload.get("email")),
+            role=payload["role"],
+            issued_at=float(payload.get("iat") or 0),
+            expires_at=float(payload["exp"]),
+        )
+        verified_token_cache.set(
+            token, principal,
+            ttl_seconds=max(min(verified_token_cache.ttl_seconds, principal.expires_at - now), 0))
+
+    if principal.expires_at <= now:
+        verified_token_cache.delete(token)
+        return None
+    return principal
+
+
+def _check_token_owner(user_email: str, principal: Principal):
+    if user_email and normalize_email(user_email) != principal.email:
+        raise HTTPException(
+            status_code=403,
+            detail="Access token does not belong to the requested user")
+
+
+def resolve_caller(user_email: str, principal: Optional[Principal], endpoint: str, fresh: bool = False):
+    """
+    Identify the caller for role checks.
+    A verified token is checked against the user's identity record (cached by id; re-read from the
+    database with `fresh`, for admin routes), which supplies the current role. A revoked token, or
+    no token, falls back to looking up user_email via the identity cache.
+    """
+    identity = get_identity_cache()
+    if principal:
+        _check_token_owner(user_email, principal)
+        if fresh:
+            identity.invalidate(user_id=principal.user_id)
+        current = current_principal(principal, identity.get_by_id(principal.user_id, endpoint=endpoint))
+        if current:
+            return current
+    return identity.get_by_email(user_email, endpoint=endpoint)
+
+
+async def resolve_caller_async(user_email: str, principal: Optional[Principal], endpoint: str, fresh: bool = False):
+    """resolve_caller() for async endpoints; lookups are awaited on the async client."""
+    identity = get_identity_cache()
+    if principal:
+        _check_token_owner(user_email, principal)
+        if fresh:
+            identity.invalidate(user_id=principal.user_id)
+        current = current_principal(principal, await identity.get_by_id_async(principal.user_id, endpoint=endpoint))
+        if current:
+            return current
+    return await identity.get_by_email_async(user_email, endpoint=endpoint)
+
+
+def require_admin(user):
     """ SECURITY FIX: Check if user is admin, raise 403 if not"""
     if not user or user.get('role') != 'admin':
         raise HTTPException(
@@ -231,7 +268,7 @@ def require_admin(user: dict):
         )
 
 
-def require_healthcare_provider(user: dict):
+def require_healthcare_provider(user):
     """ SECURITY FIX: Check if user is healthcare provider or admin"""
     if not user or user.get('role') not in ['healthcare_provider', 'admin']:
         raise HTTPException(
@@ -240,16 +277,6 @@ def require_healthcare_provider(user: dict):
         )
 
 
-# LOADING TRAINED MODEL AND SCALER
-try:
-    package = joblib.load("wombguard_pregnancy_model.pkl")
-    model = package["model"]
-    scaler = package["scaler"]
-    feature_names = package["feature_names"]
-except Exception as e:
-    raise RuntimeError(f" Error loading model package: {e}")
-
-
 # INPUT SCHEMAS
 class PatientData(BaseModel):
     Age: float
@@ -315,6 +342,40 @@ class ConsultationMessage(BaseModel):
     message: str
 
 
+# BACKGROUND WORKERS LIFECYCLE
+@app.on_event("startup")
+def start_background_workers():
+    # Loads the risk model; a bad package is logged and /predict answers 503 until a good one is loaded
+    get_model_registry().start()
+    get_chat_history_buffer().start()
+    get_prediction_spool().start()
+    get_explanation_jobs().start()
+    get_dashboard_store().start()
+    get_provider_directory().start()
+    get_mail_queue().start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    # Flushing buffered writes so nothing queued is lost on redeploy; queued explanations
+    # are spooled before the spool stops
+    get_explanation_jobs().stop()
+    get_chat_history_buffer().stop()
+    get_prediction_spool().stop()
+    get_dashboard_store().stop()
+    get_provider_directory().stop()
+    get_mail_queue().stop()
+    if get_pg_backend():
+        get_pg_backend().close()
+    get_password_hasher().shutdown()
+    get_model_registry().stop()
+
+
+@app.on_event("shutdown")
+async def close_async_clients():
+    await get_async_supabase().aclose()
+
+
 # ROOT ENDPOINT
 @app.get("/")
 def root():
@@ -338,58 +399,55 @@ def health_check():
     }
 
 
+# INTERNAL METRICS ENDPOINT
+@app.get("/metrics")
+def get_metrics():
+    """
+    Operational metrics for the background write paths.
+    Returns: queue depths, spool lag, batch sizes, retry and drop counters
+    """
+    return {
+        "status": "success",
+        "timestamp": datetime.utcnow().isoformat(),
+        "chat_history_buffer": get_chat_history_buffer().stats(),
+        "prediction_spool": get_prediction_spool().stats(),
+        "identity_cache": get_identity_cache().stats(),
+        "dashboard_store": get_dashboard_store().stats(),
+        "prediction_rollups": get_prediction_rollups().stats(),
+        "contact_resolver": contact_resolver_stats(),
+        "provider_directory": get_provider_directory().stats(),
+        "postgres_backend": get_pg_backend().stats() if get_pg_backend() else None,
+        "password_hasher": get_password_hasher().stats(),
+        "mail_queue": get_mail_queue().stats(),
+        "model_registry": get_model_registry().stats(),
+        "explanation_jobs": get_explanation_jobs().stats()
+    }
+
+
 # VALIDATION FUNCTION FOR HEALTH DATA
 def validate_patient_data(features: PatientData):
     """
     Validate patient health data against realistic ranges.
     Returns: (is_valid, error_message)
     """
-    errors = []
-
-    # Age validation: 10-60 years (reasonable for pregnancy)
-    if features.Age < 10 or features.Age > 60:
-        errors.append(f"Age {features.Age} is outside valid range (10-60 years)")
-
-    # Systolic BP: 70-200 mmHg
-    if features.Systolic_BP < 70 or features.Systolic_BP > 200:
-        errors.append(
-            f"Systolic BP {features.Systolic_BP} is outside valid range (70-200 mmHg)")
-
-    # Diastolic BP: 40-130 mmHg
-    if features.Diastolic < 40 or features.Diastolic > 130:
-        errors.append(
-            f"Diastolic BP {features.Diastolic} is outside valid range (40-130 mmHg)")
-
-    # Blood Sugar: 2.5-20 mmol/L (or 45-360 mg/dL)
-    if features.BS > 0 and (features.BS < 2.5 or features.BS > 20):
-        errors.append(
-            f"Blood Sugar {features.BS} is outside valid range (2.5-20 mmol/L)")
-
-    # Body Temperature: 35-40°C
-    if features.Body_Temp > 0 and (
-            features.Body_Temp < 35 or features.Body_Temp > 40):
-        errors.append(
-            f"Body Temperature {features.Body_Temp} is outside valid range (35-40°C)")
-
-    # BMI: 10-50 kg/m²
-    if features.BMI > 0 and (features.BMI < 10 or features.BMI > 50):
-        errors.append(f"BMI {features.BMI} is outside valid range (10-50 kg/m²)")
-
-    # Heart Rate: 40-150 bpm
-    if features.Heart_Rate > 0 and (
-            features.Heart_Rate < 40 or features.Heart_Rate > 150):
-        errors.append(
-            f"Heart Rate {features.Heart_Rate} is outside valid range (40-150 bpm)")
-
-    if errors:
-        return False, " | ".join(errors)
+    error_msg = validation_errors(pd.DataFrame([features.dict()]))[0]
+    if error_msg:
+        return False, error_msg
     return True, ""
 
 
 # PREDICTION ENDPOINT
 @app.post("/predict")
-def predict(features: PatientData, user_email: str = Query(...,
-            description="Email of the user making prediction")):
+def predict(
+        features: PatientData,
+        user_email: str = Query(..., description="Email of the user making prediction"),
+        explain: str = Query(
+            "full", pattern="^(none|fast|full|deferred)$",
+            description="none: label and probability only; fast: top_k approximate contributions; "
+                        "full: exact SHAP values for every feature; deferred: label and probability now, "
+                        "full SHAP values from GET /predict/{id}/explanation"),
+        top_k: int = Query(TOP_FEATURES, ge=1, le=len(FEATURE_COLUMNS),
+                           description="Contributions returned with explain=fast")):
     # Validate patient data FIRST (outside try-catch)
     is_valid, error_msg = validate_patient_data(features)
     if not is_valid:
@@ -399,104 +457,307 @@ def predict(features: PatientData, user_email: str = Query(...,
             detail=f"Invalid health data: {error_msg}")
 
     try:
-        # Prepare input
-        input_data = pd.DataFrame([features.dict()])[feature_names]
-        scaled_data = scaler.transform(input_data)
-
-        # Predict risk
-        probability = float(model.predict_proba(scaled_data)[:, 1][0])
-        predicted_class = int(probability >= 0.5)
-        risk_label = "High Risk" if predicted_class == 1 else "Low Risk"
-
-        # SHAP explanation
+        level = explain
+        if explain == "deferred":
+            # With the explanation backlog full, explain inline instead of queueing without bound
+            level = "none" if get_explanation_jobs().has_capacity() else "full"
+
+        # Predict risk and explain it with the active model version
+        version, results = get_model_registry().score_with_version(
+            pd.DataFrame([features.dict()]), explain=level, top_k=top_k)
+        model_version = version.version
+        result = results[0]
+        deferred = explain == "deferred" and level == "none"
+        if deferred:
+            result = {**result, "explanation_level": "deferred"}
+        prediction_id = str(uuid.uuid4())
+        risk_label = result["risk_label"]
+        probability = result["probability"]
+        shap_contributions = result["contributions"]
+        summary_text = result["summary"]
+
+        # Journal the prediction locally; the spool drains it to Supabase in batches
+        # and links it to the user account, so /predict never waits on the database
         try:
-            explainer = shap.TreeExplainer(model)
-            shap_values = explainer.shap_values(scaled_data)
-        except Exception:
-            explainer = shap.Explainer(model.predict, input_data)
-            shap_values = explainer(input_data).values
-
-        shap_array = np.array(
-            shap_values[1] if isinstance(
-                shap_values, list) else shap_values).reshape(
-            1, -1)
-        shap_contributions = dict(zip(feature_names, shap_array[0]))
-        top_features = sorted(
-            shap_contributions.items(),
-            key=lambda x: abs(
-                x[1]),
-            reverse=True)[
-                :3]
-        summary_text = "Top influencing features: " + ", ".join(
-            [f"{k} ({v:+.3f})" for k, v in top_features]
-        )
+            prediction_payload = prediction_record(
+                user_email.strip().lower(), features.dict(), result,
+                prediction_id, datetime.utcnow().isoformat())
 
-        # Save prediction in Supabase with all vital signs
-        try:
-            normalized_email = user_email.strip().lower()
-
-            # Try to fetch user metadata so we can link the prediction back to the account
-            user_record = None
-            try:
-                user_lookup = (
-                    supabase.table("users")
-                    .select("id, phone, name")
-                    .eq("email", normalized_email)
-                    .limit(1)
-                    .execute()
-                )
-                if user_lookup.data:
-                    user_record = user_lookup.data[0]
-                else:
-                    logger.warning(
-                        f" No matching user found for prediction email {normalized_email}"
-                    )
-            except Exception as user_fetch_error:
-                logger.warning(
-                    f" Could not fetch user record for {normalized_email}: {user_fetch_error}"
-                )
-
-            prediction_payload = {
-                "user_email": normalized_email,
-                "predicted_risk": risk_label,
-                "probability": probability,
-                "confidence_score": round(max(probability, 1 - probability), 4),
-                "age": float(features.Age),
-                "systolic_bp": float(features.Systolic_BP),
-                "diastolic": float(features.Diastolic),
-                "bs": float(features.BS),
-                "body_temp": float(features.Body_Temp),
-                "bmi": float(features.BMI),
-                "heart_rate": float(features.Heart_Rate),
+            get_prediction_spool().append(prediction_payload)
+            get_dashboard_store().record_prediction(prediction_payload)
+        except Exception as e:
+            logger.error(f" Could not spool prediction for {user_email}: {e}")
+
+        if deferred:
+            # Queued after the row is spooled, so the explanation update lands after the insert
+            get_explanation_jobs().submit(prediction_id, user_email.strip().lower(), features.dict(), version)
+            explanation = {
+                "level": "deferred",
+                "id": prediction_id,
+                "status": "pending",
+                "url": f"/predict/{prediction_id}/explanation",
+            }
+        else:
+            explanation = {
+                "level": level,
                 "feature_importance": shap_contributions,
-                "explanation": summary_text,
-                "role": "pregnant_woman",
-                "created_at": datetime.utcnow().isoformat()
+                "summary": summary_text,
             }
 
-            if user_record and user_record.get("id"):
-                prediction_payload["user_id"] = user_record["id"]
-
-            supabase.table("predictions").insert(prediction_payload).execute()
-        except Exception as e:
-            print(f" Warning: Could not store prediction: {e}")
-
         return {
             "prediction": {
                 "Predicted_Risk_Level": risk_label,
                 "Probability_High_Risk": round(probability, 4),
                 "Confidence_Score": round(max(probability, 1 - probability), 4),
             },
-            "explanation": {
-                "feature_importance": shap_contributions,
-                "summary": summary_text,
-            },
+            "explanation": explanation,
+            "model_version": model_version,
         }
 
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 
+# DEFERRED EXPLANATION ENDPOINT
+EXPLANATION_MAX_WAIT_SECONDS = 30
+EXPLANATION_RETRY_AFTER_SECONDS = 5
+
+
+@app.get("/predict/{prediction_id}/explanation")
+async def get_prediction_explanation(
+        prediction_id: str,
+        user_email: str = Query(..., description="Email the prediction was made with"),
+        wait: float = Query(0, ge=0, le=EXPLANATION_MAX_WAIT_SECONDS,
+                            description="Seconds to hold the request open while the explanation is pending")):
+    """
+    Explanation of a /predict?explain=deferred prediction, optionally long-polled.
+    Returns: status pending (HTTP 202), ready with every feature's SHAP value, or failed
+    """
+    user_email = user_email.strip().lower()
+    jobs = get_explanation_jobs()
+    job = jobs.get(prediction_id)
+
+    if job is None:
+        # Not explained by this process recently (expired, restarted, another replica): read the stored row
+        try:
+            response = await PREDICTION_EXPORT_ROW.query(get_async_supabase()).eq("id", prediction_id).limit(1).execute()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching prediction: {str(e)}")
+        row = response.data[0] if response.data else None
+        if row is None or (row.get("user_email") or "").strip().lower() != user_email:
+            raise HTTPException(status_code=404, detail="Prediction not found")
+
+        if row.get("feature_importance") is not None:
+            return {
+                "id": prediction_id,
+                "status": "ready",
+                "level": row.get("explanation_level"),
+                "feature_importance": row["feature_importance"],
+                "summary": row.get("explanation"),
+                "model_version": None,
+            }
+        if row.get("explanation_level") != "deferred":
+            raise HTTPException(status_code=404, detail="No explanation was requested for this prediction")
+
+        # Its job was lost before it ran; the active model explains it again once there is room
+        if not jobs.has_capacity():
+            raise HTTPException(
+                status_code=503, detail="Explanation queue is full, try again shortly",
+                headers={"Retry-After": str(EXPLANATION_RETRY_AFTER_SECONDS)})
+        try:
+            version = get_model_registry().current()
+        except ModelUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        features = {feature: float(row[column]) for feature, column in FEATURE_COLUMNS.items()}
+        job = jobs.submit(prediction_id, user_email, features, version)
+    elif job.user_email != user_email:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+
+    await jobs.wait(job, wait)
+    explanation = job.describe()
+    if explanation["status"] == "pending":
+        return JSONResponse(status_code=202, content=explanation)
+    return explanation
+
+
+# BATCH PREDICTION UPLOAD
+PREDICT_UPLOAD_CHUNK_ROWS = int(os.getenv("PREDICT_UPLOAD_CHUNK_ROWS", 256))
+PREDICT_UPLOAD_MAX_ROWS = int(os.getenv("PREDICT_UPLOAD_MAX_ROWS", 100000))
+
+
+def score_upload_chunk(header: list, rows: list, first_row: int, user_email: str, explain: str = "full") -> tuple:
+    """
+    Validate, score and spool one chunk of an uploaded CSV.
+    Returns (model version, one NDJSON-ready result per row in file order).
+    """
+    frame = frame_from_rows(header, rows, extra_columns=("user_email",))
+    errors = validation_errors(frame)
+    valid = [index for index, error in enumerate(errors) if not error]
+    model_version, results = get_model_registry().score(frame.iloc[valid], explain=explain)
+    scored = dict(zip(valid, results))
+
+    created_at = datetime.utcnow().isoformat()
+    lines = []
+    records = []
+    for index, error in enumerate(errors):
+        row_number = first_row + index
+        if error:
+            lines.append({"row": row_number, "status": "invalid", "detail": f"Invalid health data: {error}"})
+            continue
+        result = scored[index]
+        row_email = frame.at[index, "user_email"].strip().lower() or user_email
+        record = prediction_record(
+            row_email, frame.iloc[index], result, str(uuid.uuid4()), created_at)
+        records.append(record)
+        lines.append({
+            "row": row_number,
+            "status": "scored",
+            "id": record["id"],
+            "user_email": row_email,
+            "prediction": {
+                "Predicted_Risk_Level": result["risk_label"],
+                "Probability_High_Risk": round(result["probability"], 4),
+                "Confidence_Score": result["confidence"],
+            },
+            "explanation": {
+                "level": explain,
+                "feature_importance": result["contributions"],
+                "summary": result["summary"],
+            },
+        })
+
+    # One spool transaction per chunk; the spool drains to Supabase in batched upserts
+    try:
+        get_prediction_spool().append_many(records)
+        for record in records:
+            get_dashboard_store().record_prediction(record)
+    except Exception as e:
+        logger.error(f" Could not spool {len(records)} uploaded predictions: {e}")
+        for line in lines:
+            if line["status"] == "scored":
+                line["status"] = "not_saved"
+    return model_version, lines
+
+
+@app.post("/predict/upload")
+async def predict_upload(
+        request: Request,
+        user_email: str = Query(..., description="Email the predictions are recorded for, unless a row has its own user_email"),
+        chunk_size: int = Query(PREDICT_UPLOAD_CHUNK_ROWS, ge=1, le=5000),
+        explain: str = Query("full", pattern="^(none|fast|full)$", description="Explanation level, as for /predict")):
+    """
+    Score a CSV of patient vitals, one row per assessment.
+
+    Accepts a text/csv body or a multipart form with the file in a `file` field.
+    Columns are the /predict fields (Age, Systolic_BP, Diastolic, BS, Body_Temp,
+    BMI, Heart_Rate) plus an optional user_email. Results stream back as NDJSON,
+    one line per row as each chunk is scored, followed by a summary line.
+    """
+    default_email = user_email.strip().lower()
+    try:
+        model_version = get_model_registry().current().version
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def results():
+        nonlocal model_version
+        started = time.perf_counter()
+        counts = Counter()
+        rows_read = 0
+        error = None
+        try:
+            async for header, rows in iter_csv_chunks(request, chunk_rows=chunk_size):
+                if rows_read + len(rows) > PREDICT_UPLOAD_MAX_ROWS:
+                    error = f"At most {PREDICT_UPLOAD_MAX_ROWS} rows can be scored per upload"
+                    break
+                model_version, lines = await run_in_threadpool(
+                    score_upload_chunk, header, rows, rows_read + 1, default_email, explain)
+                rows_read += len(rows)
+                counts.update(line["status"] for line in lines)
+                yield "".join(json.dumps(line) + "\n" for line in lines)
+        except ValueError as e:
+            error = str(e)
+        except Exception as e:
+            logger.error(f" Prediction upload for {default_email} failed after {rows_read} rows: {e}")
+            error = f"Prediction failed: {str(e)}"
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Scored upload for {default_email}: {rows_read} rows in {elapsed:.2f}s {dict(counts)}")
+        yield json.dumps({
+            "summary": {
+                "rows": rows_read,
+                "scored": counts["scored"],
+                "invalid": counts["invalid"],
+                "not_saved": counts["not_saved"],
+                "seconds": round(elapsed, 3),
+                "model_version": model_version,
+                "error": error,
+            }
+        }) + "\n"
+
+    return RequestStreamingResponse(results(), media_type="application/x-ndjson")
+
+
+# RISK MODEL MANAGEMENT (ADMIN)
+def model_package_path(filename: str) -> str:
+    """Model packages are only loaded from the directory of MODEL_PATH."""
+    name = os.path.basename(filename or "")
+    if not name.endswith(".pkl"):
+        raise HTTPException(status_code=400, detail="Model package must be a .pkl file name")
+    path = os.path.join(os.path.dirname(os.path.abspath(get_model_registry().path)), name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Model package {name} not found")
+    return path
+
+
+@app.get("/admin/models")
+async def admin_model_status(
+        admin_email: str = Query(...),
+        principal: Optional[Principal] = Depends(get_current_principal)):
+    """Active and shadow model versions with per-version latency and shadow deltas (Admin only)."""
+    admin_user = await resolve_caller_async(admin_email, principal, endpoint="/admin/models", fresh=True)
+    require_admin(admin_user)
+    return {"status": "success", "data": get_model_registry().stats()}
+
+
+@app.post("/admin/models/reload", status_code=202)
+async def admin_reload_model(
+        admin_email: str = Query(...),
+        filename: Optional[str] = Query(None, description="Package in the model directory; default: the configured MODEL_PATH"),
+        target: str = Query("active", pattern="^(active|shadow)$"),
+        principal: Optional[Principal] = Depends(get_current_principal)):
+    """
+    Load a model package in the background (Admin only).
+    target=active swaps it in once loaded; target=shadow scores live traffic with it off the response path.
+    """
+    admin_user = await resolve_caller_async(admin_email, principal, endpoint="/admin/models/reload", fresh=True)
+    require_admin(admin_user)
+
+    registry = get_model_registry()
+    path = model_package_path(filename) if filename else registry.path
+    started = registry.load_in_background(path, shadow=(target == "shadow"))
+    logger.info(f"Admin {admin_email} requested {target} model load of {path}")
+    return {
+        "status": "loading" if started else "already_loading",
+        "target": target,
+        "path": path,
+        "active_version": registry.active.version if registry.active else None,
+    }
+
+
+@app.delete("/admin/models/shadow")
+async def admin_clear_shadow_model(
+        admin_email: str = Query(...),
+        principal: Optional[Principal] = Depends(get_current_principal)):
+    """Stop shadow scoring (Admin only)."""
+    admin_user = await resolve_caller_async(admin_email, principal, endpoint="/admin/models/shadow", fresh=True)
+    require_admin(admin_user)
+    get_model_registry().set_shadow(None)
+    return {"status": "success", "message": "Shadow model cleared"}
+
+
 # DASHBOARD ENDPOINT
 @app.get("/dashboard")
 def dashboard(role: str = Query(...,
@@ -510,7 +771,7 @@ def dashboard(role: str = Query(...,
     Ensures frontend always receives a predictable structure.
     """
     try:
-        query = supabase.table("predictions").select("*")
+        query = PREDICTION_DASHBOARD_ROW.query(supabase)
 
         # For pregnant women, filter by their email
         if role == "pregnant_woman" and user_email:
@@ -534,7 +795,7 @@ def dashboard(role: str = Query(...,
 
 # USER REGISTRATION
 @app.post("/register")
-def register(user: UserRegister):
+async def register(user: UserRegister):
     try:
         # Allowing only allow pregnant_woman role for self-registration
         # Healthcare providers and admins must be created by admins only
@@ -544,50 +805,54 @@ def register(user: UserRegister):
                 detail="Only pregnant women can self-register. Contact an administrator to create healthcare provider or admin accounts."
             )
 
-        hashed_password = hash_password(user.password)
+        db = get_async_supabase()
+        email = user.email.strip().lower()
+        phone = user.phone.strip()
+
+        # Checking if email or phone already exists (independent lookups, run concurrently)
+        existing, phone_existing = await asyncio.gather(
+            USER_KEY.query(db).eq("email", email).limit(1).execute(),
+            USER_KEY.query(db).eq("phone", phone).limit(1).execute(),
+        )
+        if existing.data:
+            raise HTTPException(
+                status_code=400,
+                detail="User with this email already exists")
+        if phone_existing.data:
+            raise HTTPException(
+                status_code=400,
+                detail="User with this phone number already exists")
+
+        # bcrypt is CPU-bound, so it runs on the password hashing pool
+        hashed_password = await get_password_hasher().hash_async(user.password)
 
         # NEW: Generate verification token
         verification_token = generate_verification_token()
 
         user_data = {
             "name": user.name.strip(),
-            "email": user.email.strip().lower(),
+            "email": email,
             "password": hashed_password,
-            "phone": user.phone.strip(),  
+            "phone": phone,  
             "role": 'pregnant_woman',  
             "email_verified": False,  
             "verification_token": verification_token,  
         }
 
-        # Checking if user already exists
-        existing = supabase.table("users").select(
-            "*").eq("email", user_data["email"]).execute()
-        if existing.data:
-            raise HTTPException(
-                status_code=400,
-                detail="User with this email already exists")
-
-        # NEW: Checking if phone already exists
-        phone_existing = supabase.table("users").select(
-            "*").eq("phone", user_data["phone"]).execute()
-        if phone_existing.data:
-            raise HTTPException(
-                status_code=400,
-                detail="User with this phone number already exists")
-
         # Inserting new user
-        response = supabase.table("users").insert(user_data).execute()
+        response = await db.table("users").insert(user_data).execute()
         if not response.data:
             raise HTTPException(
                 status_code=400,
                 detail="Registration failed — no response data")
+        get_identity_cache().invalidate(email=user_data["email"])
+        get_provider_directory().mark_providers_stale()
 
         # NEW: Sending verification email
         send_verification_email(user_data["email"], verification_token)
 
         logger.info(f" New pregnant woman registered: {user_data['email']}")
         logger.info(f" Phone stored: {user_data['phone']}")
-        logger.info(f" Verification email sent to: {user_data['email']}")
         # NEW: Include verification link in response for development
         verification_link = f"{FRONTEND_BASE_URL}/verify-email?token={verification_token}"
 
@@ -607,6 +872,8 @@ def register(user: UserRegister):
 
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Registration is busy, please try again shortly")
     except Exception as e:
         logger.error(f"Registration error: {str(e)}")
         raise HTTPException(
@@ -616,10 +883,9 @@ def register(user: UserRegister):
 
 # USER LOGIN
 @app.post("/login")
-def login(credentials: UserLogin):
+async def login(credentials: UserLogin):
     try:
-        response = supabase.table("users").select(
-            "*").eq("email", credentials.email.lower()).execute()
+        response = await USER_LOGIN.query(get_async_supabase()).eq("email", credentials.email.lower()).execute()
         users = response.data
         if not users:
             raise HTTPException(status_code=404, detail="User not found")
@@ -638,9 +904,19 @@ def login(credentials: UserLogin):
                 detail="Email not verified. Please check your email and click the verification link."
             )
 
-        if not verify_password(credentials.password, user["password"]):
+        matches, upgraded_hash = await get_password_hasher().verify_and_update_async(
+            credentials.password, user.get("password"))
+        if not matches:
             raise HTTPException(status_code=401, detail="Incorrect password")
 
+        # Stored hash uses outdated bcrypt parameters; replace it while the plaintext is at hand
+        if upgraded_hash:
+            try:
+                await get_async_supabase().table("users").update({"password": upgraded_hash}).eq("id", user["id"]).execute()
+                logger.info(f" Password hash upgraded for: {user['email']}")
+            except Exception as e:
+                logger.warning(f" Could not upgrade password hash for {user['email']}: {e}")
+
         # NEW: Creating JWT token
         access_token = create_access_token(
             data={
@@ -663,6 +939,8 @@ def login(credentials: UserLogin):
 
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Login is busy, please try again shortly")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Login error: {str(e)}")
 
@@ -673,8 +951,7 @@ def verify_email(request: EmailVerificationRequest):
     """ NEW: Verify user email using verification token."""
     try:
         # Finding user by verification token
-        response = supabase.table("users").select(
-            "*").eq("verification_token", request.token).execute()
+        response = USER_VERIFICATION.query(supabase).eq("verification_token", request.token).execute()
         if not response.data:
             raise HTTPException(
                 status_code=400,
@@ -693,6 +970,7 @@ def verify_email(request: EmailVerificationRequest):
             update_data).eq("id", user["id"]).execute()
         if not update_response.data:
             raise HTTPException(status_code=400, detail="Failed to verify email")
+        get_identity_cache().invalidate(user_id=user["id"], email=user["email"])
 
         logger.info(f" Email verified for user: {user['email']}")
         return {
@@ -712,7 +990,10 @@ def verify_email(request: EmailVerificationRequest):
 
 # ADMIN-ONLY USER CREATION ENDPOINT
 @app.post("/admin/create-user")
-def admin_create_user(user: UserRegister, admin_email: str = Query(...)):
+def admin_create_user(
+        user: UserRegister,
+        admin_email: str = Query(...),
+        principal: Optional[Principal] = Depends(get_current_principal)):
     """
     SECURITY FIX: Create a new user with any role.
     Only admins can use this endpoint.
@@ -722,13 +1003,10 @@ def admin_create_user(user: UserRegister, admin_email: str = Query(...)):
     """
     try:
         # Getting current user (admin) and verify admin role
-        admin_response = supabase.table("users").select(
-            "*").eq("email", admin_email.lower()).execute()
-        if not admin_response.data:
+        admin_user = resolve_caller(admin_email, principal, endpoint="/admin/create-user", fresh=True)
+        if not admin_user:
             raise HTTPException(status_code=401, detail="Admin user not found")
 
-        admin_user = admin_response.data[0]
-
         # SECURITY FIX: Checking if current user is admin
         require_admin(admin_user)
 
@@ -749,16 +1027,14 @@ def admin_create_user(user: UserRegister, admin_email: str = Query(...)):
         }
 
         # Checking if user already exists
-        existing = supabase.table("users").select(
-            "*").eq("email", user_data["email"]).execute()
+        existing = USER_KEY.query(supabase).eq("email", user_data["email"]).limit(1).execute()
         if existing.data:
             raise HTTPException(
                 status_code=400,
                 detail="User with this email already exists")
 
         # NEW: Checking if phone already exists
-        phone_existing = supabase.table("users").select(
-            "*").eq("phone", user_data["phone"]).execute()
+        phone_existing = USER_KEY.query(supabase).eq("phone", user_data["phone"]).limit(1).execute()
         if phone_existing.data:
             raise HTTPException(
                 status_code=400,
@@ -768,6 +1044,8 @@ def admin_create_user(user: UserRegister, admin_email: str = Query(...)):
         response = supabase.table("users").insert(user_data).execute()
         if not response.data:
             raise HTTPException(status_code=400, detail="User creation failed")
+        get_identity_cache().invalidate(email=user_data["email"])
+        get_provider_directory().mark_providers_stale()
 
         # NEW: Sending verification email
         send_verification_email(user_data["email"], verification_token)
@@ -775,7 +1053,6 @@ def admin_create_user(user: UserRegister, admin_email: str = Query(...)):
         logger.info(
             f" Admin {admin_email} created user {user_data['email']} with role {user_data['role']}")
         logger.info(f" Phone stored: {user_data['phone']}")
-        logger.info(f" Verification email sent to: {user_data['email']}")
 
         return {
             "status": "success",
@@ -791,6 +1068,8 @@ def admin_create_user(user: UserRegister, admin_email: str = Query(...)):
 
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Password hashing is busy, please try again shortly")
     except Exception as e:
         logger.error(f"Error creating user: {str(e)}")
         raise HTTPException(
@@ -798,6 +1077,91 @@ def admin_create_user(user: UserRegister, admin_email: str = Query(...)):
             detail=f"User creation error: {str(e)}")
 
 
+# BULK USER IMPORT (ADMIN)
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", 2000))
+BULK_IMPORT_CHUNK_SIZE = int(os.getenv("BULK_IMPORT_CHUNK_SIZE", 100))
+
+
+@app.post("/admin/users/bulk")
+async def admin_bulk_create_users(
+        request: Request,
+        admin_email: str = Query(...),
+        default_role: str = Query("healthcare_provider", description="Role for rows without a role column"),
+        principal: Optional[Principal] = Depends(get_current_principal)):
+    """
+    Create many users at once (Admin only).
+
+    Accepts a text/csv or application/json body, or a multipart form with the
+    file in a `file` field. Columns: name, email, phone, password and optional
+    role. Returns a status for every row; verification emails are queued for
+    each created user.
+    """
+    try:
+        admin_user = await resolve_caller_async(admin_email, principal, endpoint="/admin/users/bulk", fresh=True)
+        if not admin_user:
+            raise HTTPException(status_code=401, detail="Admin user not found")
+        require_admin(admin_user)
+
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Upload a CSV or JSON file in the 'file' field")
+            body = await upload.read()
+            content_type = upload.content_type or ""
+        else:
+            body = await request.body()
+
+        try:
+            raw_rows = parse_upload(content_type, body)
+        except (ValueError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Could not parse upload: {e}")
+        if not raw_rows:
+            raise HTTPException(status_code=400, detail="No users found in upload")
+        if len(raw_rows) > BULK_IMPORT_MAX_ROWS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {BULK_IMPORT_MAX_ROWS} users can be imported at once")
+
+        results, created = await import_users(
+            raw_rows,
+            get_async_supabase(),
+            get_password_hasher(),
+            generate_verification_token,
+            default_role=default_role.strip().lower(),
+            chunk_size=BULK_IMPORT_CHUNK_SIZE,
+        )
+
+        for user_data in created:
+            get_identity_cache().invalidate(email=user_data["email"])
+            send_verification_email(user_data["email"], user_data["verification_token"])
+        if created:
+            get_provider_directory().mark_providers_stale()
+
+        counts = Counter(result["status"] for result in results)
+        logger.info(
+            f" Admin {admin_email} bulk-imported {counts['created']} of {len(results)} users")
+        return {
+            "status": "success",
+            "summary": {
+                "total": len(results),
+                **{status: counts[status] for status in ("created", "exists", "duplicate", "invalid", "failed")},
+            },
+            "results": results,
+        }
+
+    except HTTPException:
+        raise
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Password hashing is busy, please retry the import shortly")
+    except Exception as e:
+        logger.error(f"Bulk user import error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Bulk user import error: {str(e)}")
+
+
 # CHATBOT ENDPOINT (INTEGRATED WITH TRAINED MODELS)
 @app.post("/chat")
 def chat(chat_data: ChatMessage):
@@ -835,18 +1199,17 @@ def chat(chat_data: ChatMessage):
             model_used = result["model_used"]
             logger.info(f"Generated response using {model_used}")
 
-        # Saving chat message to Supabase
-        try:
-            supabase.table("chat_history").insert({
-                "user_id": chat_data.user_id,
-                "user_message": chat_data.message,
-                "bot_response": bot_response,
-                "conversation_id": chat_data.conversation_id or "default",
-                "model_used": model_used,
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
-        except Exception as e:
-            logger.warning(f"Could not save chat message: {e}")
+        # Queueing chat message for a batched Supabase insert (off the response path)
+        queued = get_chat_history_buffer().submit({
+            "user_id": chat_data.user_id,
+            "user_message": chat_data.message,
+            "bot_response": bot_response,
+            "conversation_id": chat_data.conversation_id or "default",
+            "model_used": model_used,
+            "created_at": datetime.utcnow().isoformat()
+        })
+        if not queued:
+            logger.warning("Could not queue chat message: chat history buffer is full")
 
         return {
             "response": bot_response,
@@ -892,8 +1255,10 @@ def start_new_conversation(request: NewConversationRequest):
 
 # DASHBOARD STATS ENDPOINT
 @app.get("/dashboard-stats")
-def get_dashboard_stats(user_email: str = Query(...,
-                        description="User email")):
+def get_dashboard_stats(
+        user_email: str = Query(..., description="User email"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="Recent assessments page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page")):
     """
     Fetch comprehensive dashboard statistics for pregnant women.
     Returns: completed assessments, upcoming checkups, high risk alerts, recent assessments
@@ -901,35 +1266,32 @@ def get_dashboard_stats(user_email: str = Query(...,
     try:
         user_email = user_email.strip().lower()
 
-        # Fetching all predictions for this user
-        predictions_response = (
-            supabase.table("predictions")
-            .select("*")
-            .eq("user_email", user_email)
-            .order("created_at", desc=True)
-            .execute()
-        )
-        predictions = predictions_response.data or []
+        # Reading this user's counts and last 5 assessments from the aggregate store
+        patient_stats = get_dashboard_store().patient_stats(user_email)
 
-        # Calculating stats
-        completed_assessments = len(predictions)
-        high_risk_alerts = sum(1 for p in predictions if p.get(
-            "predicted_risk") == "High Risk")
-        last_assessment = predictions[0]["created_at"] if predictions else None
-
-        # Getting recent assessments (last 5)
-        recent_assessments = predictions[:5]
+        next_cursor = None
+        if is_paginated(limit, cursor):
+            # Paging further back than the cached five reads the database
+            patient_stats["recent_assessments"], next_cursor = paginate(
+                PREDICTION_DASHBOARD_ROW.query(supabase).eq("user_email", user_email),
+                limit, cursor
+            )
 
-        return {
+        result = {
             "status": "success",
             "stats": {
-                "completed_assessments": completed_assessments,
+                "completed_assessments": patient_stats["completed_assessments"],
                 "upcoming_checkups": 0,  
-                "high_risk_alerts": high_risk_alerts,
-                "last_assessment": last_assessment
+                "high_risk_alerts": patient_stats["high_risk_alerts"],
+                "last_assessment": patient_stats["last_assessment"]
             },
-            "recent_assessments": recent_assessments
+            "recent_assessments": patient_stats["recent_assessments"]
         }
+        if is_paginated(limit, cursor):
+            result["next_cursor"] = next_cursor
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch dashboard stats: {e}")
         return {
@@ -956,8 +1318,8 @@ def get_user_profile(user_email: str = Query(..., description="User email")):
         user_email = user_email.strip().lower()
 
         # Fetching user from database
-        response = supabase.table("users").select(
-            "*").eq("email", user_email).execute()
+        # Profile columns only; the password hash and verification token never leave the database
+        response = USER_PROFILE.query(supabase).eq("email", user_email).execute()
 
         if not response.data:
             return {
@@ -967,8 +1329,6 @@ def get_user_profile(user_email: str = Query(..., description="User email")):
             }
 
         user = response.data[0]
-        # Removing password from response
-        user.pop("password", None)
 
         return {
             "status": "success",
@@ -985,21 +1345,21 @@ def get_user_profile(user_email: str = Query(..., description="User email")):
 
 # RISK ASSESSMENTS HISTORY ENDPOINT
 @app.get("/risk-assessments")
-def get_risk_assessments(user_email: str = Query(...,
-                         description="User email")):
+def get_risk_assessments(
+        user_email: str = Query(..., description="User email"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="Page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page")):
     """Fetch all risk assessments for a user from predictions table."""
     try:
-        response = (
-            supabase.table("predictions")
-            .select("*")
-            .eq("user_email", user_email.strip().lower())
-            .order("created_at", desc=True)
-            .execute()
+        predictions, next_cursor = paginate(
+            PREDICTION_EXPORT_ROW.query(supabase)
+            .eq("user_email", user_email.strip().lower()),
+            limit, cursor
         )
 
         # Transforming data to match frontend expectations
         assessments = []
-        for pred in response.data or []:
+        for pred in predictions:
             assessment = {
                 "id": pred.get("id"),
                 "riskLevel": pred.get(
@@ -1026,6 +1386,7 @@ def get_risk_assessments(user_email: str = Query(...,
                 "heart_rate": pred.get("heart_rate"),
                 "explanation": pred.get("explanation"),
                 "feature_importance": pred.get("feature_importance"),
+                "explanation_level": pred.get("explanation_level"),
                 "recommendations": [
                     "Attend scheduled prenatal check-ups regularly",
                     "Monitor blood pressure and blood sugar regularly",
@@ -1033,7 +1394,12 @@ def get_risk_assessments(user_email: str = Query(...,
                     "Report any unusual symptoms immediately"]}
             assessments.append(assessment)
 
-        return {"status": "success", "data": assessments}
+        result = {"status": "success", "data": assessments}
+        if is_paginated(limit, cursor):
+            result["next_cursor"] = next_cursor
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch risk assessments: {e}")
         return {"status": "error", "data": [], "message": str(e)}
@@ -1041,7 +1407,9 @@ def get_risk_assessments(user_email: str = Query(...,
 
 # HEALTHCARE PROVIDER DIRECTORY ENDPOINT
 @app.get("/providers")
-def list_healthcare_providers(user_email: str = Query(...)):
+def list_healthcare_providers(
+        user_email: str = Query(...),
+        principal: Optional[Principal] = Depends(get_current_principal)):
     """
     Provide a directory of healthcare providers with contact details and consultation stats.
     Accessible to pregnant women (primary audience), admins, and providers themselves.
@@ -1050,105 +1418,15 @@ def list_healthcare_providers(user_email: str = Query(...)):
         requester_email = user_email.strip().lower()
 
         # Verify requesting user exists and is authorized to view providers
-        requester_response = supabase.table("users").select("role").eq("email", requester_email).limit(1).execute()
-        if not requester_response.data:
+        requester = resolve_caller(requester_email, principal, endpoint="/providers")
+        if not requester:
             raise HTTPException(status_code=401, detail="User not found")
 
-        requester = requester_response.data[0]
         if requester.get("role") not in ["pregnant_woman", "healthcare_provider", "admin"]:
             raise HTTPException(status_code=403, detail="Unauthorized to view providers")
 
-        # Fetch all healthcare providers
-        providers_response = (
-            supabase
-            .table("users")
-            .select("id, name, email, phone, role, created_at")
-            .eq("role", "healthcare_provider")
-            .order("created_at", desc=False)
-            .execute()
-        )
-        providers_raw = providers_response.data or []
-
-        # Gather consultation data to derive provider stats
-        consultations_response = supabase.table("consultation_requests").select(
-            "healthcare_provider_email, status, created_at, responded_at, pregnant_woman_email"
-        ).execute()
-        consultations = consultations_response.data or []
-
-        stats_map = {}
-        for consult in consultations:
-            provider_email = (consult.get("healthcare_provider_email") or "").strip().lower()
-            if not provider_email:
-                continue
-
-            entry = stats_map.setdefault(provider_email, {
-                "total": 0,
-                "pending": 0,
-                "accepted": 0,
-                "declined": 0,
-                "closed": 0,
-                "unique_patients": set(),
-                "response_times": [],
-                "last_consultation_dt": None,
-                "last_consultation_raw": None
-            })
-
-            entry["total"] += 1
-            status = (consult.get("status") or "").strip().lower()
-            if status in ["pending", "accepted", "declined", "closed"]:
-                entry[status] += 1
-
-            patient_email = (consult.get("pregnant_woman_email") or "").strip().lower()
-            if patient_email:
-                entry["unique_patients"].add(patient_email)
-
-            created_at_raw = consult.get("created_at")
-            created_at_dt = parse_datetime(created_at_raw)
-            responded_at_dt = parse_datetime(consult.get("responded_at"))
-            if created_at_dt and responded_at_dt and responded_at_dt >= created_at_dt:
-                entry["response_times"].append((responded_at_dt - created_at_dt).total_seconds())
-
-            if created_at_dt:
-                prev_dt = entry.get("last_consultation_dt")
-                if not prev_dt or created_at_dt > prev_dt:
-                    entry["last_consultation_dt"] = created_at_dt
-                    entry["last_consultation_raw"] = created_at_raw
-
-        directory = []
-        for provider in providers_raw:
-            provider_email = (provider.get("email") or "").strip().lower()
-            provider_stats = stats_map.get(provider_email, {})
-
-            response_times = provider_stats.get("response_times", [])
-            avg_response_hours = None
-            if response_times:
-                avg_response_hours = round(mean(response_times) / 3600, 1)
-
-            pending = provider_stats.get("pending", 0)
-            availability = "Available"
-            if pending >= 5:
-                availability = "High demand"
-            elif pending >= 1:
-                availability = "Responding"
-
-            directory.append({
-                "id": provider.get("id"),
-                "name": provider.get("name"),
-                "email": provider.get("email"),
-                "phone": provider.get("phone") or "N/A",
-                "joined_at": provider.get("created_at"),
-                "total_consultations": provider_stats.get("total", 0),
-                "pending_consultations": pending,
-                "accepted_consultations": provider_stats.get("accepted", 0),
-                "closed_consultations": provider_stats.get("closed", 0),
-                "patients_supported": len(provider_stats.get("unique_patients", set())),
-                "average_response_hours": avg_response_hours,
-                "availability_status": availability,
-                "last_consultation_at": provider_stats.get("last_consultation_raw"),
-            })
-
-        # Sort alphabetically for consistent UI
-        directory.sort(key=lambda item: (item.get("name") or "").lower())
+        # Provider list and consultation stats are held in memory and updated as requests change
+        directory = get_provider_directory().directory()
 
         return {
             "status": "success",
@@ -1164,7 +1442,9 @@ def list_healthcare_providers(user_email: str = Query(...)):
 
 # HEALTHCARE WORKER DASHBOARD ENDPOINT
 @app.get("/healthcare-dashboard")
-def get_healthcare_dashboard(user_email: str = Query(...)):
+def get_healthcare_dashboard(
+        user_email: str = Query(...),
+        principal: Optional[Principal] = Depends(get_current_principal)):
     """
     Fetch comprehensive healthcare worker dashboard data.
     Only healthcare providers and admins can access this endpoint
@@ -1173,290 +1453,30 @@ def get_healthcare_dashboard(user_email: str = Query(...)):
     try:
         # Getting current user and verifying healthcare provider or
         # admin role
-        user_response = supabase.table("users").select(
-            "*").eq("email", user_email.lower()).execute()
-        if not user_response.data:
+        current_user = resolve_caller(user_email, principal, endpoint="/healthcare-dashboard")
+        if not current_user:
             raise HTTPException(status_code=401, detail="User not found")
 
-        current_user = user_response.data[0]
-
         # Checking if user is healthcare provider or admin
         require_healthcare_provider(current_user)
 
         logger.info(
             f" Healthcare provider {user_email} accessed healthcare dashboard")
 
-        # Fetching all predictions (all pregnant women's assessments)
-        predictions_response = (
-            supabase.table("predictions")
-            .select("*")
-            .order("created_at", desc=True)
-            .execute()
-        )
-        predictions_raw = predictions_response.data or []
-
-        # Fetch all users to get phone numbers
-        users_response = supabase.table("users").select("id, email, phone, name").execute()
-        users_data = users_response.data or []
-
-        # Create a mapping of email to phone number
-        email_to_phone = {}
-        email_to_name = {}
-        id_to_phone = {}
-        id_to_name = {}
-        for user in users_data:
-            email = (user.get("email") or "").strip().lower()
-            phone = (user.get("phone") or "").strip()
-            name = user.get("name") or "Unknown"
-            normalized_phone = phone if phone else "N/A"
-
-            email_to_phone[email] = normalized_phone
-            email_to_name[email] = name
-
-            user_id = user.get("id")
-            if user_id:
-                id_to_phone[user_id] = normalized_phone
-                id_to_name[user_id] = name
-
-        contact_lookup_cache = {}
-
-        def resolve_contact(user_id, email):
-            normalized_email = (email or "").strip().lower()
-            phone = email_to_phone.get(normalized_email)
-            name = email_to_name.get(normalized_email)
-
-            if user_id:
-                phone = phone if phone and phone != "N/A" else id_to_phone.get(user_id, phone)
-                name = name or id_to_name.get(user_id)
-
-            # If still missing, fetch directly from Supabase and cache the result
-            cache_key = user_id or normalized_email
-            if cache_key and cache_key in contact_lookup_cache:
-                cached_name, cached_phone = contact_lookup_cache[cache_key]
-                if cached_name:
-                    name = cached_name
-                if cached_phone and cached_phone != "N/A":
-                    phone = cached_phone
-
-            if (not phone or phone == "N/A") and cache_key and cache_key not in contact_lookup_cache:
-                try:
-                    query = supabase.table("users").select("id, phone, name")
-                    if user_id:
-                        query = query.eq("id", user_id)
-                    else:
-                        query = query.eq("email", normalized_email)
-                    user_response = query.limit(1).execute()
-                    if user_response.data:
-                        fetched = user_response.data[0]
-                        fetched_phone = (fetched.get("phone") or "").strip()
-                        fetched_name = fetched.get("name") or "Unknown"
-                        normalized_phone = fetched_phone if fetched_phone else "N/A"
-
-                        email_to_phone[normalized_email] = normalized_phone
-                        email_to_name[normalized_email] = fetched_name
-
-                        fetched_id = fetched.get("id")
-                        if fetched_id:
-                            id_to_phone[fetched_id] = normalized_phone
-                            id_to_name[fetched_id] = fetched_name
-
-                        phone = normalized_phone
-                        name = fetched_name
-                        contact_lookup_cache[cache_key] = (name, phone)
-                except Exception as fetch_error:
-                    logger.warning(
-                        f" Could not resolve contact details for {normalized_email or user_id}: {fetch_error}"
-                    )
-
-            if not phone or not phone.strip():
-                phone = "N/A"
-            if not name:
-                name = "Unknown"
-
-            return name, phone
-
-        # Enrich predictions with patient contact details for quick reference
-        predictions = []
-        for record in predictions_raw:
-            email = record.get("user_email") or ""
-            user_id = record.get("user_id")
-            patient_name, patient_phone = resolve_contact(user_id, email)
-            enriched_record = {
-                **record,
-                "patient_name": patient_name,
-                "phone": patient_phone
-            }
-            predictions.append(enriched_record)
+        # Contact details for the rows in the response are fetched in one batched users query
+        contacts = ContactResolver(supabase, endpoint="/healthcare-dashboard")
 
-        # Calculating statistics
-        total_patients = len(set(p.get("user_email")
-                             for p in predictions if p.get("user_email")))
-        total_assessments = len(predictions)
-        high_risk_alerts = sum(
-            1 for p in predictions if p.get(
-                "predicted_risk",
-                "").lower().startswith("high"))
-        low_risk_count = sum(
-            1 for p in predictions if p.get(
-                "predicted_risk",
-                "").lower().startswith("low"))
-
-        # Calculating weekly activity (last 7 days)
-        from datetime import datetime, timedelta
-        today = datetime.utcnow()
-        weekly_data = {}
-        days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-
-        for i in range(7):
-            day_date = today - timedelta(days=6 - i)
-            day_name = days[i]
-            day_count = sum(
-                1 for p in predictions
-                if parse_datetime(p.get("created_at", "")) and
-                parse_datetime(p.get("created_at", "")).date() == day_date.date()
-            )
-            weekly_data[day_name] = day_count
+        # Weekly chart from the daily rollup table (shared across workers); None falls back to in-memory buckets
+        now = datetime.utcnow()
+        day_counts = get_prediction_rollups().daily_counts(now, days=7)
 
-        # Getting high-risk patients (most recent assessment per patient)
-        patient_latest = {}
-        for pred in predictions:
-            email = pred.get("user_email")
-            if email:
-                if email not in patient_latest or pred.get(
-                    "created_at",
-                    "") > patient_latest[email].get(
-                    "created_at",
-                        ""):
-                    patient_latest[email] = pred
-
-        high_risk_patients = []
-        for p in patient_latest.values():
-            if p.get("predicted_risk", "").lower().startswith("high"):
-                email = p.get("user_email", "")
-                user_id = p.get("user_id")
-                patient_name, patient_phone = resolve_contact(user_id, email)
-                p["phone"] = patient_phone
-                p["patient_name"] = patient_name
-                high_risk_patients.append(p)
-
-        # Getting recently improved patients (was high-risk, now low-risk)
-        from datetime import datetime, timedelta
-        recently_improved = []
-        seven_days_ago = (datetime.utcnow() - timedelta(days=7)).isoformat()
-
-        for email, latest_pred in patient_latest.items():
-            # Check if latest is low-risk
-            if latest_pred.get("predicted_risk", "").lower().startswith("low"):
-                # Get all assessments for this patient
-                patient_assessments = [p for p in predictions if p.get("user_email") == email]
-                # Sort by date
-                patient_assessments.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-                # Check if they had a high-risk assessment in the last 7 days
-                for i, assessment in enumerate(patient_assessments):
-                    if assessment.get("predicted_risk", "").lower().startswith("high"):
-                        created_at = assessment.get("created_at", "")
-                        if created_at > seven_days_ago:
-                    
-                            # Getting the improvement metrics
-                            prev_prob = assessment.get("probability", 0)
-                            curr_prob = latest_pred.get("probability", 0)
-                            improvement = ((prev_prob - curr_prob) / prev_prob * 100) if prev_prob > 0 else 0
-
-                            contact_name, contact_phone = resolve_contact(
-                                patient_latest[email].get("user_id"), email
-                            )
-
-                            recently_improved.append({
-                                "user_email": email,
-                                "patient_name": contact_name,
-                                "phone": contact_phone,
-                                "previous_risk": assessment.get("predicted_risk"),
-                                "previous_probability": prev_prob,
-                                "current_risk": latest_pred.get("predicted_risk"),
-                                "current_probability": curr_prob,
-                                "improvement_percent": round(improvement, 1),
-                                "high_risk_date": created_at,
-                                "latest_date": latest_pred.get("created_at"),
-                                "days_improved": (parse_datetime(latest_pred.get("created_at", "")) -
-                                                 parse_datetime(created_at)).days if parse_datetime(latest_pred.get("created_at", "")) and parse_datetime(created_at) else 0
-                            })
-                        break  # Only count the most recent high-risk assessment
-
-        # Sort recently improved by improvement percentage (highest first)
-        recently_improved.sort(key=lambda x: x.get("improvement_percent", 0), reverse=True)
-
-        # HEALTHCARE ENHANCEMENT: Get at-risk alerts (worsening trends)
-        at_risk_alerts = []
-
-        for email, latest_pred in patient_latest.items():
-            patient_assessments = [p for p in predictions if p.get("user_email") == email]
-            if len(patient_assessments) >= 2:
-                # Sort by date (most recent first)
-                patient_assessments.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-                latest = patient_assessments[0]
-                previous = patient_assessments[1]
-
-                latest_prob = latest.get("probability", 0)
-                prev_prob = previous.get("probability", 0)
-
-                # Check for worsening trend (probability increasing)
-                if latest_prob > prev_prob:
-                    worsening_percent = ((latest_prob - prev_prob) / prev_prob * 100) if prev_prob > 0 else 0
-
-                    # Flag if worsening significantly (>10% increase)
-                    if worsening_percent > 10:
-                        trend = "worsening"
-                    elif latest_prob > prev_prob:
-                        trend = "increasing"
-                    else:
-                        trend = "stable"
-
-                    contact_name, contact_phone = resolve_contact(latest.get("user_id"), email)
-
-                    at_risk_alerts.append({
-                        "user_email": email,
-                        "patient_name": contact_name,
-                        "phone": contact_phone,
-                        "current_risk": latest.get("predicted_risk"),
-                        "current_probability": latest_prob,
-                        "previous_probability": prev_prob,
-                        "trend": trend,
-                        "worsening_percent": round(worsening_percent, 1),
-                        "latest_date": latest.get("created_at"),
-                        "previous_date": previous.get("created_at")
-                    })
-
-        # Sort at-risk alerts by worsening percentage (highest first)
-        at_risk_alerts.sort(key=lambda x: x.get("worsening_percent", 0), reverse=True)
+        # Served from the incrementally maintained aggregates; contacts are resolved only for rows in the response
+        dashboard_data = get_dashboard_store().healthcare_dashboard(contacts, now=now, day_counts=day_counts)
+        contacts.finish()
 
         return {
             "status": "success",
-            "data": {
-                "statistics": {
-                    "total_patients": total_patients,
-                    "total_assessments": total_assessments,
-                    "high_risk_alerts": high_risk_alerts,
-                    "low_risk_count": low_risk_count,
-                    "consultation_requests": 0,
-                    "recently_improved_count": len(recently_improved),
-                    "at_risk_alerts_count": len(at_risk_alerts)
-                },
-                "weekly_activity": weekly_data,
-                "risk_distribution": {
-                    "high_risk": high_risk_alerts,
-                    "low_risk": low_risk_count
-                },
-                # Top 10 high-risk patients (CURRENT HIGH RISK)
-                "high_risk_patients": high_risk_patients[:10],
-                # Recently improved patients (FOLLOW-UP)
-                "recently_improved_patients": recently_improved[:10],
-                # At-risk alerts (WORSENING TRENDS)
-                "at_risk_alerts": at_risk_alerts[:10],
-                # All recent assessments
-                "all_assessments": predictions[:50]
-            }
+            "data": dashboard_data
         }
     except HTTPException:
         raise  
@@ -1467,7 +1487,11 @@ def get_healthcare_dashboard(user_email: str = Query(...)):
 
 # ADMIN DASHBOARD ENDPOINT
 @app.get("/admin-dashboard")
-def get_admin_dashboard(user_email: str = Query(...)):
+def get_admin_dashboard(
+        user_email: str = Query(...),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="all_users page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous all_users page"),
+        principal: Optional[Principal] = Depends(get_current_principal)):
     """
     Fetch comprehensive admin dashboard data.
     Only admins can access this endpoint
@@ -1475,64 +1499,50 @@ def get_admin_dashboard(user_email: str = Query(...)):
     """
     try:
         # Get current user and verify admin role
-        user_response = supabase.table("users").select(
-            "*").eq("email", user_email.lower()).execute()
-        if not user_response.data:
+        current_user = resolve_caller(user_email, principal, endpoint="/admin-dashboard", fresh=True)
+        if not current_user:
             raise HTTPException(status_code=401, detail="User not found")
 
-        current_user = user_response.data[0]
-
         # Check if user is admin
         require_admin(current_user)
 
         logger.info(f" Admin {user_email} accessed admin dashboard")
 
-        # Fetching all users
-        users_response = supabase.table("users").select("*").execute()
-        users = users_response.data or []
+        # Fetching all users, or one page of them when the caller paginates
+        paginated = is_paginated(limit, cursor)
+        users, next_cursor = paginate(USER_LISTING_ROW.query(supabase), limit, cursor)
+        if paginated:
+            # Role totals still cover every user; only the role column is read
+            role_rows = fetch_all_pages(lambda: USER_ROLE.query(supabase).order("id"))
+        else:
+            role_rows = users
+
+        # Monthly chart from the monthly rollup table when installed
+        now = datetime.utcnow()
+        month_counts = get_prediction_rollups().monthly_counts(now, months=6)
 
-        # Fetching all predictions
-        predictions_response = (
-            supabase.table("predictions")
-            .select("*")
+        # Grouped counts (per user, per month, distinct conversations) computed server-side
+        aggregates = fetch_admin_aggregates(supabase, months=6, month_counts=month_counts)
+        per_user = aggregates["per_user"]
+
+        # Only the 50 most recent assessments are displayed
+        recent_response = (
+            PREDICTION_DASHBOARD_ROW.query(supabase)
             .order("created_at", desc=True)
+            .limit(50)
             .execute()
         )
-        predictions = predictions_response.data or []
+        recent_assessments = recent_response.data or []
 
         # Calculating statistics
-        total_users = len(users)
-        pregnant_women = len(
-            [u for u in users if u.get("role") == "pregnant_woman"])
-        healthcare_providers = len(
-            [u for u in users if u.get("role") == "healthcare_provider"])
-        admins = len([u for u in users if u.get("role") == "admin"])
-
-        total_assessments = len(predictions)
-        high_risk_cases = len([p for p in predictions if p.get(
-            "predicted_risk", "").lower().startswith("high")])
-        low_risk_cases = len([p for p in predictions if p.get(
-            "predicted_risk", "").lower().startswith("low")])
-
-        # Chat sessions (count unique conversations)
-        chat_response = supabase.table("chat_history").select("*").execute()
-        chat_sessions = len(set(c.get("conversation_id") for c in (
-            chat_response.data or []) if c.get("conversation_id")))
-
-        # Calculating monthly trends (last 6 months)
-        from datetime import datetime, timedelta
-        today = datetime.utcnow()
-        monthly_data = {}
-
-        for i in range(6):
-            month_date = today - timedelta(days=30 * i)
-            month_key = month_date.strftime("%b")
-            month_count = sum(
-                1 for p in predictions
-                if parse_datetime(p.get("created_at", "")) and
-                parse_datetime(p.get("created_at", "")).month == month_date.month
-            )
-            monthly_data[month_key] = month_count
+        total_users = len(role_rows)
+        role_counts = Counter(u.get("role") for u in role_rows)
+        pregnant_women = role_counts["pregnant_woman"]
+        healthcare_providers = role_counts["healthcare_provider"]
+        admins = role_counts["admin"]
+
+        # Calculating monthly trends (last 6 calendar months)
+        monthly_data = monthly_trends(aggregates["month_counts"], now, months=6)
 
         # User distribution
         user_distribution = {
@@ -1544,12 +1554,7 @@ def get_admin_dashboard(user_email: str = Query(...)):
         # Getting all users with their stats
         all_users_with_stats = []
         for user in users:
-            user_email = user.get("email")
-            user_predictions = [
-                p for p in predictions if p.get("user_email") == user_email]
-            user_high_risk = len([p for p in user_predictions if p.get(
-                "predicted_risk", "").lower().startswith("high")])
-
+            user_stats = per_user.get(user.get("email"), {})
             all_users_with_stats.append({
                 "id": user.get("id"),
                 "name": user.get("name"),
@@ -1557,29 +1562,33 @@ def get_admin_dashboard(user_email: str = Query(...)):
                 "phone": user.get("phone", "N/A"),
                 "role": user.get("role"),
                 "created_at": user.get("created_at"),
-                "assessment_count": len(user_predictions),
-                "high_risk_count": user_high_risk,
-                "last_assessment": user_predictions[0].get("created_at") if user_predictions else None
+                "assessment_count": user_stats.get("assessment_count", 0),
+                "high_risk_count": user_stats.get("high_risk_count", 0),
+                "last_assessment": user_stats.get("last_assessment")
             })
 
+        data = {
+            "statistics": {
+                "total_users": total_users,
+                "pregnant_women": pregnant_women,
+                "healthcare_providers": healthcare_providers,
+                "admins": admins,
+                "total_assessments": aggregates["total_assessments"],
+                "high_risk_cases": aggregates["high_risk_cases"],
+                "low_risk_cases": aggregates["low_risk_cases"],
+                "chat_sessions": aggregates["chat_sessions"]
+            },
+            "user_distribution": user_distribution,
+            "monthly_trends": monthly_data,
+            "all_users": all_users_with_stats,
+            "recent_assessments": recent_assessments
+        }
+        if paginated:
+            data["next_cursor"] = next_cursor
+
         return {
             "status": "success",
-            "data": {
-                "statistics": {
-                    "total_users": total_users,
-                    "pregnant_women": pregnant_women,
-                    "healthcare_providers": healthcare_providers,
-                    "admins": admins,
-                    "total_assessments": total_assessments,
-                    "high_risk_cases": high_risk_cases,
-                    "low_risk_cases": low_risk_cases,
-                    "chat_sessions": chat_sessions
-                },
-                "user_distribution": user_distribution,
-                "monthly_trends": monthly_data,
-                "all_users": all_users_with_stats,
-                "recent_assessments": predictions[:50]
-            }
+            "data": data
         }
     except HTTPException:
         raise  
@@ -1599,8 +1608,7 @@ def delete_user(user_id: str):
     """
     try:
         # First, get the user to find their email
-        user_response = supabase.table("users").select(
-            "*").eq("id", user_id).execute()
+        user_response = USER_CONTACT.query(supabase).eq("id", user_id).execute()
         if not user_response.data:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -1623,10 +1631,13 @@ def delete_user(user_id: str):
         user_delete_response = supabase.table(
             "users").delete().eq("id", user_id).execute()
         logger.info(f"Delete user response: {user_delete_response}")
+        get_identity_cache().invalidate(user_id=user_id, email=user_email)
+        get_provider_directory().mark_providers_stale()
+        # The user's predictions are gone; reseed dashboard aggregates on next read
+        get_dashboard_store().invalidate()
 
         # Verify the user was actually deleted
-        verify_response = supabase.table("users").select(
-            "*").eq("id", user_id).execute()
+        verify_response = USER_KEY.query(supabase).eq("id", user_id).execute()
         if verify_response.data:
             logger.error(f"User {user_email} still exists after delete attempt!")
             raise HTTPException(
@@ -1661,6 +1672,7 @@ def update_user(
             update_data["name"] = name.strip()
         if role:
             update_data["role"] = role.strip().lower()
+            update_data.update(token_revocation())
 
         if not update_data:
             raise HTTPException(status_code=400, detail="No fields to update")
@@ -1673,6 +1685,8 @@ def update_user(
 
         updated_user = response.data[0]
         updated_user.pop("password", None)
+        get_identity_cache().invalidate(user_id=user_id, email=updated_user.get("email"))
+        get_provider_directory().mark_providers_stale()
 
         return {
             "status": "success",
@@ -1698,6 +1712,8 @@ def toggle_block_user(user_id: str,
     """
     try:
         update_data = {"is_blocked": blocked}
+        if blocked:
+            update_data.update(token_revocation())
 
         response = supabase.table("users").update(
             update_data).eq("id", user_id).execute()
@@ -1707,6 +1723,7 @@ def toggle_block_user(user_id: str,
 
         updated_user = response.data[0]
         updated_user.pop("password", None)
+        get_identity_cache().invalidate(user_id=user_id, email=updated_user.get("email"))
 
         status_msg = "blocked" if blocked else "unblocked"
         return {
@@ -1741,16 +1758,14 @@ def admin_create_user(user: UserRegister):
         }
 
         # Check if user already exists
-        existing = supabase.table("users").select(
-            "*").eq("email", user_data["email"]).execute()
+        existing = USER_KEY.query(supabase).eq("email", user_data["email"]).limit(1).execute()
         if existing.data:
             raise HTTPException(
                 status_code=400,
                 detail="User with this email already exists")
 
         # Prevent duplicate phone numbers so healthcare providers can reach patients reliably
-        phone_existing = supabase.table("users").select(
-            "*").eq("phone", phone).execute()
+        phone_existing = USER_KEY.query(supabase).eq("phone", phone).limit(1).execute()
         if phone_existing.data:
             raise HTTPException(
                 status_code=400,
@@ -1760,6 +1775,8 @@ def admin_create_user(user: UserRegister):
         response = supabase.table("users").insert(user_data).execute()
         if not response.data:
             raise HTTPException(status_code=400, detail="User creation failed")
+        get_identity_cache().invalidate(email=user_data["email"])
+        get_provider_directory().mark_providers_stale()
 
         created_user = response.data[0]
         created_user.pop("password", None)
@@ -1771,6 +1788,8 @@ def admin_create_user(user: UserRegister):
 
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Password hashing is busy, please try again shortly")
     except Exception as e:
         logger.error(f"Failed to create user: {e}")
         raise HTTPException(
@@ -1780,18 +1799,23 @@ def admin_create_user(user: UserRegister):
 
 # CHAT HISTORY ENDPOINT
 @app.get("/chat-history")
-def get_chat_history(user_id: str = Query(..., description="User ID")):
+async def get_chat_history(
+        user_id: str = Query(..., description="User ID"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="Page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page")):
     """Fetch chat history for a user."""
     try:
-        response = (
-            supabase.table("chat_history")
-            .select("*")
-            .eq("user_id", user_id)
-            .order("created_at", desc=True)
-            .limit(50)
-            .execute()
+        messages, next_cursor = await paginate_async(
+            CHAT_HISTORY_ROW.query(get_async_supabase())
+            .eq("user_id", user_id),
+            limit if limit is not None else DEFAULT_PAGE_LIMIT, cursor
         )
-        return {"status": "success", "data": response.data or []}
+        result = {"status": "success", "data": messages}
+        if is_paginated(limit, cursor):
+            result["next_cursor"] = next_cursor
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch chat history: {e}")
         return {"status": "error", "data": [], "message": str(e)}
@@ -1848,7 +1872,10 @@ def send_contact_message(contact: ContactMessage):
 # CONSULTATION REQUESTS ENDPOINTS
 
 @app.post("/consultation-request")
-def create_consultation_request(request: ConsultationRequest, user_email: str = Query(...)):
+async def create_consultation_request(
+        request: ConsultationRequest,
+        user_email: str = Query(...),
+        principal: Optional[Principal] = Depends(get_current_principal)):
     """
     Create a new consultation request from a pregnant woman to a healthcare provider.
     Only pregnant women can create consultation requests.
@@ -1856,21 +1883,32 @@ def create_consultation_request(request: ConsultationRequest, user_email: str =
     try:
         user_email = user_email.strip().lower()
 
+        # The caller, the provider and (for token callers) the caller's full identity are
+        # independent lookups, so they run concurrently. The name is needed for the request record
+        identity_cache = get_identity_cache()
+        lookups = [
+            resolve_caller_async(user_email, principal, endpoint="/consultation-request"),
+            identity_cache.get_by_email_async(request.healthcare_provider_email, endpoint="/consultation-request"),
+        ]
+        if principal:
+            lookups.append(identity_cache.get_by_id_async(principal.user_id, endpoint="/consultation-request"))
+        caller, provider, *identity = await asyncio.gather(*lookups)
+
         # Verify user exists and is a pregnant woman
-        user_response = supabase.table("users").select("*").eq("email", user_email).execute()
-        if not user_response.data:
+        if not caller:
             raise HTTPException(status_code=401, detail="User not found")
 
-        user = user_response.data[0]
-        if user.get("role") != "pregnant_woman":
+        if caller.get("role") != "pregnant_woman":
             raise HTTPException(status_code=403, detail="Only pregnant women can request consultations")
 
+        user = identity[0] if principal else caller
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+
         # Verify healthcare provider exists
-        provider_response = supabase.table("users").select("*").eq("email", request.healthcare_provider_email.lower()).execute()
-        if not provider_response.data:
+        if not provider:
             raise HTTPException(status_code=404, detail="Healthcare provider not found")
 
-        provider = provider_response.data[0]
         if provider.get("role") not in ["healthcare_provider", "admin"]:
             raise HTTPException(status_code=400, detail="Selected user is not a healthcare provider")
 
@@ -1889,10 +1927,11 @@ def create_consultation_request(request: ConsultationRequest, user_email: str =
             "created_at": datetime.utcnow().isoformat()
         }
 
-        result = supabase.table("consultation_requests").insert(consultation_data).execute()
+        result = await get_async_supabase().table("consultation_requests").insert(consultation_data).execute()
 
         if result.data:
             consultation = result.data[0]
+            get_provider_directory().record_consultation(consultation)
             logger.info(f"Consultation request created: {consultation.get('id')}")
             return {
                 "status": "success",
@@ -1910,7 +1949,11 @@ def create_consultation_request(request: ConsultationRequest, user_email: str =
 
 
 @app.get("/consultation-requests")
-def get_consultation_requests(user_email: str = Query(...)):
+async def get_consultation_requests(
+        user_email: str = Query(...),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="Page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        principal: Optional[Principal] = Depends(get_current_principal)):
     """
     Get all consultation requests for a user.
     - Pregnant women see requests they sent
@@ -1920,30 +1963,32 @@ def get_consultation_requests(user_email: str = Query(...)):
         user_email = user_email.strip().lower()
 
         # Verify user exists
-        user_response = supabase.table("users").select("*").eq("email", user_email).execute()
-        if not user_response.data:
+        user = await resolve_caller_async(user_email, principal, endpoint="/consultation-requests")
+        if not user:
             raise HTTPException(status_code=401, detail="User not found")
 
-        user = user_response.data[0]
         user_role = user.get("role")
 
         # Get appropriate consultation requests
         if user_role == "pregnant_woman":
             # Pregnant women see requests they sent
-            response = supabase.table("consultation_requests").select("*").eq("pregnant_woman_email", user_email).order("created_at", desc=True).execute()
+            query = CONSULTATION_ROW.query(get_async_supabase()).eq("pregnant_woman_email", user_email)
         elif user_role in ["healthcare_provider", "admin"]:
             # Healthcare providers see requests sent to them
-            response = supabase.table("consultation_requests").select("*").eq("healthcare_provider_email", user_email).order("created_at", desc=True).execute()
+            query = CONSULTATION_ROW.query(get_async_supabase()).eq("healthcare_provider_email", user_email)
         else:
             raise HTTPException(status_code=403, detail="Unauthorized")
 
-        consultations = response.data or []
+        consultations, next_cursor = await paginate_async(query, limit, cursor)
 
-        return {
+        result = {
             "status": "success",
             "data": consultations,
             "count": len(consultations)
         }
+        if is_paginated(limit, cursor):
+            result["next_cursor"] = next_cursor
+        return result
 
     except HTTPException:
         raise
@@ -1953,7 +1998,7 @@ def get_consultation_requests(user_email: str = Query(...)):
 
 
 @app.get("/consultation-request/{consultation_id}")
-def get_consultation_request(consultation_id: str, user_email: str = Query(...)):
+async def get_consultation_request(consultation_id: str, user_email: str = Query(...)):
     """
     Get a specific consultation request by ID.
     Only the pregnant woman or healthcare provider involved can view it.
@@ -1962,7 +2007,7 @@ def get_consultation_request(consultation_id: str, user_email: str = Query(...))
         user_email = user_email.strip().lower()
 
         # Fetch consultation
-        response = supabase.table("consultation_requests").select("*").eq("id", consultation_id).execute()
+        response = await CONSULTATION_ROW.query(get_async_supabase()).eq("id", consultation_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Consultation request not found")
 
@@ -1985,7 +2030,7 @@ def get_consultation_request(consultation_id: str, user_email: str = Query(...))
 
 
 @app.patch("/consultation-request/{consultation_id}")
-def update_consultation_request(consultation_id: str, response_data: ConsultationResponse, user_email: str = Query(...)):
+async def update_consultation_request(consultation_id: str, response_data: ConsultationResponse, user_email: str = Query(...)):
     """
     Update a consultation request status (accept, decline, or close).
     Only the healthcare provider can update the status.
@@ -1994,7 +2039,7 @@ def update_consultation_request(consultation_id: str, response_data: Consultatio
         user_email = user_email.strip().lower()
 
         # Fetch consultation
-        response = supabase.table("consultation_requests").select("*").eq("id", consultation_id).execute()
+        response = await CONSULTATION_ROW.query(get_async_supabase()).eq("id", consultation_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Consultation request not found")
 
@@ -2022,9 +2067,10 @@ def update_consultation_request(consultation_id: str, response_data: Consultatio
         if response_data.status == "closed":
             update_data["closed_at"] = datetime.utcnow().isoformat()
 
-        result = supabase.table("consultation_requests").update(update_data).eq("id", consultation_id).execute()
+        result = await get_async_supabase().table("consultation_requests").update(update_data).eq("id", consultation_id).execute()
 
         if result.data:
+            get_provider_directory().record_consultation(result.data[0])
             logger.info(f"Consultation request {consultation_id} updated to {response_data.status}")
             return {
                 "status": "success",
@@ -2042,7 +2088,9 @@ def update_consultation_request(consultation_id: str, response_data: Consultatio
 
 
 @app.get("/consultation-requests/stats/{user_email}")
-def get_consultation_stats(user_email: str):
+async def get_consultation_stats(
+        user_email: str,
+        principal: Optional[Principal] = Depends(get_current_principal)):
     """
     Get consultation statistics for a user.
     Returns counts of pending, accepted, declined, and closed consultations.
@@ -2051,18 +2099,17 @@ def get_consultation_stats(user_email: str):
         user_email = user_email.strip().lower()
 
         # Verify user exists
-        user_response = supabase.table("users").select("*").eq("email", user_email).execute()
-        if not user_response.data:
+        user = await resolve_caller_async(user_email, principal, endpoint="/consultation-requests/stats")
+        if not user:
             raise HTTPException(status_code=401, detail="User not found")
 
-        user = user_response.data[0]
         user_role = user.get("role")
 
         # Get consultations based on role
         if user_role == "pregnant_woman":
-            response = supabase.table("consultation_requests").select("*").eq("pregnant_woman_email", user_email).execute()
+            response = await CONSULTATION_STATUS.query(get_async_supabase()).eq("pregnant_woman_email", user_email).execute()
         elif user_role in ["healthcare_provider", "admin"]:
-            response = supabase.table("consultation_requests").select("*").eq("healthcare_provider_email", user_email).execute()
+            response = await CONSULTATION_STATUS.query(get_async_supabase()).eq("healthcare_provider_email", user_email).execute()
         else:
             raise HTTPException(status_code=403, detail="Unauthorized")
 
@@ -2090,14 +2137,14 @@ def get_consultation_stats(user_email: str):
 
 
 @app.get("/admin/consultation-stats")
-def get_admin_consultation_stats():
+async def get_admin_consultation_stats():
     """
     Get overall consultation statistics for admin dashboard.
     Returns system-wide counts of all consultation statuses.
     """
     try:
         # Get all consultations
-        response = supabase.table("consultation_requests").select("*").execute()
+        response = await CONSULTATION_STATUS.query(get_async_supabase()).execute()
         consultations = response.data or []
 
         # Calculate overall stats
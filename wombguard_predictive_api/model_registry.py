@@ -0,0 +1,398 @@
+"""
+WombGuard Model Registry
+Versioned risk model packages with background loading, atomic swaps and shadow scoring
+"""
+
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from risk_scoring import FEATURE_COLUMNS, HIGH_RISK_THRESHOLD, TOP_FEATURES, RiskScorer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wombguard_pregnancy_model.pkl")
+
+# Recent latencies kept per version for percentile metrics
+LATENCY_WINDOW = 1000
+
+# Shadow comparisons between summary log lines
+SHADOW_LOG_EVERY = 100
+
+# Synthetic rows (scaler mean +/- a few standard deviations) on which a compiled
+# forest must reproduce scikit-learn before it serves
+COMPILED_CHECK_ROWS = 512
+
+
+class ModelUnavailable(Exception):
+    """No risk model version has been loaded (yet)."""
+
+
+@dataclass
+class ModelVersion:
+    """One loaded model package. The scorer carries the model, scaler, feature_names and explainer."""
+    version: str
+    path: str
+    digest: str
+    scorer: RiskScorer
+    info: dict = field(default_factory=dict)
+    loaded_at: str = ""
+    load_seconds: float = 0.0
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "feature_names": self.scorer.feature_names,
+            "compiled": self.scorer.forest.describe() if self.scorer.forest is not None else None,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+            "model_info": self.info,
+        }
+
+
+def _fingerprint(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_version(path: str, compiled: bool = False) -> ModelVersion:
+    """
+    Load, check and warm a model package. The SHAP explainer is built and one
+    row scored here, so the first request after a swap pays no setup cost.
+    With `compiled`, the forest is also compiled and checked against
+    scikit-learn; it is dropped if the two disagree on any check row.
+    Raises ValueError for a package that cannot serve /predict.
+    """
+    started = time.perf_counter()
+    with open(path, "rb") as handle:
+        digest = hashlib.sha256(handle.read()).hexdigest()
+    package = joblib.load(path)
+
+    missing = [key for key in ("model", "scaler", "feature_names") if key not in package]
+    if missing:
+        raise ValueError(f"Model package {path} is missing {', '.join(missing)}")
+    unknown = [name for name in package["feature_names"] if name not in FEATURE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Model package {path} expects unsupported features: {', '.join(unknown)}")
+
+    scorer = RiskScorer(package["model"], package["scaler"], package["feature_names"], compiled=compiled)
+    # The scaler mean is a realistic patient in model units
+    mean = np.asarray(package["scaler"].mean_, dtype=float)
+    warmup = pd.DataFrame([mean], columns=scorer.feature_names)
+    if scorer.forest is not None:
+        spread = getattr(package["scaler"], "scale_", None)
+        spread = np.ones_like(mean) if spread is None else np.asarray(spread, dtype=float)
+        noise = np.random.default_rng(0).normal(scale=2.0, size=(COMPILED_CHECK_ROWS, len(mean)))
+        scorer.verify_compiled(pd.concat(
+            [warmup, pd.DataFrame(mean + noise * spread, columns=scorer.feature_names)], ignore_index=True))
+    scorer.score(warmup)
+
+    return ModelVersion(
+        version=f"{os.path.splitext(os.path.basename(path))[0]}@{digest[:12]}",
+        path=os.path.abspath(path),
+        digest=digest,
+        scorer=scorer,
+        info=dict(package.get("model_info") or {}),
+        loaded_at=datetime.utcnow().isoformat(),
+        load_seconds=time.perf_counter() - started,
+    )
+
+
+class ModelRegistry:
+    """
+    Holds the active risk model version and an optional shadow candidate.
+
+    Requests read `active` once and score with that version to the end, so a
+    swap never changes a model mid-request and nothing is dropped: the new
+    version is fully loaded and warmed in a background thread before a single
+    reference assignment makes it active. A failed load leaves the current
+    version serving.
+
+    The watcher reloads the active path when the file changes (write the new
+    package to a temporary name and rename it over the old one). A shadow
+    version scores a sample of live traffic on its own thread after the
+    response is computed; its latency and probability deltas against the
+    active version are tracked per version and logged periodically.
+    """
+
+    def __init__(
+            self,
+            path: str = DEFAULT_MODEL_PATH,
+            watch_seconds: float = 30.0,
+            shadow_path: str = None,
+            shadow_sample_rate: float = 1.0,
+            shadow_max_pending: int = 64,
+            compiled: bool = True):
+        self.path = path
+        self.compiled = compiled
+        self.watch_seconds = watch_seconds
+        self.shadow_path = shadow_path
+        self.shadow_sample_rate = min(max(shadow_sample_rate, 0.0), 1.0)
+        self.shadow_max_pending = max(1, shadow_max_pending)
+
+        self.active = None
+        self.shadow = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._loading = set()
+        self._stopping = threading.Event()
+        self._watcher = None
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-shadow")
+        self._shadow_pending = 0
+        self._latencies = {}
+        self._versions = {}
+        self._metrics = {
+            "loads": 0,
+            "load_failures": 0,
+            "swaps": 0,
+            "shadow_dropped": 0,
+            "last_error": None,
+        }
+
+    # LOADING AND SWAPPING
+
+    def _load(self, path: str):
+        try:
+            version = load_version(path, compiled=self.compiled)
+        except Exception as e:
+            logger.error(f" Could not load model package {path}: {e}")
+            with self._lock:
+                self._metrics["load_failures"] += 1
+                self._metrics["last_error"] = f"{path}: {e}"
+            return None
+        with self._lock:
+            self._metrics["loads"] += 1
+        logger.info(f"Loaded model {version.version} in {version.load_seconds:.2f}s")
+        return version
+
+    def activate(self, path: str = None) -> ModelVersion:
+        """Load `path` (default: the watched path) and make it the active version. Returns None on failure."""
+        path = path or self.path
+        fingerprint = _fingerprint(path) if os.path.exists(path) else None
+        version = self._load(path)
+        if version is None:
+            return None
+        with self._lock:
+            previous, self.active = self.active, version
+            if path == self.path:
+                self._fingerprint = fingerprint
+            if previous is not None:
+                self._metrics["swaps"] += 1
+            if self.shadow is not None and self.shadow.digest == version.digest:
+                # The candidate has been promoted; comparing it with itself tells nothing
+                self.shadow = None
+        if previous is not None and previous.version != version.version:
+            logger.info(f"Active model swapped: {previous.version} -> {version.version}")
+        return version
+
+    def set_shadow(self, path: str = None) -> ModelVersion:
+        """Load `path` as the shadow candidate; None clears the shadow. Returns None on failure."""
+        if not path:
+            with self._lock:
+                self.shadow = None
+            return None
+        version = self._load(path)
+        if version is not None:
+            with self._lock:
+                active = self.active
+                if active is not None and active.digest == version.digest:
+                    logger.info(f"{version.version} is the active model; not shadowing it")
+                    return None
+                self.shadow = version
+            logger.info(f"Shadow scoring live traffic with {version.version}")
+        return version
+
+    def load_in_background(self, path: str = None, shadow: bool = False) -> bool:
+        """Start activate() or set_shadow() on a thread. False if that load is already running."""
+        key = ("shadow" if shadow else "active", path or self.path)
+        with self._lock:
+            if key in self._loading:
+                return False
+            self._loading.add(key)
+
+        def run():
+            try:
+                (self.set_shadow if shadow else self.activate)(path)
+            finally:
+                with self._lock:
+                    self._loading.discard(key)
+
+        threading.Thread(target=run, name="model-load", daemon=True).start()
+        return True
+
+    def current(self) -> ModelVersion:
+        version = self.active
+        if version is None:
+            raise ModelUnavailable("Risk model is not loaded")
+        return version
+
+    # SCORING
+
+    def _observe(self, version: str, rows: int, latency_ms: float):
+        with self._lock:
+            self._latencies.setdefault(version, deque(maxlen=LATENCY_WINDOW)).append(latency_ms)
+            counts = self._versions.setdefault(version, {"requests": 0, "rows": 0})
+            counts["requests"] += 1
+            counts["rows"] += rows
+
+    def score(self, features: pd.DataFrame, explain: str = "full", top_k: int = TOP_FEATURES) -> tuple:
+        """
+        (version id, per-row results) from the active version; see RiskScorer.score.
+        Raises ModelUnavailable when no version is loaded.
+        """
+        version, results = self.score_with_version(features, explain=explain, top_k=top_k)
+        return version.version, results
+
+    def score_with_version(self, features: pd.DataFrame, explain: str = "full", top_k: int = TOP_FEATURES) -> tuple:
+        """As score(), but returns the ModelVersion itself, for work that must finish on the same model."""
+        version = self.current()
+        started = time.perf_counter()
+        results = version.scorer.score(features, explain=explain, top_k=top_k)
+        self._observe(version.version, len(features), (time.perf_counter() - started) * 1000)
+
+        shadow = self.shadow
+        if shadow is not None and results and random.random() < self.shadow_sample_rate:
+            self._submit_shadow(shadow, version.version, features, [r["probability"] for r in results])
+        return version, results
+
+    def _submit_shadow(self, shadow: ModelVersion, active_version: str, features: pd.DataFrame, probabilities: list):
+        with self._lock:
+            if self._shadow_pending >= self.shadow_max_pending:
+                self._metrics["shadow_dropped"] += 1
+                return
+            self._shadow_pending += 1
+        try:
+            self._shadow_executor.submit(self._run_shadow, shadow, active_version, features.copy(), probabilities)
+        except RuntimeError:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    def _run_shadow(self, shadow: ModelVersion, active_version: str, features: pd.DataFrame, probabilities: list):
+        try:
+            started = time.perf_counter()
+            candidate, _ = shadow.scorer.predict(features, explain="none")
+            latency_ms = (time.perf_counter() - started) * 1000
+            self._observe(shadow.version, len(features), latency_ms)
+
+            active = np.asarray(probabilities)
+            deltas = np.abs(candidate - active)
+            flips = int(((candidate >= HIGH_RISK_THRESHOLD) != (active >= HIGH_RISK_THRESHOLD)).sum())
+            with self._lock:
+                comparison = self._versions[shadow.version].setdefault("shadow", {
+                    "against": active_version, "rows": 0, "delta_sum": 0.0, "max_delta": 0.0, "label_flips": 0})
+                comparison["against"] = active_version
+                comparison["rows"] += len(deltas)
+                comparison["delta_sum"] += float(deltas.sum())
+                comparison["max_delta"] = max(comparison["max_delta"], float(deltas.max()))
+                comparison["label_flips"] += flips
+                requests = self._versions[shadow.version]["requests"]
+                summary = dict(comparison)
+            if flips:
+                logger.info(f"Shadow {shadow.version} disagrees with {active_version} on {flips} of {len(deltas)} rows")
+            if requests % SHADOW_LOG_EVERY == 0:
+                logger.info(
+                    f"Shadow {shadow.version} vs {active_version}: {summary['rows']} rows, "
+                    f"mean |delta| {summary['delta_sum'] / summary['rows']:.4f}, "
+                    f"max {summary['max_delta']:.4f}, {summary['label_flips']} label flips")
+        except Exception as e:
+            logger.warning(f" Shadow scoring with {shadow.version} failed: {e}")
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    # WATCHER
+
+    def start(self):
+        """Load the configured versions (without raising) and start watching the active path."""
+        if self.active is None:
+            self.activate()
+        if self.shadow_path and self.shadow is None:
+            self.set_shadow(self.shadow_path)
+        if self.watch_seconds <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stopping.clear()
+        self._watcher = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+        self._shadow_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while not self._stopping.wait(self.watch_seconds):
+            try:
+                if not os.path.exists(self.path):
+                    continue
+                fingerprint = _fingerprint(self.path)
+                if fingerprint != self._fingerprint or self.active is None:
+                    logger.info(f"Model package {self.path} changed, reloading")
+                    if self.activate(self.path) is None:
+                        # Do not retry a broken file until it changes again
+                        self._fingerprint = fingerprint
+            except Exception as e:
+                logger.error(f"Model watcher error: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = {version: sorted(values) for version, values in self._latencies.items()}
+            versions = {version: dict(counts) for version, counts in self._versions.items()}
+            metrics = dict(self._metrics)
+            loading = sorted(f"{role}:{path}" for role, path in self._loading)
+            active, shadow = self.active, self.shadow
+
+        def percentile(values, q):
+            return round(values[min(len(values) - 1, int(len(values) * q))], 2) if values else None
+
+        for version, counts in versions.items():
+            counts["p50_ms"] = percentile(latencies.get(version), 0.5)
+            counts["p95_ms"] = percentile(latencies.get(version), 0.95)
+            comparison = counts.get("shadow")
+            if comparison:
+                counts["shadow"] = {
+                    "against": comparison["against"],
+                    "rows": comparison["rows"],
+                    "mean_abs_delta": round(comparison["delta_sum"] / comparison["rows"], 5),
+                    "max_delta": round(comparison["max_delta"], 5),
+                    "label_flips": comparison["label_flips"],
+                }
+        return {
+            "active": active.describe() if active else None,
+            "shadow": shadow.describe() if shadow else None,
+            "shadow_sample_rate": self.shadow_sample_rate,
+            "shadow_pending": self._shadow_pending,
+            "loading": loading,
+            "versions": versions,
+            **metrics,
+        }
+
+
+# Global model registry instance
+_model_registry = None
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get or create the model registry"""
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = ModelRegistry(
+            path=os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH),
+            watch_seconds=float(os.getenv("MODEL_WATCH_SECONDS", 30)),
+            shadow_path=os.getenv("MODEL_SHADOW_PATH") or None,
+            shadow_sample_rate=float(os.getenv("MODEL_SHADOW_SAMPLE_RATE", 1.0)),
+            compiled=os.getenv("MODEL_COMPILED", "true").strip().lower() != "false",
+        )
+    return _model_registry
@@ -0,0 +1,83 @@
+"""
+WombGuard Pagination
+Keyset (created_at, id) cursor pagination for list endpoints
+"""
+
+import json
+import base64
+import binascii
+from typing import Optional
+
+from fastapi import HTTPException
+
+from repository import quote_filter_value
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor pointing just past this row in (created_at DESC, id DESC) order."""
+    payload = json.dumps([row.get("created_at"), str(row.get("id"))], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Return (created_at, id) from a cursor, or raise a 400 for anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(created_at, str) or not isinstance(row_id, str):
+            raise ValueError("cursor fields must be strings")
+        return created_at, row_id
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _keyset_query(query, limit: Optional[int], cursor: Optional[str]) -> tuple:
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.or_(
+            f"created_at.lt.{quote_filter_value(created_at)},"
+            f"and(created_at.eq.{quote_filter_value(created_at)},id.lt.{quote_filter_value(row_id)})"
+        )
+    if cursor and limit is None:
+        limit = DEFAULT_PAGE_LIMIT
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        query = query.limit(limit + 1)
+    return query, limit
+
+
+def _page(rows: list, limit: Optional[int]) -> tuple:
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+def paginate(query, limit: Optional[int] = None, cursor: Optional[str] = None) -> tuple:
+    """
+    Run a filtered select newest first with a (created_at, id) keyset.
+
+    Returns (rows, next_cursor). Without limit and cursor the full result is
+    returned and next_cursor is None, matching the unpaginated behaviour.
+    Rows after the cursor are selected with
+    created_at < c OR (created_at = c AND id < i), which the
+    (created_at DESC, id DESC) indexes serve without an offset scan.
+    """
+    query, limit = _keyset_query(query, limit, cursor)
+    return _page(query.execute().data or [], limit)
+
+
+async def paginate_async(query, limit: Optional[int] = None, cursor: Optional[str] = None) -> tuple:
+    """paginate() for queries built on the async Supabase client."""
+    query, limit = _keyset_query(query, limit, cursor)
+    response = await query.execute()
+    return _page(response.data or [], limit)
+
+
+def is_paginated(limit: Optional[int], cursor: Optional[str]) -> bool:
+    """Callers that pass neither parameter keep the original response shape."""
+    return limit is not None or bool(cursor)
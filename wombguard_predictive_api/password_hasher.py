@@ -0,0 +1,213 @@
+"""
+WombGuard Password Hasher
+bcrypt hashing and verification on a dedicated, bounded process pool
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# bcrypt only uses the first 72 bytes of a password
+BCRYPT_MAX_BYTES = 72
+
+# Recent latencies kept per operation for percentile metrics
+LATENCY_WINDOW = 1000
+
+# CryptContext of the current process; worker processes build their own in _init_worker
+_context = None
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hash or verify operations are already queued."""
+
+
+def build_context(rounds: int) -> CryptContext:
+    """bcrypt context hashing at `rounds`; hashes made with fewer rounds are reported as needing an update."""
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+    )
+
+
+def _truncate(password: str) -> str:
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES].decode("utf-8", errors="ignore")
+
+
+def _init_worker(rounds: int):
+    global _context
+    _context = build_context(rounds)
+
+
+def _hash(password: str) -> str:
+    return _context.hash(_truncate(password))
+
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple:
+    """(matches, replacement hash or None). Malformed stored hashes count as a mismatch."""
+    try:
+        return _context.verify_and_update(_truncate(password), hashed_password)
+    except (ValueError, TypeError):
+        return False, None
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in worker processes so password checks neither occupy the
+    request thread pool nor hold the GIL for hundreds of milliseconds.
+
+    At most `workers` operations run at once, and at most `max_pending` may be
+    queued or running; beyond that PasswordHasherBusy is raised so a burst of
+    logins is shed instead of queueing unbounded work. workers=0 runs bcrypt
+    inline in the calling thread (scripts and local debugging).
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 2, max_pending: int = 64):
+        self.rounds = rounds
+        self.workers = max(0, workers)
+        self.max_pending = max(1, max_pending)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._latencies = {"hash": deque(maxlen=LATENCY_WINDOW), "verify": deque(maxlen=LATENCY_WINDOW)}
+        self._metrics = {
+            "hash": 0,
+            "verify": 0,
+            "verify_failures": 0,
+            "rehashes": 0,
+            "rejected": 0,
+            "pending": 0,
+        }
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn, not fork: the API process runs background threads that must not be copied mid-lock
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.rounds,),
+                    )
+        return self._executor
+
+    def _observe(self, operation: str, started: float, future: Future):
+        with self._lock:
+            self._metrics["pending"] -= 1
+            self._metrics[operation] += 1
+            self._latencies[operation].append((time.perf_counter() - started) * 1000)
+            if operation == "verify" and not future.cancelled() and future.exception() is None:
+                matches, new_hash = future.result()
+                if not matches:
+                    self._metrics["verify_failures"] += 1
+                if new_hash:
+                    self._metrics["rehashes"] += 1
+        self._slots.release()
+
+    def _submit(self, operation: str, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._metrics["rejected"] += 1
+            raise PasswordHasherBusy(f"{self.max_pending} password operations already pending")
+        with self._lock:
+            self._metrics["pending"] += 1
+        started = time.perf_counter()
+
+        if self.workers == 0:
+            future = Future()
+            try:
+                if _context is None:
+                    _init_worker(self.rounds)
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                future = self.executor.submit(fn, *args)
+            except Exception:
+                with self._lock:
+                    self._metrics["pending"] -= 1
+                self._slots.release()
+                raise
+        future.add_done_callback(lambda done: self._observe(operation, started, done))
+        return future
+
+    # SYNC API (for sync endpoints; blocks the calling thread but not the GIL)
+
+    def hash(self, password: str) -> str:
+        if not password:
+            raise ValueError("Password cannot be empty")
+        return self._submit("hash", _hash, password).result()
+
+    def verify_and_update(self, password: str, hashed_password: str) -> tuple:
+        """(matches, new_hash). new_hash is set when the stored hash uses outdated parameters."""
+        if not password or not hashed_password:
+            return False, None
+        return self._submit("verify", _verify_and_update, password, hashed_password).result()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self.verify_and_update(password, hashed_password)[0]
+
+    # ASYNC API (for async endpoints; the event loop keeps serving while bcrypt runs)
+
+    async def hash_async(self, password: str) -> str:
+        if not password:
+            raise ValueError("Password cannot be empty")
+        return await asyncio.wrap_future(self._submit("hash", _hash, password))
+
+    async def verify_and_update_async(self, password: str, hashed_password: str) -> tuple:
+        if not password or not hashed_password:
+            return False, None
+        return await asyncio.wrap_future(self._submit("verify", _verify_and_update, password, hashed_password))
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = {op: sorted(values) for op, values in self._latencies.items()}
+            metrics = dict(self._metrics)
+
+        def percentile(values, q):
+            return round(values[min(len(values) - 1, int(len(values) * q))], 1) if values else None
+
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            **metrics,
+            **{f"{op}_p50_ms": percentile(values, 0.5) for op, values in latencies.items()},
+            **{f"{op}_p95_ms": percentile(values, 0.95) for op, values in latencies.items()},
+        }
+
+
+# Global password hasher instance
+_password_hasher = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Get or create the password hasher"""
+    global _password_hasher
+    if _password_hasher is None:
+        _password_hasher = PasswordHasher(
+            rounds=int(os.getenv("BCRYPT_ROUNDS", 12)),
+            workers=int(os.getenv("PASSWORD_HASH_WORKERS", min(os.cpu_count() or 1, 4))),
+            max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64)),
+        )
+    return _password_hasher
@@ -0,0 +1,294 @@
+"""
+WombGuard Postgres Backend
+Optional direct, pooled Postgres access for read-heavy dashboard and aggregation queries
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+try:
+    import psycopg2
+    import psycopg2.extras
+    from psycopg2 import sql
+    from psycopg2.pool import ThreadedConnectionPool
+except ImportError:  # psycopg2-binary is optional; the Supabase client remains the default path
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within the acquire timeout."""
+
+
+def _json_value(value):
+    """Match PostgREST's JSON rendering so rows are interchangeable with Supabase responses."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        text = value.isoformat()
+        if value.microsecond:
+            # Postgres drops trailing zeros from fractional seconds
+            head, _, tail = text.partition(".")
+            digits = tail[:6].rstrip("0")
+            text = f"{head}.{digits}{tail[6:]}"
+        return text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+class PostgresBackend:
+    """
+    Read-only data access over a bounded psycopg2 connection pool.
+
+    Queries go straight to the Supabase Postgres database instead of through
+    PostgREST over HTTPS, and aggregations run as server-side SQL so only
+    grouped rows come back. At most max_connections queries run at once;
+    further callers wait up to acquire_timeout_seconds for a free connection
+    rather than opening new ones. Rows are returned as plain dicts shaped like
+    PostgREST output, so callers can switch backends without other changes.
+    """
+
+    def __init__(
+            self,
+            dsn: str,
+            min_connections: int = 1,
+            max_connections: int = 10,
+            acquire_timeout_seconds: float = 5.0,
+            statement_timeout_ms: int = 15000):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is not installed; install psycopg2-binary to use DATA_BACKEND=postgres")
+        self.dsn = dsn
+        self.min_connections = max(0, min_connections)
+        self.max_connections = max(1, max_connections)
+        self.acquire_timeout_seconds = acquire_timeout_seconds
+        self.statement_timeout_ms = statement_timeout_ms
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._lock = threading.Lock()
+        self._metrics = {
+            "queries": 0,
+            "rows": 0,
+            "errors": 0,
+            "in_use": 0,
+            "acquire_waits": 0,
+            "acquire_timeouts": 0,
+            "total_wait_ms": 0.0,
+            "total_query_ms": 0.0,
+        }
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(
+                        self.min_connections,
+                        self.max_connections,
+                        self.dsn,
+                        options=f"-c statement_timeout={int(self.statement_timeout_ms)} -c timezone=UTC",
+                        application_name="wombguard-api",
+                    )
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Borrow a read-only autocommit connection, waiting for a free slot if the pool is busy."""
+        started = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._metrics["acquire_waits"] += 1
+            if not self._slots.acquire(timeout=self.acquire_timeout_seconds):
+                with self._lock:
+                    self._metrics["acquire_timeouts"] += 1
+                raise PoolTimeout(f"No Postgres connection free after {self.acquire_timeout_seconds}s")
+
+        conn = None
+        broken = False
+        try:
+            conn = self.pool.getconn()
+            if conn.autocommit is False:
+                conn.set_session(readonly=True, autocommit=True)
+            with self._lock:
+                self._metrics["in_use"] += 1
+                self._metrics["total_wait_ms"] += (time.perf_counter() - started) * 1000
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._metrics["in_use"] -= 1
+                self.pool.putconn(conn, close=broken or conn.closed != 0)
+            self._slots.release()
+
+    def fetch_all(self, query, params=None) -> list:
+        """Run a SELECT and return JSON-ready dict rows."""
+        started = time.perf_counter()
+        try:
+            with self.connection() as conn:
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                    # Always pass params so literal %% in SQL text is handled the same way
+                    cursor.execute(query, params if params is not None else ())
+                    rows = [{key: _json_value(value) for key, value in row.items()} for row in cursor.fetchall()]
+        except Exception:
+            with self._lock:
+                self._metrics["errors"] += 1
+            raise
+        with self._lock:
+            self._metrics["queries"] += 1
+            self._metrics["rows"] += len(rows)
+            self._metrics["total_query_ms"] += (time.perf_counter() - started) * 1000
+        return rows
+
+    def fetch_projection(self, projection, filters: dict = None, order_by: tuple = ()) -> list:
+        """SELECT a repository projection with equality filters, e.g. filters={"role": "healthcare_provider"}."""
+        filters = filters or {}
+        query = sql.SQL("SELECT {columns} FROM {table}").format(
+            columns=sql.SQL(", ").join(sql.Identifier(field) for field in projection.fields),
+            table=sql.Identifier(projection.table),
+        )
+        if filters:
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(
+                sql.SQL("{} = %s").format(sql.Identifier(column)) for column in filters)
+        if order_by:
+            query += sql.SQL(" ORDER BY ") + sql.SQL(", ").join(sql.Identifier(column) for column in order_by)
+        return self.fetch_all(query, tuple(filters.values()))
+
+    def users_by_ids_or_emails(self, projection, ids: list, emails: list) -> list:
+        return self.fetch_all(
+            sql.SQL("SELECT {columns} FROM users WHERE id::text = ANY(%s) OR email = ANY(%s)").format(
+                columns=sql.SQL(", ").join(sql.Identifier(field) for field in projection.fields)),
+            (list(ids), list(emails)),
+        )
+
+    def admin_aggregates(self, months: int, since: date) -> dict:
+        """Totals, per-user stats, calendar-month counts and chat sessions, grouped in Postgres."""
+        totals = self.fetch_all(
+            """
+            SELECT
+              COUNT(*) AS total_assessments,
+              COUNT(*) FILTER (WHERE LOWER(predicted_risk) LIKE 'high%%') AS high_risk_cases,
+              COUNT(*) FILTER (WHERE LOWER(predicted_risk) LIKE 'low%%') AS low_risk_cases
+            FROM predictions
+            """
+        )[0]
+        per_user_rows = self.fetch_all(
+            """
+            SELECT
+              user_email,
+              COUNT(*) AS assessment_count,
+              COUNT(*) FILTER (WHERE LOWER(predicted_risk) LIKE 'high%%') AS high_risk_count,
+              MAX(created_at) AS last_assessment
+            FROM predictions
+            WHERE user_email IS NOT NULL
+            GROUP BY user_email
+            """
+        )
+        month_rows = self.fetch_all(
+            """
+            SELECT DATE_TRUNC('month', created_at AT TIME ZONE 'UTC')::DATE AS month_start, COUNT(*) AS assessment_count
+            FROM predictions
+            WHERE created_at >= %s::DATE AT TIME ZONE 'UTC'
+            GROUP BY 1
+            """,
+            (since,),
+        )
+        chat_sessions = self.fetch_all(
+            """
+            SELECT COUNT(DISTINCT conversation_id) AS sessions
+            FROM chat_history
+            WHERE conversation_id IS NOT NULL AND conversation_id <> ''
+            """
+        )[0]["sessions"]
+
+        return {
+            "total_assessments": totals["total_assessments"],
+            "high_risk_cases": totals["high_risk_cases"],
+            "low_risk_cases": totals["low_risk_cases"],
+            "per_user": {
+                row["user_email"]: {
+                    "assessment_count": row["assessment_count"],
+                    "high_risk_count": row["high_risk_count"],
+                    "last_assessment": row["last_assessment"],
+                }
+                for row in per_user_rows
+            },
+            "month_counts": {
+                datetime.fromisoformat(row["month_start"]).date(): row["assessment_count"]
+                for row in month_rows
+            },
+            "chat_sessions": int(chat_sessions or 0),
+        }
+
+    def rollup_counts(self, table: str, bucket_column: str, since: date) -> list:
+        """Summed rollup rows per bucket since a date (bucket, assessment_count)."""
+        return self.fetch_all(
+            sql.SQL(
+                "SELECT {bucket}, SUM(assessment_count) AS assessment_count FROM {table} "
+                "WHERE {bucket} >= %s GROUP BY {bucket}"
+            ).format(bucket=sql.Identifier(bucket_column), table=sql.Identifier(table)),
+            (since,),
+        )
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        queries = metrics["queries"] or 1
+        return {
+            "max_connections": self.max_connections,
+            "avg_query_ms": round(metrics["total_query_ms"] / queries, 2),
+            **{k: round(v, 2) if isinstance(v, float) else v for k, v in metrics.items()},
+        }
+
+
+# Global Postgres backend instance
+_pg_backend = None
+_pg_backend_checked = False
+
+
+def get_pg_backend():
+    """
+    Get the pooled Postgres backend when DATA_BACKEND=postgres and DATABASE_URL are set.
+    Returns None otherwise, and callers use the Supabase client.
+    """
+    global _pg_backend, _pg_backend_checked
+    if _pg_backend_checked:
+        return _pg_backend
+    _pg_backend_checked = True
+
+    if os.getenv("DATA_BACKEND", "supabase").strip().lower() != "postgres":
+        return None
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        logger.warning(" DATA_BACKEND=postgres but DATABASE_URL is not set; using the Supabase client")
+        return None
+    if psycopg2 is None:
+        logger.warning(" DATA_BACKEND=postgres but psycopg2 is not installed; using the Supabase client")
+        return None
+
+    _pg_backend = PostgresBackend(
+        dsn,
+        min_connections=int(os.getenv("PG_POOL_MIN", 1)),
+        max_connections=int(os.getenv("PG_POOL_MAX", 10)),
+        acquire_timeout_seconds=float(os.getenv("PG_POOL_TIMEOUT_SECONDS", 5)),
+        statement_timeout_ms=int(os.getenv("PG_STATEMENT_TIMEOUT_MS", 15000)),
+    )
+    logger.info(f"Using pooled Postgres backend for dashboard reads (max {_pg_backend.max_connections} connections)")
+    return _pg_backend
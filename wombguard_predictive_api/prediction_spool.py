@@ -0,0 +1,440 @@
+"""
+WombGuard Prediction Spool
+Durable local journal for prediction rows, drained asynchronously to Supabase in batches
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from postgrest.types import ReturnMethod
+
+from write_behind import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_PATH = os.path.join(os.path.dirname(__file__), "spool", "predictions.db")
+
+# Postgres error classes a retry cannot fix: data exceptions, constraint violations, bad columns
+PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+
+def _is_permanent(error: Exception) -> bool:
+    """
+    PostgREST errors the same row will always get again. Network failures,
+    5xx replies and permission errors (42501, fixed by a policy change) are retried.
+    """
+    code = str(getattr(error, "code", "") or "")
+    if code == "42501":
+        return False
+    # PGRST1xx: malformed request, PGRST2xx: unknown table or column
+    return code[:2] in PERMANENT_SQLSTATE_CLASSES or code.startswith(("PGRST1", "PGRST2"))
+
+
+class PredictionSpool:
+    """
+    Append-only SQLite journal in front of the Supabase predictions table.
+
+    append() commits the row to local disk and returns immediately. A
+    background worker drains pending rows oldest-first as batched upserts
+    keyed on the row's client-generated id, so a batch that is replayed
+    after a crash or a timed-out request never creates duplicates. Rows
+    are deleted from the journal only once Supabase has acknowledged them,
+    and anything still pending is replayed when the process restarts.
+    A row Supabase rejects permanently (a constraint or type error), or
+    that still fails after max_attempts, is moved to the dead_letter table
+    of the same file; retry_dead_letters() puts such rows back in the queue.
+
+    amend() journals a later update of some columns of an appended row
+    (deferred explanations). It is applied only once the row itself has
+    been delivered, and is a no-op for a row deleted in the meantime.
+    """
+
+    def __init__(
+            self,
+            path: str = DEFAULT_SPOOL_PATH,
+            table: str = "predictions",
+            batch_size: int = 100,
+            drain_interval_ms: int = 1000,
+            backoff_base_seconds: float = 1.0,
+            backoff_max_seconds: float = 300.0,
+            max_attempts: int = 50,
+            client=None):
+        self.path = path
+        self.table = table
+        self.batch_size = max(1, batch_size)
+        self.drain_interval = max(drain_interval_ms, 1) / 1000.0
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._client = client
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+        self._conn = self._open()
+
+        self._metrics = {
+            "appended": 0,
+            "duplicates_ignored": 0,
+            "amended": 0,
+            "drained": 0,
+            "batches": 0,
+            "failed_attempts": 0,
+            "dead_lettered": 0,
+            "last_drain_at": None,
+            "last_error": None,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase_client import supabase
+            self._client = supabase
+        return self._client
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spool (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT UNIQUE NOT NULL,
+                op TEXT NOT NULL DEFAULT 'insert',
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+            """
+        )
+        if "op" not in {column[1] for column in conn.execute("PRAGMA table_info(spool)")}:
+            # Journals written before amendments existed hold only inserts
+            conn.execute("ALTER TABLE spool ADD COLUMN op TEXT NOT NULL DEFAULT 'insert'")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_spool_next_attempt ON spool(next_attempt_at, seq)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                seq INTEGER PRIMARY KEY,
+                idempotency_key TEXT UNIQUE NOT NULL,
+                op TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                failed_at REAL NOT NULL,
+                last_error TEXT
+            )
+            """
+        )
+        return conn
+
+    def append(self, row: dict) -> bool:
+        """
+        Durably journal a prediction row. The row's "id" is its idempotency key.
+        Returns False if a row with the same key is already pending.
+        """
+        key = row.get("id")
+        if not key:
+            raise ValueError("Prediction rows must carry an 'id' to be spooled")
+
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO spool (idempotency_key, payload, enqueued_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?)",
+                (str(key), json.dumps(row, default=str), now, now),
+            )
+            inserted = cursor.rowcount == 1
+            if inserted:
+                self._metrics["appended"] += 1
+            else:
+                self._metrics["duplicates_ignored"] += 1
+        self._wakeup.set()
+        return inserted
+
+    def append_many(self, rows: list) -> int:
+        """
+        Journal a batch of prediction rows in one transaction (one fsync instead
+        of one per row). Returns how many were new.
+        """
+        if any(not row.get("id") for row in rows):
+            raise ValueError("Prediction rows must carry an 'id' to be spooled")
+        if not rows:
+            return 0
+
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO spool (idempotency_key, payload, enqueued_at, next_attempt_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(str(row["id"]), json.dumps(row, default=str), now, now) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            inserted = self._conn.total_changes - before
+            self._metrics["appended"] += inserted
+            self._metrics["duplicates_ignored"] += len(rows) - inserted
+        self._wakeup.set()
+        return inserted
+
+    def amend(self, row_id: str, fields: dict):
+        """
+        Durably journal an update of `fields` on the row appended with id
+        `row_id`. A newer amendment of the same row replaces a pending one.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO spool (idempotency_key, op, payload, enqueued_at, next_attempt_at) "
+                "VALUES (?, 'amend', ?, ?, ?) "
+                "ON CONFLICT(idempotency_key) DO UPDATE SET payload = excluded.payload",
+                (f"{row_id}#amend", json.dumps({"id": row_id, **fields}, default=str), now, now),
+            )
+            self._metrics["amended"] += 1
+        self._wakeup.set()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def pending_rows(self) -> list:
+        """Payloads of appended rows not yet acknowledged by Supabase, oldest first (amendments excluded)."""
+        with self._lock:
+            return [json.loads(payload) for (payload,) in self._conn.execute(
+                "SELECT payload FROM spool WHERE op = 'insert' ORDER BY seq")]
+
+    def retry_dead_letters(self) -> int:
+        """Move every dead-lettered row back into the queue (e.g. after a schema fix). Returns how many."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # A key appended again since it was dead-lettered keeps the newer row
+                moved = self._conn.execute(
+                    "INSERT OR IGNORE INTO spool (idempotency_key, op, payload, enqueued_at, next_attempt_at) "
+                    "SELECT idempotency_key, op, payload, enqueued_at, ? FROM dead_letter ORDER BY seq",
+                    (now,)).rowcount
+                self._conn.execute("DELETE FROM dead_letter")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._wakeup.set()
+        return moved
+
+    def start(self):
+        """Start the drain worker. Rows left over from a previous run are replayed first."""
+        if self._worker and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        pending = self.pending_count()
+        if pending:
+            logger.info(f"Replaying {pending} spooled prediction rows from {self.path}")
+        self._worker = threading.Thread(target=self._run, name="prediction-spool", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Attempt a final drain, then stop. Undelivered rows stay on disk for the next start."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._worker:
+            self._worker.join(timeout)
+        remaining = self.pending_count()
+        if remaining:
+            logger.warning(f"{remaining} prediction rows still spooled at shutdown; they will be replayed on restart")
+
+    def stats(self) -> dict:
+        """Backlog size, replication lag and delivery counters."""
+        now = time.time()
+        with self._lock:
+            pending, oldest, max_attempts = self._conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), MAX(attempts) FROM spool").fetchone()
+            dead_letters = self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+            metrics = dict(self._metrics)
+        return {
+            "path": self.path,
+            "pending": pending,
+            "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "max_attempts_pending": max_attempts or 0,
+            "dead_letters": dead_letters,
+            **metrics,
+        }
+
+    def _next_batch(self) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, payload, attempts, op FROM spool WHERE next_attempt_at <= ? ORDER BY seq LIMIT ?",
+                (time.time(), self.batch_size),
+            ).fetchall()
+
+    def _prepare_rows(self, rows: list) -> list:
+        """Link rows to their user account in one lookup for the whole batch."""
+        payloads = [json.loads(payload) for _, payload, _ in rows]
+        missing = sorted({p["user_email"] for p in payloads if p.get("user_email") and not p.get("user_id")})
+        if missing:
+            try:
+                response = self.client.table("users").select("id, email").in_("email", missing).execute()
+                id_by_email = {u["email"]: u["id"] for u in response.data or [] if u.get("id")}
+                for payload in payloads:
+                    user_id = id_by_email.get(payload.get("user_email"))
+                    if user_id and not payload.get("user_id"):
+                        payload["user_id"] = user_id
+            except Exception as e:
+                logger.warning(f" Could not resolve user ids for spooled predictions: {e}")
+        # Bulk inserts need a uniform column set across the batch
+        for payload in payloads:
+            payload.setdefault("user_id", None)
+        return payloads
+
+    def _upsert(self, payloads: list):
+        self.client.table(self.table).upsert(
+            payloads, on_conflict="id", ignore_duplicates=True, returning=ReturnMethod.minimal).execute()
+
+    def _mark_delivered(self, seqs: list):
+        with self._lock:
+            self._conn.executemany("DELETE FROM spool WHERE seq = ?", [(seq,) for seq in seqs])
+            self._metrics["drained"] += len(seqs)
+            self._metrics["batches"] += 1
+            self._metrics["last_drain_at"] = time.time()
+
+    def _mark_failed(self, rows: list, error: Exception):
+        now = time.time()
+        permanent = _is_permanent(error)
+        with self._lock:
+            for seq, _, attempts in rows:
+                if permanent or attempts + 1 >= self.max_attempts:
+                    self._dead_letter(seq, attempts + 1, error, now)
+                    continue
+                delay = backoff_delay(attempts + 1, self.backoff_base_seconds, self.backoff_max_seconds)
+                self._conn.execute(
+                    "UPDATE spool SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE seq = ?",
+                    (now + delay, str(error), seq),
+                )
+            self._metrics["failed_attempts"] += len(rows)
+            self._metrics["last_error"] = str(error)
+
+    def _dead_letter(self, seq: int, attempts: int, error: Exception, now: float):
+        """Move one row out of the queue for good. Caller holds the lock."""
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dead_letter "
+                "(seq, idempotency_key, op, payload, enqueued_at, attempts, failed_at, last_error) "
+                "SELECT seq, idempotency_key, op, payload, enqueued_at, ?, ?, ? FROM spool WHERE seq = ?",
+                (attempts, now, str(error), seq))
+            self._conn.execute("DELETE FROM spool WHERE seq = ?", (seq,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._metrics["dead_lettered"] += 1
+        logger.error(f" Spooled prediction row {seq} dead-lettered after {attempts} attempts: {error}")
+
+    def drain_once(self) -> int:
+        """Deliver one batch of due rows. Returns the number of rows acknowledged by Supabase."""
+        batch = self._next_batch()
+        rows = [(seq, payload, attempts) for seq, payload, attempts, op in batch if op != "amend"]
+        amendments = [(seq, payload, attempts) for seq, payload, attempts, op in batch if op == "amend"]
+        # Inserts first: an amendment in the same batch applies to a row delivered just before it
+        return self._deliver(rows) + self._deliver_amendments(amendments)
+
+    def _deliver(self, rows: list) -> int:
+        if not rows:
+            return 0
+
+        payloads = self._prepare_rows(rows)
+        try:
+            self._upsert(payloads)
+            self._mark_delivered([seq for seq, _, _ in rows])
+            return len(rows)
+        except Exception as batch_error:
+            if len(rows) == 1:
+                logger.warning(f" Could not deliver spooled prediction, will retry: {batch_error}")
+                self._mark_failed(rows, batch_error)
+                return 0
+            logger.warning(f" Batch delivery of {len(rows)} spooled predictions failed, retrying row by row: {batch_error}")
+
+        # Isolate bad rows so one rejected record cannot hold back the rest of the journal
+        delivered = 0
+        for row, payload in zip(rows, payloads):
+            try:
+                self._upsert([payload])
+                self._mark_delivered([row[0]])
+                delivered += 1
+            except Exception as row_error:
+                self._mark_failed([row], row_error)
+        return delivered
+
+    def _deliver_amendments(self, rows: list) -> int:
+        delivered = 0
+        for row in rows:
+            seq, payload, _ = row
+            fields = json.loads(payload)
+            row_id = fields.pop("id")
+            with self._lock:
+                waiting = self._conn.execute(
+                    "SELECT next_attempt_at FROM spool WHERE idempotency_key = ? AND op = 'insert'",
+                    (str(row_id),)).fetchone()
+                if waiting:
+                    # The row itself is still pending; retry once it is due again
+                    self._conn.execute(
+                        "UPDATE spool SET next_attempt_at = ? WHERE seq = ?",
+                        (max(waiting[0], time.time()) + self.drain_interval, seq))
+                    continue
+            try:
+                self.client.table(self.table).update(fields, returning=ReturnMethod.minimal).eq("id", row_id).execute()
+                self._mark_delivered([seq])
+                delivered += 1
+            except Exception as e:
+                logger.warning(f" Could not apply spooled update to prediction {row_id}, will retry: {e}")
+                self._mark_failed([row], e)
+        return delivered
+
+    def _run(self):
+        while True:
+            try:
+                delivered = self.drain_once()
+            except Exception as e:
+                logger.error(f"Prediction spool drain error: {e}")
+                delivered = 0
+
+            if self._stopping.is_set():
+                # Final pass: keep draining while rows are being accepted, then exit
+                if not delivered:
+                    return
+                continue
+            if delivered < self.batch_size:
+                self._wakeup.wait(self.drain_interval)
+                self._wakeup.clear()
+
+
+# Global prediction spool instance
+_prediction_spool = None
+
+
+def get_prediction_spool() -> PredictionSpool:
+    """Get or create the prediction spool"""
+    global _prediction_spool
+    if _prediction_spool is None:
+        _prediction_spool = PredictionSpool(
+            path=os.getenv("PREDICTION_SPOOL_PATH", DEFAULT_SPOOL_PATH),
+            batch_size=int(os.getenv("PREDICTION_SPOOL_BATCH_SIZE", 100)),
+            drain_interval_ms=int(os.getenv("PREDICTION_SPOOL_DRAIN_MS", 1000)),
+            max_attempts=int(os.getenv("PREDICTION_SPOOL_MAX_ATTEMPTS", 50)),
+        )
+    return _prediction_spool
@@ -0,0 +1,307 @@
+"""
+WombGuard Provider Directory
+In-memory healthcare provider directory with consultation stats maintained as requests change
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime
+
+from pg_backend import get_pg_backend
+from repository import CONSULTATION_PROVIDER_STATS_ROW, USER_LISTING_ROW, fetch_all_pages
+from time_utils import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+TRACKED_STATUSES = ("pending", "accepted", "declined", "closed")
+
+
+class _Contribution:
+    """What one consultation request adds to its provider's stats, parsed once."""
+
+    __slots__ = ("provider", "patient", "status", "created_dt", "created_raw", "response_seconds")
+
+    def __init__(self, row: dict):
+        self.provider = (row.get("healthcare_provider_email") or "").strip().lower()
+        self.patient = (row.get("pregnant_woman_email") or "").strip().lower()
+        self.status = (row.get("status") or "").strip().lower()
+        self.created_raw = row.get("created_at")
+        self.created_dt = parse_datetime(self.created_raw)
+        responded_dt = parse_datetime(row.get("responded_at"))
+        self.response_seconds = None
+        if self.created_dt and responded_dt and responded_dt >= self.created_dt:
+            self.response_seconds = (responded_dt - self.created_dt).total_seconds()
+
+
+class _ProviderStats:
+    __slots__ = ("total", "statuses", "patients", "response_seconds", "response_count", "last")
+
+    def __init__(self):
+        self.total = 0
+        self.statuses = dict.fromkeys(TRACKED_STATUSES, 0)
+        # patient email -> number of requests, so removing one request keeps the unique count exact
+        self.patients = {}
+        self.response_seconds = 0.0
+        self.response_count = 0
+        # created_dt -> (requests, created_raw), so the latest timestamp survives removals
+        self.last = {}
+
+    def apply(self, item: _Contribution, sign: int):
+        self.total += sign
+        if item.status in self.statuses:
+            self.statuses[item.status] += sign
+        if item.patient:
+            count = self.patients.get(item.patient, 0) + sign
+            if count > 0:
+                self.patients[item.patient] = count
+            else:
+                self.patients.pop(item.patient, None)
+        if item.response_seconds is not None:
+            self.response_seconds += sign * item.response_seconds
+            self.response_count += sign
+        if item.created_dt:
+            count, raw = self.last.get(item.created_dt, (0, item.created_raw))
+            count += sign
+            if count > 0:
+                self.last[item.created_dt] = (count, raw)
+            else:
+                self.last.pop(item.created_dt, None)
+
+    def last_consultation_raw(self):
+        if not self.last:
+            return None
+        return self.last[max(self.last)][1]
+
+
+class ProviderDirectoryCache:
+    """
+    Provider directory served from memory.
+
+    Consultation requests are folded into per-provider stats once, when they
+    are created or updated through the API, so /providers no longer scans the
+    consultation history. Each request's previous contribution is replaced on
+    update, keeping status counts and response times exact. The provider list
+    is reloaded when user records change, and a background job periodically
+    rebuilds everything from the database to pick up writes made elsewhere.
+    """
+
+    def __init__(self, reconcile_interval_seconds: float = 300.0, client=None):
+        self.reconcile_interval_seconds = reconcile_interval_seconds
+        self._client = client
+        self._lock = threading.RLock()
+        self._seed_lock = threading.Lock()
+        self._providers = None
+        self._providers_stale = True
+        self._contributions = None
+        self._stats = {}
+        self._pending_since_rebuild = None
+        self._stopping = threading.Event()
+        self._worker = None
+        self._metrics = {
+            "recorded": 0,
+            "reconciliations": 0,
+            "last_reconciled_at": None,
+            "last_drift": None,
+            "last_error": None,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase_client import supabase
+            self._client = supabase
+        return self._client
+
+    def _load_providers(self) -> list:
+        backend = get_pg_backend()
+        if backend is not None:
+            try:
+                return backend.fetch_projection(
+                    USER_LISTING_ROW, filters={"role": "healthcare_provider"}, order_by=("created_at", "id"))
+            except Exception as e:
+                logger.warning(f" Postgres backend failed for provider list, using Supabase: {e}")
+        return fetch_all_pages(
+            lambda: USER_LISTING_ROW.query(self.client)
+            .eq("role", "healthcare_provider")
+            .order("created_at", desc=False)
+            .order("id", desc=False)
+        )
+
+    def _load_contributions(self) -> dict:
+        rows = None
+        backend = get_pg_backend()
+        if backend is not None:
+            try:
+                rows = backend.fetch_projection(CONSULTATION_PROVIDER_STATS_ROW)
+            except Exception as e:
+                logger.warning(f" Postgres backend failed for consultation stats, using Supabase: {e}")
+        if rows is None:
+            rows = fetch_all_pages(lambda: CONSULTATION_PROVIDER_STATS_ROW.query(self.client).order("id"))
+        return {row.get("id"): _Contribution(row) for row in rows}
+
+    def _apply(self, item: _Contribution, sign: int):
+        if not item.provider:
+            return
+        stats = self._stats.get(item.provider)
+        if stats is None:
+            stats = self._stats[item.provider] = _ProviderStats()
+        stats.apply(item, sign)
+
+    def _rebuild(self):
+        """Reload everything from the database, replaying requests recorded while it was loading."""
+        with self._lock:
+            self._pending_since_rebuild = []
+        try:
+            providers = self._load_providers()
+            contributions = self._load_contributions()
+        except Exception:
+            with self._lock:
+                self._pending_since_rebuild = None
+            raise
+
+        with self._lock:
+            for row in self._pending_since_rebuild:
+                contributions[row.get("id")] = _Contribution(row)
+            self._pending_since_rebuild = None
+            previous_total = sum(s.total for s in self._stats.values()) if self._contributions is not None else None
+            self._stats = {}
+            self._contributions = contributions
+            for item in contributions.values():
+                self._apply(item, 1)
+            self._providers = providers
+            self._providers_stale = False
+            return previous_total
+
+    def ensure_seeded(self):
+        if self._contributions is not None and not self._providers_stale:
+            return
+        with self._seed_lock:
+            if self._contributions is None:
+                self._rebuild()
+                logger.info(f"Provider directory seeded with {len(self._contributions)} consultation requests")
+            elif self._providers_stale:
+                providers = self._load_providers()
+                with self._lock:
+                    self._providers = providers
+                    self._providers_stale = False
+
+    def mark_providers_stale(self):
+        """Reload the provider list on the next read (after user creation, role changes or deletion)."""
+        with self._lock:
+            self._providers_stale = True
+
+    def record_consultation(self, row: dict):
+        """Fold a created or updated consultation request into the stats, replacing its previous contribution."""
+        key = row.get("id")
+        item = _Contribution(row)
+        with self._lock:
+            self._metrics["recorded"] += 1
+            if self._pending_since_rebuild is not None:
+                self._pending_since_rebuild.append(row)
+            if self._contributions is None:
+                return
+            previous = self._contributions.get(key)
+            if previous is not None:
+                self._apply(previous, -1)
+            self._contributions[key] = item
+            self._apply(item, 1)
+
+    def reconcile(self):
+        """Rebuild from the database and report how far the incremental stats had drifted."""
+        previous_total = self._rebuild()
+        with self._lock:
+            current_total = sum(s.total for s in self._stats.values())
+            drift = None if previous_total is None else current_total - previous_total
+            self._metrics["reconciliations"] += 1
+            self._metrics["last_reconciled_at"] = datetime.utcnow().isoformat()
+            self._metrics["last_drift"] = drift
+        if drift:
+            logger.info(f"Provider directory reconciled, corrected drift of {drift} consultation requests")
+
+    def directory(self) -> list:
+        """The /providers directory entries, sorted by name."""
+        self.ensure_seeded()
+        with self._lock:
+            directory = []
+            for provider in self._providers:
+                provider_email = (provider.get("email") or "").strip().lower()
+                stats = self._stats.get(provider_email)
+
+                avg_response_hours = None
+                if stats and stats.response_count > 0:
+                    avg_response_hours = round(stats.response_seconds / stats.response_count / 3600, 1)
+
+                pending = stats.statuses["pending"] if stats else 0
+                availability = "Available"
+                if pending >= 5:
+                    availability = "High demand"
+                elif pending >= 1:
+                    availability = "Responding"
+
+                directory.append({
+                    "id": provider.get("id"),
+                    "name": provider.get("name"),
+                    "email": provider.get("email"),
+                    "phone": provider.get("phone") or "N/A",
+                    "joined_at": provider.get("created_at"),
+                    "total_consultations": stats.total if stats else 0,
+                    "pending_consultations": pending,
+                    "accepted_consultations": stats.statuses["accepted"] if stats else 0,
+                    "closed_consultations": stats.statuses["closed"] if stats else 0,
+                    "patients_supported": len(stats.patients) if stats else 0,
+                    "average_response_hours": avg_response_hours,
+                    "availability_status": availability,
+                    "last_consultation_at": stats.last_consultation_raw() if stats else None,
+                })
+
+        # Sort alphabetically for consistent UI
+        directory.sort(key=lambda item: (item.get("name") or "").lower())
+        return directory
+
+    def start(self):
+        """Seed in the background and reconcile on an interval."""
+        if self._worker and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="provider-directory-reconcile", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        try:
+            self.ensure_seeded()
+        except Exception as e:
+            self._metrics["last_error"] = str(e)
+            logger.warning(f"Provider directory seeding failed, will retry on first read: {e}")
+        while not self._stopping.wait(self.reconcile_interval_seconds):
+            try:
+                self.reconcile()
+            except Exception as e:
+                self._metrics["last_error"] = str(e)
+                logger.warning(f"Provider directory reconciliation failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "seeded": self._contributions is not None,
+                "providers": len(self._providers or []),
+                "consultation_requests": len(self._contributions or {}),
+                **self._metrics,
+            }
+
+
+# Global provider directory instance
+_provider_directory = None
+
+
+def get_provider_directory() -> ProviderDirectoryCache:
+    """Get or create the provider directory cache"""
+    global _provider_directory
+    if _provider_directory is None:
+        _provider_directory = ProviderDirectoryCache(
+            reconcile_interval_seconds=float(os.getenv("PROVIDER_DIRECTORY_RECONCILE_SECONDS", 300)),
+        )
+    return _provider_directory
@@ -0,0 +1,107 @@
+"""
+WombGuard Repository
+Named column projections per use case, so each query fetches only the columns its endpoint needs
+"""
+
+# PostgREST caps each response, so full-column reads are paged
+FETCH_PAGE_SIZE = 1000
+
+
+class Projection:
+    """
+    A fixed column list for one table and one use case.
+
+    Endpoints select through a projection instead of select("*"), so password
+    hashes, verification tokens and large JSON blobs only leave the database
+    for the few queries that actually read them.
+    """
+
+    __slots__ = ("name", "table", "fields")
+
+    def __init__(self, name: str, table: str, fields: tuple):
+        self.name = name
+        self.table = table
+        self.fields = tuple(fields)
+
+    @property
+    def columns(self) -> str:
+        return ", ".join(self.fields)
+
+    def query(self, client):
+        """client.table(...).select(...) for this projection; filters and ordering are chained by the caller."""
+        return client.table(self.table).select(self.columns)
+
+    def pick(self, row: dict) -> dict:
+        """Trim an in-memory row (e.g. a freshly written payload) to this projection's columns."""
+        return {field: row.get(field) for field in self.fields}
+
+    def extend(self, name: str, *fields: str) -> "Projection":
+        return Projection(name, self.table, self.fields + tuple(f for f in fields if f not in self.fields))
+
+    def __repr__(self):
+        return f"Projection({self.name!r}, {self.table!r}, {self.columns!r})"
+
+
+# USERS
+# Existence checks (duplicate email / phone, post-delete verification)
+USER_KEY = Projection("user_key", "users", ("id",))
+# Bulk import duplicate checks match on either unique column
+USER_UNIQUE_KEYS = Projection("user_unique_keys", "users", ("id", "email", "phone"))
+# Identity lookups shared through the identity cache; never includes secrets
+USER_IDENTITY = Projection(
+    "user_identity", "users",
+    ("id", "email", "name", "phone", "role", "is_blocked", "email_verified", "tokens_valid_after", "created_at"))
+# Login is the only read that needs the password hash
+USER_LOGIN = USER_IDENTITY.extend("user_login", "password")
+USER_VERIFICATION = Projection("user_verification", "users", ("id", "email", "email_verified"))
+USER_PROFILE = USER_IDENTITY.extend("user_profile", "email_verified_at", "updated_at")
+USER_CONTACT = Projection("user_contact", "users", ("id", "email", "name", "phone"))
+# Admin user list and provider directory rows
+USER_LISTING_ROW = Projection("user_listing_row", "users", ("id", "name", "email", "phone", "role", "created_at"))
+USER_ROLE = Projection("user_role", "users", ("role",))
+
+# PREDICTIONS
+# Everything a dashboard card shows; the feature_importance blob is only needed by history/export
+PREDICTION_DASHBOARD_ROW = Projection(
+    "prediction_dashboard_row", "predictions",
+    ("id", "user_id", "user_email", "predicted_risk", "probability", "confidence_score",
+     "age", "systolic_bp", "diastolic", "bs", "body_temp", "bmi", "heart_rate",
+     "explanation", "role", "created_at"))
+PREDICTION_EXPORT_ROW = PREDICTION_DASHBOARD_ROW.extend(
+    "prediction_export_row", "feature_importance", "explanation_level")
+PREDICTION_STATS_ROW = Projection("prediction_stats_row", "predictions", ("user_email", "predicted_risk", "created_at"))
+
+# CHAT HISTORY
+CHAT_HISTORY_ROW = Projection(
+    "chat_history_row", "chat_history",
+    ("id", "user_id", "user_email", "user_message", "bot_response", "conversation_id", "message_type", "created_at"))
+CHAT_CONVERSATION_KEY = Projection("chat_conversation_key", "chat_history", ("conversation_id",))
+
+# CONSULTATION REQUESTS
+CONSULTATION_ROW = Projection(
+    "consultation_row", "consultation_requests",
+    ("id", "pregnant_woman_id", "pregnant_woman_email", "pregnant_woman_name",
+     "healthcare_provider_id", "healthcare_provider_email", "healthcare_provider_name",
+     "subject", "message", "response_message", "status", "priority",
+     "created_at", "responded_at", "closed_at", "updated_at"))
+CONSULTATION_STATUS = Projection("consultation_status", "consultation_requests", ("status",))
+CONSULTATION_PROVIDER_STATS_ROW = Projection(
+    "consultation_provider_stats_row", "consultation_requests",
+    ("id", "healthcare_provider_email", "status", "created_at", "responded_at", "pregnant_woman_email"))
+
+
+def quote_filter_value(value) -> str:
+    """Double-quote a value for PostgREST filters; timestamps and emails contain reserved characters (".", ":", ",")."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def fetch_all_pages(build_query, page_size: int = FETCH_PAGE_SIZE) -> list:
+    """Run build_query().range(...) page by page until a short page comes back."""
+    rows = []
+    start = 0
+    while True:
+        page = build_query().range(start, start + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
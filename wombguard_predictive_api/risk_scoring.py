@@ -0,0 +1,340 @@
+"""
+WombGuard Risk Scoring
+Vectorized validation, risk prediction and SHAP explanations for one or many patients
+"""
+
+import re
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from tree_compiler import compile_forest
+from tree_shap import TreeShap
+
+logger = logging.getLogger(__name__)
+
+HIGH_RISK_THRESHOLD = 0.5
+TOP_FEATURES = 3
+
+# none: no attributions; fast: top contributions from the forest's decision paths
+# (Saabas, shap's approximate=True); full: exact TreeSHAP for every feature
+EXPLAIN_LEVELS = ("none", "fast", "full")
+
+# Above this many rows scikit-learn's Cython traversal beats the compiled forest's
+# NumPy gathers (benchmarks/bench_tree_compiler.py), so larger batches use it
+COMPILED_MAX_ROWS = 2048
+
+# predict_proba column of the high-risk class
+HIGH_RISK_CLASS = 1
+
+# How far expected_value + sum(SHAP values) may be from the probability
+ADDITIVITY_TOLERANCE = 1e-9
+
+# feature: (label, low, high, range text, 0 means "not measured")
+FEATURE_RANGES = {
+    "Age": ("Age", 10, 60, "10-60 years", False),
+    "Systolic_BP": ("Systolic BP", 70, 200, "70-200 mmHg", False),
+    "Diastolic": ("Diastolic BP", 40, 130, "40-130 mmHg", False),
+    "BS": ("Blood Sugar", 2.5, 20, "2.5-20 mmol/L", True),
+    "Body_Temp": ("Body Temperature", 35, 40, "35-40°C", True),
+    "BMI": ("BMI", 10, 50, "10-50 kg/m²", True),
+    "Heart_Rate": ("Heart Rate", 40, 150, "40-150 bpm", True),
+}
+
+# Prediction table column for each model feature
+FEATURE_COLUMNS = {
+    "Age": "age",
+    "Systolic_BP": "systolic_bp",
+    "Diastolic": "diastolic",
+    "BS": "bs",
+    "Body_Temp": "body_temp",
+    "BMI": "bmi",
+    "Heart_Rate": "heart_rate",
+}
+
+
+def header_key(name: str) -> str:
+    """Column name folded to lowercase words joined by underscores: "Body Temp (°F)" -> "body_temp_f"."""
+    return "_".join(re.sub(r"[^0-9a-z]+", " ", str(name).lower()).split())
+
+
+# Accepted CSV headers: the model feature name, the predictions column or the display label
+HEADER_ALIASES = {
+    header_key(alias): feature
+    for feature, column in FEATURE_COLUMNS.items()
+    for alias in (feature, column, FEATURE_RANGES[feature][0])
+}
+
+
+def _match_columns(header: list, extra_columns: tuple = ()) -> dict:
+    """{feature or extra column: position in header}. Raises ValueError when a feature is absent."""
+    positions = {}
+    for position, name in enumerate(header):
+        key = header_key(name)
+        target = HEADER_ALIASES.get(key) or (key if key in extra_columns else None)
+        if target and target not in positions:
+            positions[target] = position
+
+    missing = [feature for feature in FEATURE_COLUMNS if feature not in positions]
+    if missing:
+        raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+    return positions
+
+
+def frame_from_rows(header: list, rows: list, extra_columns: tuple = ()) -> pd.DataFrame:
+    """
+    Numeric feature frame from raw CSV rows. Unparseable values become NaN so
+    validation_errors reports them per row; `extra_columns` are kept as text.
+    Raises ValueError when a feature column is absent from the header.
+    """
+    positions = _match_columns(header, extra_columns)
+
+    def column(target):
+        position = positions.get(target)
+        return [row[position].strip() if position is not None and position < len(row) else "" for row in rows]
+
+    frame = pd.DataFrame({feature: pd.to_numeric(column(feature), errors="coerce") for feature in FEATURE_COLUMNS})
+    for extra in extra_columns:
+        frame[extra] = column(extra)
+    return frame
+
+
+def validation_errors(frame: pd.DataFrame) -> list:
+    """
+    One error string per row ("" when the row is valid), checking every row of
+    a numeric feature frame at once. Missing (NaN) values are reported by name.
+    """
+    messages = [[] for _ in range(len(frame))]
+    for feature, (label, low, high, range_text, optional) in FEATURE_RANGES.items():
+        values = frame[feature].to_numpy(dtype=float)
+        missing = np.isnan(values)
+        out_of_range = ~missing & ((values < low) | (values > high))
+        if optional:
+            out_of_range &= values > 0
+        for index in np.flatnonzero(missing):
+            messages[index].append(f"{label} is missing or not a number")
+        for index in np.flatnonzero(out_of_range):
+            messages[index].append(f"{label} {values[index]} is outside valid range ({range_text})")
+    return [" | ".join(row) for row in messages]
+
+
+def summarize(contributions: dict) -> str:
+    top = sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:TOP_FEATURES]
+    return "Top influencing features: " + ", ".join(f"{k} ({v:+.3f})" for k, v in top)
+
+
+class RiskScorer:
+    """
+    Scores a frame of patients with one scaler.transform, one predict_proba
+    and one SHAP pass, whatever the number of rows.
+
+    The explainer is built once and shared; building it walks all the
+    trees of the forest, which used to happen on every /predict call. For a
+    compiled forest it is a TreeShap, and shap is only imported for models
+    that cannot be compiled or when TreeShap fails its additivity check.
+
+    With `compiled`, probabilities for up to COMPILED_MAX_ROWS rows come
+    from a CompiledForest (see tree_compiler) and a StandardScaler is applied
+    as plain array arithmetic, skipping scikit-learn's per-call validation.
+    Both paths give the same bits; predict() can force either per call.
+    """
+
+    def __init__(self, model, scaler, feature_names: list, compiled: bool = False):
+        self.model = model
+        self.scaler = scaler
+        self.feature_names = list(feature_names)
+        self.forest = compile_forest(model) if compiled else None
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "batches": 0,
+            "rows": 0,
+            "compiled_rows": 0,
+            **{f"explain_{level}_rows": 0 for level in EXPLAIN_LEVELS},
+            "explainer_fallbacks": 0,
+        }
+
+    @property
+    def explainer(self):
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    self._explainer = self._build_explainer()
+        return self._explainer
+
+    def _build_explainer(self):
+        if self.forest is not None:
+            try:
+                return TreeShap(self.forest, class_index=HIGH_RISK_CLASS)
+            except ValueError as e:
+                logger.warning(f" Could not build TreeShap tables, using shap.TreeExplainer: {e}")
+        import shap
+        return shap.TreeExplainer(self.model)
+
+    def _shap_values(self, features: pd.DataFrame, scaled: np.ndarray, approximate: bool = False) -> np.ndarray:
+        """(rows, features) SHAP values towards the high-risk class."""
+        try:
+            if approximate:
+                values = self.explainer.shap_values(scaled, approximate=True)
+            else:
+                values = self.explainer.shap_values(scaled)
+        except Exception as e:
+            logger.warning(f" Tree explainer failed, using model-agnostic explainer: {e}")
+            with self._lock:
+                self._metrics["explainer_fallbacks"] += 1
+            import shap
+            values = shap.Explainer(self.model.predict, features)(features).values
+        if isinstance(values, list):
+            values = values[HIGH_RISK_CLASS]
+        values = np.asarray(values)
+        if values.ndim == 3:
+            # Newer shap releases return (rows, features, classes)
+            values = values[:, :, HIGH_RISK_CLASS]
+        return values.reshape(len(features), -1)
+
+    def _scale(self, features: pd.DataFrame, compiled: bool) -> np.ndarray:
+        if not compiled or not isinstance(self.scaler, StandardScaler):
+            return self.scaler.transform(features)
+        # The same two in-place operations as StandardScaler.transform
+        scaled = features.to_numpy(dtype=np.float64, copy=True)
+        if self.scaler.with_mean:
+            scaled -= self.scaler.mean_
+        if self.scaler.with_std:
+            scaled /= self.scaler.scale_
+        return scaled
+
+    def probabilities(self, features: pd.DataFrame, compiled: bool = None) -> np.ndarray:
+        """
+        High-risk probability for every row of `features`, without SHAP values.
+        `compiled` forces the compiled forest or scikit-learn; by default the
+        forest is used, if one was built, for up to COMPILED_MAX_ROWS rows.
+        """
+        probabilities, _ = self._probabilities(features[self.feature_names].astype(float), compiled)
+        return probabilities
+
+    def _use_forest(self, rows: int, compiled: bool = None) -> bool:
+        if self.forest is None or compiled is False:
+            return False
+        return compiled or rows <= COMPILED_MAX_ROWS
+
+    def _probabilities(self, features: pd.DataFrame, compiled: bool = None) -> tuple:
+        compiled = self._use_forest(len(features), compiled)
+        scaled = self._scale(features, compiled)
+        model = self.forest if compiled else self.model
+        return model.predict_proba(scaled)[:, HIGH_RISK_CLASS], scaled
+
+    def predict(self, features: pd.DataFrame, compiled: bool = None, explain: str = "full") -> tuple:
+        """
+        (high-risk probabilities, attributions) as arrays for every row of
+        `features` (columns in any order, must include every model feature).
+        Attributions are exact SHAP values for explain="full", path
+        attributions for "fast" and None for "none".
+        """
+        if explain not in EXPLAIN_LEVELS:
+            raise ValueError(f"explain must be one of {', '.join(EXPLAIN_LEVELS)}, not {explain!r}")
+        features = features[self.feature_names].astype(float)
+        if explain == "fast" and self.forest is not None:
+            # Probabilities and attributions from the same traversal
+            compiled = True
+            probabilities, shap_values = self.forest.predict_proba_with_paths(
+                self._scale(features, compiled), HIGH_RISK_CLASS)
+            probabilities = probabilities[:, HIGH_RISK_CLASS]
+        else:
+            probabilities, scaled = self._probabilities(features, compiled)
+            shap_values = None if explain == "none" else self._shap_values(
+                features, scaled, approximate=explain == "fast")
+
+        with self._lock:
+            self._metrics["batches"] += 1
+            self._metrics["rows"] += len(features)
+            self._metrics[f"explain_{explain}_rows"] += len(features)
+            if self._use_forest(len(features), compiled):
+                self._metrics["compiled_rows"] += len(features)
+        return probabilities, shap_values
+
+    def verify_compiled(self, features: pd.DataFrame) -> bool:
+        """
+        Check that the compiled path reproduces scikit-learn exactly on
+        `features`, and drop the compiled forest if it does not. A TreeShap
+        explainer must also add up to those probabilities, or shap is used.
+        """
+        if self.forest is None:
+            return False
+        features = features[self.feature_names].astype(float)
+        expected, _ = self._probabilities(features, compiled=False)
+        actual, scaled = self._probabilities(features, compiled=True)
+        if not np.array_equal(expected, actual):
+            logger.warning(
+                f" Compiled forest differs from scikit-learn by up to {np.abs(expected - actual).max():.3g}; "
+                f"scoring with scikit-learn")
+            self.forest = None
+            self._explainer = None
+            return False
+
+        explainer = self.explainer
+        if isinstance(explainer, TreeShap):
+            error = np.abs(explainer.shap_values(scaled).sum(axis=1) + explainer.expected_value - actual).max()
+            if error > ADDITIVITY_TOLERANCE:
+                logger.warning(f" TreeShap values miss the probabilities by up to {error:.3g}; using shap")
+                import shap
+                self._explainer = shap.TreeExplainer(self.model)
+        return True
+
+    def score(self, features: pd.DataFrame, explain: str = "full", top_k: int = TOP_FEATURES) -> list:
+        """
+        Risk label, probability, contributions and summary for each row of
+        `features`. Contributions cover every feature for explain="full", the
+        `top_k` largest by magnitude for "fast", and are None for "none".
+        """
+        if features.empty:
+            return []
+        probabilities, shap_values = self.predict(features, explain=explain)
+
+        results = []
+        for row, probability in enumerate(probabilities.tolist()):
+            contributions = None
+            if shap_values is not None:
+                contributions = dict(zip(self.feature_names, shap_values[row].tolist()))
+                if explain == "fast":
+                    contributions = dict(
+                        sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:top_k])
+            results.append({
+                "risk_label": "High Risk" if probability >= HIGH_RISK_THRESHOLD else "Low Risk",
+                "probability": probability,
+                "confidence": round(max(probability, 1 - probability), 4),
+                "contributions": contributions,
+                "summary": summarize(contributions) if contributions else None,
+                "explanation_level": explain,
+            })
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "explainer_ready": self._explainer is not None,
+                "explainer": type(self._explainer).__name__ if self._explainer is not None else None,
+                "compiled": self.forest.describe() if self.forest is not None else None,
+                **self._metrics,
+            }
+
+
+def prediction_record(user_email: str, features: dict, result: dict, prediction_id: str, created_at: str) -> dict:
+    """predictions table row for one scored patient."""
+    return {
+        "id": prediction_id,
+        "user_email": user_email,
+        "predicted_risk": result["risk_label"],
+        "probability": result["probability"],
+        "confidence_score": result["confidence"],
+        **{column: float(features[feature]) for feature, column in FEATURE_COLUMNS.items()},
+        "feature_importance": (
+            {k: float(v) for k, v in result["contributions"].items()} if result["contributions"] is not None else None),
+        "explanation": result["summary"],
+        "explanation_level": result["explanation_level"],
+        "role": "pregnant_woman",
+        "created_at": created_at,
+    }
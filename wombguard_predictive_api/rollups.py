@@ -0,0 +1,156 @@
+"""
+WombGuard Prediction Rollups
+Daily and monthly assessment counts per risk level, read from trigger-maintained rollup tables
+
+Run as a script to backfill the rollup tables from prediction history:
+    python rollups.py backfill
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pg_backend import get_pg_backend
+
+logger = logging.getLogger(__name__)
+
+DAILY_TABLE = "prediction_daily_rollups"
+MONTHLY_TABLE = "prediction_monthly_rollups"
+
+
+def _bucket_date(value):
+    return datetime.fromisoformat(str(value)[:10]).date()
+
+
+class PredictionRollups:
+    """
+    Reader for the rollup tables created by database/add_prediction_rollup_tables.sql.
+
+    Each read touches at most (buckets x risk levels) rows. If the tables are
+    not installed the reader reports itself unavailable for retry_seconds so
+    callers fall back to their own aggregation without a failing round trip
+    on every request.
+    """
+
+    def __init__(self, retry_seconds: float = 300.0, client=None):
+        self.retry_seconds = retry_seconds
+        self._client = client
+        self._lock = threading.Lock()
+        self._unavailable_until = 0.0
+        self._metrics = {"reads": 0, "fallbacks": 0, "last_error": None}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase_client import supabase
+            self._client = supabase
+        return self._client
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def _read(self, table: str, bucket_column: str, since):
+        """Read rollup rows since a bucket, or return None (and back off) if the rollup tables cannot be read."""
+        if not self.available():
+            with self._lock:
+                self._metrics["fallbacks"] += 1
+            return None
+        try:
+            backend = get_pg_backend()
+            if backend is not None:
+                rows = backend.rollup_counts(table, bucket_column, since)
+            else:
+                rows = (
+                    self.client.table(table)
+                    .select(f"{bucket_column}, assessment_count")
+                    .gte(bucket_column, since.isoformat())
+                    .execute().data or []
+                )
+            with self._lock:
+                self._metrics["reads"] += 1
+            return rows
+        except Exception as e:
+            logger.warning(f" Prediction rollups unavailable, falling back for {self.retry_seconds:.0f}s: {e}")
+            with self._lock:
+                self._unavailable_until = time.monotonic() + self.retry_seconds
+                self._metrics["fallbacks"] += 1
+                self._metrics["last_error"] = str(e)
+            return None
+
+    def daily_counts(self, today: datetime, days: int = 7):
+        """{date: assessments} for the last `days` UTC days, or None if rollups are unavailable."""
+        since = (today - timedelta(days=days - 1)).date()
+        rows = self._read(DAILY_TABLE, "day", since)
+        if rows is None:
+            return None
+        counts = Counter()
+        for row in rows:
+            counts[_bucket_date(row["day"])] += int(row.get("assessment_count") or 0)
+        return counts
+
+    def monthly_counts(self, today: datetime, months: int = 6):
+        """{month_start: assessments} for the last `months` calendar months, or None if unavailable."""
+        year, month = today.year, today.month - (months - 1)
+        while month <= 0:
+            year, month = year - 1, month + 12
+        since = datetime(year, month, 1).date()
+        rows = self._read(MONTHLY_TABLE, "month", since)
+        if rows is None:
+            return None
+        counts = Counter()
+        for row in rows:
+            counts[_bucket_date(row["month"])] += int(row.get("assessment_count") or 0)
+        return counts
+
+    def backfill(self) -> dict:
+        """Rebuild both rollup tables from the predictions table."""
+        result = self.client.rpc("backfill_prediction_rollups").execute().data or [{}]
+        with self._lock:
+            self._unavailable_until = 0.0
+        return result[0] if isinstance(result, list) else result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"available": self.available(), **self._metrics}
+
+
+# Global rollup reader instance
+_prediction_rollups = None
+
+
+def get_prediction_rollups() -> PredictionRollups:
+    """Get or create the prediction rollup reader"""
+    global _prediction_rollups
+    if _prediction_rollups is None:
+        _prediction_rollups = PredictionRollups(
+            retry_seconds=float(os.getenv("ROLLUP_RETRY_SECONDS", 300)),
+        )
+    return _prediction_rollups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WombGuard prediction rollup maintenance")
+    parser.add_argument("command", choices=["backfill"], help="backfill: rebuild rollups from prediction history")
+    parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.time()
+    try:
+        result = get_prediction_rollups().backfill()
+    except Exception as e:
+        logger.error(f"Rollup backfill failed: {e}")
+        return 1
+    logger.info(
+        f"Rollup backfill complete in {time.time() - started:.1f}s: "
+        f"{result.get('daily_rows', 0)} daily rows, {result.get('monthly_rows', 0)} monthly rows"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
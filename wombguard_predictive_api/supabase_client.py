@@ -1,5 +1,7 @@
 # supabase_client.py
 from supabase import create_client, Client
+from postgrest import AsyncPostgrestClient
+import httpx
 import os
 
 # Supabase credentials
@@ -11,6 +13,88 @@ SUPABASE_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmFzZSIsInJ
 # Initializing Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+
+class AsyncSupabase:
+    """
+    PostgREST access for async endpoints over one shared httpx.AsyncClient.
+
+    Exposes table() and rpc() like the sync client, so repository projections
+    work unchanged and queries are awaited with `await query.execute()`.
+    Connections are pooled and kept alive across requests, so async routes
+    are limited by max_connections rather than by the worker thread pool.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            key: str,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 20,
+            keepalive_expiry: float = 30.0,
+            timeout_seconds: float = 10.0):
+        self.rest_url = f"{url.rstrip('/')}/rest/v1"
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout_seconds, connect=min(timeout_seconds, 5.0))
+        self._http = None
+        self._postgrest = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.rest_url,
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=True,
+                follow_redirects=True,
+            )
+            self._postgrest = None
+        return self._http
+
+    @property
+    def postgrest(self) -> AsyncPostgrestClient:
+        http = self.http
+        if self._postgrest is None:
+            self._postgrest = AsyncPostgrestClient(self.rest_url, headers=self.headers, http_client=http)
+        return self._postgrest
+
+    def table(self, name: str):
+        return self.postgrest.from_(name)
+
+    def rpc(self, fn: str, params: dict = None):
+        return self.postgrest.rpc(fn, params or {})
+
+    async def aclose(self):
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+        self._postgrest = None
+
+
+# Global async Supabase client instance (the HTTP connection pool opens on first use)
+_async_supabase = None
+
+
+def get_async_supabase() -> AsyncSupabase:
+    """Get or create the async Supabase client"""
+    global _async_supabase
+    if _async_supabase is None:
+        _async_supabase = AsyncSupabase(
+            SUPABASE_URL,
+            SUPABASE_KEY,
+            max_connections=int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", 20)),
+            timeout_seconds=float(os.getenv("SUPABASE_HTTP_TIMEOUT_SECONDS", 10)),
+        )
+    return _async_supabase
+
+
 # test
 if __name__ == "__main__":
     try:
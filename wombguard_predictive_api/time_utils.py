@@ -0,0 +1,45 @@
+"""
+WombGuard Time Utilities
+Timestamp parsing shared by the API endpoints and the analytics modules
+"""
+
+import re
+from datetime import datetime, timezone
+
+
+def parse_datetime(datetime_str: str):
+    """
+    Parse datetime string from Supabase, handling various formats.
+    Supabase sometimes returns timestamps with 5-digit microseconds which Python can't parse.
+    """
+    if not datetime_str:
+        return None
+    try:
+        # Remove 'Z' and replace with '+00:00'
+        datetime_str = datetime_str.replace("Z", "+00:00")
+        # Try parsing directly
+        return datetime.fromisoformat(datetime_str)
+    except ValueError:
+        # If it fails, it might be due to microseconds issue
+        # Extract and normalize microseconds
+        # Pattern: YYYY-MM-DDTHH:MM:SS.microseconds+TZ
+        match = re.match(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\.(\d+)([\+\-]\d{2}:\d{2})', datetime_str)
+        if match:
+            date_part, microseconds, tz_part = match.groups()
+            # Normalize microseconds to 6 digits
+            microseconds = microseconds.ljust(6, '0')[:6]
+            normalized = f"{date_part}.{microseconds}{tz_part}"
+            return datetime.fromisoformat(normalized)
+        # Fallback: return current time
+        return datetime.utcnow()
+
+
+def parse_utc_naive(datetime_str: str):
+    """
+    Parse a timestamp and express it as a naive UTC datetime.
+    Lets rows written by the API (naive UTC) and rows read back from Supabase (+00:00) be compared safely.
+    """
+    parsed = parse_datetime(datetime_str)
+    if parsed is not None and parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -0,0 +1,168 @@
+"""
+WombGuard Tree Compiler
+Flattens a fitted tree ensemble into node arrays evaluated with vectorized NumPy traversal
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# scikit-learn marks leaves with this child index
+TREE_LEAF = -1
+
+# Rows traversed together; bounds the (trees x rows) index arrays to a few MB
+BLOCK_ROWS = 4096
+
+# Below this many rows, leaf probabilities are summed with one cumsum instead of a loop over trees
+CUMSUM_MAX_ROWS = 64
+
+
+class CompiledForest:
+    """
+    predict_proba for a fitted RandomForestClassifier or ExtraTreesClassifier
+    (or a single DecisionTreeClassifier) without scikit-learn's per-call input
+    validation and per-estimator dispatch.
+
+    The nodes of all trees are concatenated into flat feature, threshold,
+    child and per-class leaf-probability arrays. Leaves point to themselves, so every
+    row steps through every tree at once for max_depth iterations with no
+    masking. Results are bitwise identical to predict_proba: inputs are
+    compared as float32 like scikit-learn does, and per-tree probabilities
+    are summed in estimator order before dividing by the number of trees.
+    """
+
+    def __init__(self, model, block_rows: int = BLOCK_ROWS):
+        estimators = getattr(model, "estimators_", None) or [model]
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output tree ensembles can be compiled")
+        if any(not hasattr(estimator, "tree_") for estimator in estimators):
+            raise ValueError(f"{type(model).__name__} is not a tree ensemble")
+
+        self.classes_ = np.asarray(model.classes_)
+        self.n_classes = len(self.classes_)
+        self.n_features = int(model.n_features_in_)
+        self.block_rows = max(1, block_rows)
+
+        features, thresholds, lefts, rights, values, covers, roots = [], [], [], [], [], [], []
+        offset = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == TREE_LEAF
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, 0.0, tree.threshold))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            # scikit-learn >= 1.4 stores class fractions per node, which predict_proba returns as is
+            values.append(tree.value[:, 0, :self.n_classes].astype(np.float64))
+            covers.append(tree.weighted_n_node_samples.astype(np.float64))
+            offset += tree.node_count
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        # children[2 * node + went_left]
+        self.children = np.stack([np.concatenate(rights), np.concatenate(lefts)], axis=1).ravel().astype(np.intp)
+        # One contiguous array per class so leaf lookups are flat gathers
+        self.value = [np.ascontiguousarray(column) for column in np.concatenate(values).T]
+        # Weighted training samples reaching each node, for TreeSHAP (see tree_shap)
+        self.cover = np.concatenate(covers)
+        self.roots = np.asarray(roots, dtype=np.intp)[:, np.newaxis]
+        self.n_trees = len(roots)
+        self.depth = max(estimator.tree_.max_depth for estimator in estimators)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.feature)
+
+    def _traverse(self, X: np.ndarray, contributions: np.ndarray = None, class_index: int = -1) -> np.ndarray:
+        """
+        (rows, classes) probabilities. With `contributions` ((rows, features),
+        zeroed), also adds each split's change in class `class_index`
+        probability to the split feature, summed over trees.
+        """
+        # Tree-major (trees, rows) node indices; X is read through its flat buffer
+        offsets = np.arange(len(X)) * self.n_features
+        flat = X.ravel()
+        node = np.repeat(self.roots, len(X), axis=1)
+        for _ in range(self.depth):
+            feature = np.take(self.feature, node) + offsets
+            went_left = np.take(flat, feature) <= np.take(self.threshold, node)
+            child = np.take(self.children, 2 * node + went_left)
+            if contributions is not None:
+                # Leaves point to themselves, so finished paths add zero
+                value = self.value[class_index]
+                delta = np.take(value, child) - np.take(value, node)
+                contributions += np.bincount(
+                    feature.ravel(), weights=delta.ravel(), minlength=contributions.size).reshape(contributions.shape)
+            node = child
+
+        # Trees are added strictly in estimator order, as the forest's accumulation
+        # loop does, so the float sums round identically. cumsum does that in one
+        # call, which wins for a few rows; a loop over trees wins for many.
+        proba = np.empty((len(X), self.n_classes), dtype=np.float64)
+        for k, value in enumerate(self.value):
+            if len(X) < CUMSUM_MAX_ROWS:
+                proba[:, k] = np.cumsum(np.take(value, node), axis=0)[-1]
+            else:
+                total = np.take(value, node[0])
+                for tree_nodes in node[1:]:
+                    total += np.take(value, tree_nodes)
+                proba[:, k] = total
+        proba /= self.n_trees
+        if contributions is not None:
+            contributions /= self.n_trees
+        return proba
+
+    def _check(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        return X
+
+    def predict_proba(self, X) -> np.ndarray:
+        """(rows, classes) probabilities for already-scaled features, as the ensemble's predict_proba."""
+        X = self._check(X)
+        if len(X) <= self.block_rows:
+            return self._traverse(X)
+        out = np.empty((len(X), self.n_classes), dtype=np.float64)
+        for start in range(0, len(X), self.block_rows):
+            out[start:start + self.block_rows] = self._traverse(X[start:start + self.block_rows])
+        return out
+
+    def predict_proba_with_paths(self, X, class_index: int = -1) -> tuple:
+        """
+        (probabilities, path contributions) from one traversal. Contributions
+        are (rows, features) Saabas attributions for class `class_index`:
+        every split on a row's path credits its feature with the change in
+        that class's probability from parent to child, averaged over trees.
+        They sum to the probability minus the forest's mean root value, like
+        SHAP values, and are what shap.TreeExplainer returns with
+        approximate=True; unlike SHAP they favour features split near leaves.
+        """
+        X = self._check(X)
+        out = np.empty((len(X), self.n_classes), dtype=np.float64)
+        contributions = np.zeros((len(X), self.n_features), dtype=np.float64)
+        for start in range(0, len(X), self.block_rows):
+            stop = start + self.block_rows
+            out[start:stop] = self._traverse(X[start:stop], contributions[start:stop], class_index)
+        return out, contributions
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def describe(self) -> dict:
+        return {"trees": self.n_trees, "nodes": self.node_count, "depth": self.depth}
+
+
+def compile_forest(model):
+    """CompiledForest for `model`, or None (with a warning) when it is not a compilable tree ensemble."""
+    try:
+        return CompiledForest(model)
+    except (AttributeError, ValueError) as e:
+        logger.warning(f" Could not compile {type(model).__name__}, using scikit-learn predict_proba: {e}")
+        return None
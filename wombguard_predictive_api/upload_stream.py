@@ -0,0 +1,158 @@
+"""
+WombGuard Upload Streaming
+Incremental CSV parsing of raw or multipart request bodies, chunk by chunk as the bytes arrive
+"""
+
+import csv
+import logging
+
+from starlette.responses import StreamingResponse
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+
+class CsvChunker:
+    """
+    Turns arbitrary byte pieces of a CSV file into lists of at most
+    `chunk_rows` parsed rows. Only the current partial line and the rows of
+    the chunk being filled are held, so memory does not grow with the file.
+    Quoted fields spanning several lines are joined before parsing.
+    """
+
+    def __init__(self, chunk_rows: int):
+        self.chunk_rows = max(1, chunk_rows)
+        self.header = None
+        self.rows_read = 0
+        self._partial = b""
+        self._record = ""
+        self._rows = []
+
+    def _add_line(self, line: bytes, ready: list):
+        text = line.decode("utf-8-sig" if self.header is None and not self._record else "utf-8")
+        self._record = f"{self._record}\n{text}" if self._record else text
+        if self._record.count('"') % 2:
+            return  # newline inside a quoted field; wait for the rest of the record
+        record, self._record = self._record.rstrip("\r"), ""
+        if not record.strip():
+            return
+        row = next(csv.reader([record]))
+        if self.header is None:
+            self.header = [name.strip() for name in row]
+            return
+        self._rows.append(row)
+        self.rows_read += 1
+        if len(self._rows) >= self.chunk_rows:
+            ready.append(self._rows)
+            self._rows = []
+
+    def feed(self, data: bytes) -> list:
+        """Consume a piece of the file; returns the chunks it completed."""
+        ready = []
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line, ready)
+        return ready
+
+    def finish(self) -> list:
+        """Flush the trailing line and the last, possibly short, chunk."""
+        ready = []
+        if self._partial:
+            line, self._partial = self._partial, b""
+            self._add_line(line, ready)
+        if self._record:
+            raise ValueError("CSV ends inside a quoted field")
+        if self._rows:
+            ready.append(self._rows)
+            self._rows = []
+        return ready
+
+
+async def iter_csv_chunks(request, chunk_rows: int, field: str = "file"):
+    """
+    Yield (header, rows) for each chunk of the uploaded CSV while the request
+    body is still arriving. Accepts a raw text/csv body or a multipart form
+    whose `field` part holds the file; other form parts are ignored.
+    """
+    chunker = CsvChunker(chunk_rows)
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+
+    if content_type != b"multipart/form-data":
+        async for data in request.stream():
+            for rows in chunker.feed(data):
+                yield chunker.header, rows
+        for rows in chunker.finish():
+            yield chunker.header, rows
+        return
+
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("Multipart upload is missing its boundary")
+
+    ready = []
+    part = {"header_field": b"", "header_value": b"", "headers": {}, "is_file": False, "seen": False}
+
+    def on_part_begin():
+        part.update(header_field=b"", header_value=b"", headers={}, is_file=False)
+
+    def on_header_field(data, start, end):
+        part["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["header_value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header_field"].lower()] = part["header_value"]
+        part["header_field"], part["header_value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["is_file"] = disposition.get(b"name", b"").decode("latin-1") == field and not part["seen"]
+        part["seen"] = part["seen"] or part["is_file"]
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            ready.extend(chunker.feed(data[start:end]))
+
+    def on_part_end():
+        if part["is_file"]:
+            ready.extend(chunker.finish())
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for data in request.stream():
+        parser.write(data)
+        while ready:
+            yield chunker.header, ready.pop(0)
+    parser.finalize()
+    while ready:
+        yield chunker.header, ready.pop(0)
+    if not part["seen"]:
+        raise ValueError(f"Multipart upload has no '{field}' part")
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for bodies generated while the request is still being read.
+
+    The stock response listens for client disconnects on `receive` alongside
+    the body, which would consume the request chunks the generator is waiting
+    for. Here a vanished client surfaces as a send error instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,191 @@
+"""
+WombGuard User Import
+Bulk account creation from CSV or JSON with one duplicate check, parallel hashing and chunked inserts
+"""
+
+import io
+import csv
+import json
+import asyncio
+import logging
+
+from postgrest.types import ReturnMethod
+
+from repository import USER_UNIQUE_KEYS, quote_filter_value
+
+logger = logging.getLogger(__name__)
+
+VALID_ROLES = ("pregnant_woman", "healthcare_provider", "admin")
+IMPORT_FIELDS = ("name", "email", "phone", "password", "role")
+
+# Keys per duplicate-check query; keeps the or=(email.in.(...),phone.in.(...)) filter well under URL limits
+EXISTENCE_BATCH_SIZE = 200
+
+
+def parse_upload(content_type: str, body: bytes) -> list:
+    """
+    Rows from a CSV file (header row required) or a JSON array / {"users": [...]} document.
+    Raises ValueError for anything that is neither.
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig")
+    if content_type == "application/json" or (not content_type.endswith("csv") and text.lstrip()[:1] in "[{"):
+        document = json.loads(text)
+        rows = document.get("users") if isinstance(document, dict) else document
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON body must be a list of user objects or {\"users\": [...]}")
+        return rows
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise ValueError("CSV body must start with a header row")
+    return [
+        {(key or "").strip().lower(): (value or "") for key, value in row.items()}
+        for row in reader
+    ]
+
+
+def _result(index: int, row: dict, status: str, detail: str = None) -> dict:
+    return {"row": index, "email": row.get("email"), "status": status, "detail": detail}
+
+
+def plan_import(raw_rows: list, default_role: str) -> tuple:
+    """
+    Normalize and validate rows and drop in-file duplicates (first occurrence wins).
+    Returns (candidates, results): candidates are (row number, user_data) still to be
+    checked against the database, results holds the rows already decided.
+    """
+    candidates = []
+    results = []
+    seen_emails = set()
+    seen_phones = set()
+
+    for index, raw in enumerate(raw_rows, start=1):
+        row = {field: str(raw.get(field) or "").strip() for field in IMPORT_FIELDS}
+        row["email"] = row["email"].lower()
+        row["role"] = (row["role"] or default_role).lower()
+
+        missing = [field for field in ("name", "email", "phone", "password") if not row[field]]
+        if missing:
+            results.append(_result(index, row, "invalid", f"Missing {', '.join(missing)}"))
+            continue
+        if "@" not in row["email"]:
+            results.append(_result(index, row, "invalid", "Invalid email address"))
+            continue
+        if row["role"] not in VALID_ROLES:
+            results.append(_result(index, row, "invalid", f"Role must be one of: {', '.join(VALID_ROLES)}"))
+            continue
+        if row["email"] in seen_emails:
+            results.append(_result(index, row, "duplicate", "Email appears earlier in the file"))
+            continue
+        if row["phone"] in seen_phones:
+            results.append(_result(index, row, "duplicate", "Phone number appears earlier in the file"))
+            continue
+
+        seen_emails.add(row["email"])
+        seen_phones.add(row["phone"])
+        candidates.append((index, row))
+
+    return candidates, results
+
+
+async def find_existing(db, emails: list, phones: list) -> tuple:
+    """(existing emails, existing phones) with one users query per EXISTENCE_BATCH_SIZE keys."""
+    existing_emails = set()
+    existing_phones = set()
+    keys = [("email", email) for email in emails] + [("phone", phone) for phone in phones]
+
+    queries = []
+    for start in range(0, len(keys), EXISTENCE_BATCH_SIZE):
+        chunk = keys[start:start + EXISTENCE_BATCH_SIZE]
+        filters = []
+        for column in ("email", "phone"):
+            values = [quote_filter_value(value) for key, value in chunk if key == column]
+            if values:
+                filters.append(f"{column}.in.({','.join(values)})")
+        queries.append(USER_UNIQUE_KEYS.query(db).or_(",".join(filters)).execute())
+
+    for response in await asyncio.gather(*queries):
+        for user in response.data or []:
+            existing_emails.add((user.get("email") or "").lower())
+            existing_phones.add((user.get("phone") or "").strip())
+    return existing_emails, existing_phones
+
+
+async def hash_passwords(hasher, rows: list, concurrency: int):
+    """Replace each row's plaintext password with its bcrypt hash, `concurrency` at a time."""
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def hash_row(row):
+        async with slots:
+            row["password"] = await hasher.hash_async(row["password"])
+
+    await asyncio.gather(*(hash_row(row) for _, row in rows))
+
+
+async def insert_chunks(db, rows: list, chunk_size: int) -> dict:
+    """
+    Insert rows chunk by chunk. Returns {row number: error or None}.
+    A rejected chunk is retried row by row so one bad record does not fail its neighbours.
+    """
+    outcome = {}
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            await db.table("users").insert([row for _, row in chunk], returning=ReturnMethod.minimal).execute()
+            outcome.update({index: None for index, _ in chunk})
+            continue
+        except Exception as chunk_error:
+            logger.warning(f" Bulk insert of {len(chunk)} users failed, retrying row by row: {chunk_error}")
+
+        for index, row in chunk:
+            try:
+                await db.table("users").insert(row, returning=ReturnMethod.minimal).execute()
+                outcome[index] = None
+            except Exception as row_error:
+                outcome[index] = str(row_error)
+    return outcome
+
+
+async def import_users(
+        raw_rows: list,
+        db,
+        hasher,
+        make_token,
+        default_role: str = "healthcare_provider",
+        chunk_size: int = 100) -> tuple:
+    """
+    Create accounts for every valid, new row.
+    Returns (results sorted by row number, created user_data rows).
+    """
+    candidates, results = plan_import(raw_rows, default_role)
+
+    existing_emails, existing_phones = await find_existing(
+        db, [row["email"] for _, row in candidates], [row["phone"] for _, row in candidates])
+    new_rows = []
+    for index, row in candidates:
+        if row["email"] in existing_emails:
+            results.append(_result(index, row, "exists", "User with this email already exists"))
+        elif row["phone"] in existing_phones:
+            results.append(_result(index, row, "exists", "User with this phone number already exists"))
+        else:
+            new_rows.append((index, row))
+
+    # Leave half the hashing queue free so logins are not shed while an import runs
+    await hash_passwords(hasher, new_rows, concurrency=max(1, hasher.max_pending // 2))
+    for _, row in new_rows:
+        row["email_verified"] = False
+        row["verification_token"] = make_token()
+
+    outcome = await insert_chunks(db, new_rows, max(1, chunk_size))
+    created = []
+    for index, row in new_rows:
+        error = outcome.get(index)
+        if error:
+            results.append(_result(index, row, "failed", error))
+        else:
+            results.append(_result(index, row, "created"))
+            created.append(row)
+
+    results.sort(key=lambda result: result["row"])
+    return results, created
@@ -0,0 +1,251 @@
+"""
+WombGuard Write-Behind Buffer
+Batches Supabase inserts off the request path with retries, backoff and bounded memory
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff with full jitter for the given (1-based) attempt number."""
+    ceiling = min(max_seconds, base_seconds * (2 ** max(attempt - 1, 0)))
+    return random.uniform(0, ceiling)
+
+
+class WriteBehindBuffer:
+    """
+    In-process write-behind queue for a single Supabase table.
+
+    Rows are accepted immediately by submit() and written by a background
+    worker as bulk inserts whenever batch_size rows are waiting or
+    flush_interval_ms has elapsed. A batch that still fails after max_retries
+    is inserted row by row, so only the rows the database rejects are lost.
+    When the queue is full the overflow policy
+    decides whether the oldest or the newest row is dropped, so callers never
+    block on the database.
+    """
+
+    def __init__(
+            self,
+            table: str,
+            batch_size: int = 50,
+            flush_interval_ms: int = 500,
+            max_queue_size: int = 5000,
+            overflow_policy: str = "drop_oldest",
+            max_retries: int = 5,
+            backoff_base_seconds: float = 0.5,
+            backoff_max_seconds: float = 30.0,
+            client=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy '{overflow_policy}'. Must be one of: {', '.join(OVERFLOW_POLICIES)}")
+
+        self.table = table
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(flush_interval_ms, 1) / 1000.0
+        self.max_queue_size = max(1, max_queue_size)
+        self.overflow_policy = overflow_policy
+        self.max_retries = max(1, max_retries)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._client = client
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._worker = None
+        self._stopping = False
+        self._flush_requested = False
+        self._in_flight = 0
+
+        self._metrics = {
+            "submitted": 0,
+            "written": 0,
+            "dropped_overflow": 0,
+            "failed": 0,
+            "batches": 0,
+            "retries": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": None,
+            "last_error": None,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            from supabase_client import supabase
+            self._client = supabase
+        return self._client
+
+    def start(self):
+        """Start the background flush worker (idempotent)."""
+        with self._condition:
+            if self._worker and self._worker.is_alive():
+                return
+            self._stopping = False
+            self._worker = threading.Thread(
+                target=self._run, name=f"write-behind-{self.table}", daemon=True)
+            self._worker.start()
+        logger.info(
+            f"Write-behind buffer for '{self.table}' started "
+            f"(batch={self.batch_size}, interval={int(self.flush_interval * 1000)}ms, "
+            f"max_queue={self.max_queue_size}, overflow={self.overflow_policy})")
+
+    def submit(self, row: dict) -> bool:
+        """
+        Queue a row for insertion without waiting on the database.
+        Returns False if the row was dropped because the queue is full.
+        """
+        with self._condition:
+            self._metrics["submitted"] += 1
+            if len(self._queue) >= self.max_queue_size:
+                self._metrics["dropped_overflow"] += 1
+                if self.overflow_policy == "drop_newest":
+                    logger.warning(f"Write-behind queue for '{self.table}' full, dropping newest row")
+                    return False
+                self._queue.popleft()
+                logger.warning(f"Write-behind queue for '{self.table}' full, dropped oldest row")
+            self._queue.append(row)
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until every queued row has been handed to the database or timeout expires."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(min(remaining, self.flush_interval))
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Flush outstanding rows and stop the worker. Called on application shutdown."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._worker:
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                logger.warning(
+                    f"Write-behind worker for '{self.table}' did not finish within {timeout}s; "
+                    f"{len(self._queue)} rows left unwritten")
+        logger.info(f"Write-behind buffer for '{self.table}' stopped")
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth and delivery counters."""
+        with self._condition:
+            return {
+                "table": self.table,
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                "max_queue_size": self.max_queue_size,
+                "overflow_policy": self.overflow_policy,
+                **self._metrics,
+            }
+
+    def _take_batch(self) -> list:
+        """Wait for a full batch, the flush interval or shutdown, then pop up to batch_size rows."""
+        with self._condition:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not (self._stopping or self._flush_requested):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not self._queue:
+                self._flush_requested = False
+            self._in_flight = len(batch)
+            return batch
+
+    def _write_batch(self, batch: list):
+        started = time.perf_counter()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.client.table(self.table).insert(batch).execute()
+                with self._condition:
+                    self._metrics["written"] += len(batch)
+                    self._metrics["batches"] += 1
+                    self._metrics["last_batch_size"] = len(batch)
+                    self._metrics["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                return
+            except Exception as e:
+                with self._condition:
+                    self._metrics["last_error"] = str(e)
+                if attempt == self.max_retries:
+                    break
+                with self._condition:
+                    self._metrics["retries"] += 1
+                delay = backoff_delay(attempt, self.backoff_base_seconds, self.backoff_max_seconds)
+                logger.warning(
+                    f"Write-behind insert into '{self.table}' failed (attempt {attempt}/{self.max_retries}), "
+                    f"retrying in {delay:.2f}s: {e}")
+                # Shorten the wait while shutting down so the process can exit promptly
+                time.sleep(min(delay, 1.0) if self._stopping else delay)
+
+        if len(batch) == 1:
+            with self._condition:
+                self._metrics["failed"] += 1
+            logger.error(f"Giving up on 1 row for '{self.table}' after {self.max_retries} attempts")
+            return
+
+        # Isolate bad rows so one rejected record cannot take the rest of the batch with it
+        logger.warning(f"Batch insert of {len(batch)} rows into '{self.table}' keeps failing, inserting row by row")
+        rejected = 0
+        for row in batch:
+            try:
+                self.client.table(self.table).insert(row).execute()
+            except Exception as e:
+                rejected += 1
+                with self._condition:
+                    self._metrics["last_error"] = str(e)
+        with self._condition:
+            self._metrics["written"] += len(batch) - rejected
+            self._metrics["failed"] += rejected
+            self._metrics["batches"] += 1
+            self._metrics["last_batch_size"] = len(batch)
+            self._metrics["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if rejected:
+            logger.error(f"Giving up on {rejected} of {len(batch)} rows for '{self.table}'")
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write_batch(batch)
+            with self._condition:
+                self._in_flight = 0
+                self._condition.notify_all()
+                if self._stopping and not self._queue:
+                    return
+
+
+# Global chat history buffer instance
+_chat_history_buffer = None
+
+
+def get_chat_history_buffer() -> WriteBehindBuffer:
+    """Get or create the chat_history write-behind buffer"""
+    global _chat_history_buffer
+    if _chat_history_buffer is None:
+        _chat_history_buffer = WriteBehindBuffer(
+            table="chat_history",
+            batch_size=int(os.getenv("CHAT_HISTORY_BATCH_SIZE", 50)),
+            flush_interval_ms=int(os.getenv("CHAT_HISTORY_FLUSH_MS", 500)),
+            max_queue_size=int(os.getenv("CHAT_HISTORY_MAX_QUEUE", 5000)),
+            overflow_policy=os.getenv("CHAT_HISTORY_OVERFLOW_POLICY", "drop_oldest"),
+        )
+    return _chat_history_buffer